@@ -0,0 +1,370 @@
+import argparse
+import json
+import math
+import os
+import socket
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+import zlib
+from collections import deque
+
+from monitor import Monitor
+
+FRAME_VERSION = 1
+
+# Largest frame the collector accepts once decompressed
+MAX_FRAME_BYTES = 8 * 1024 * 1024
+
+
+def encode_frame(agent_id, frame_id, rows, protocol=None):
+    """gzip-compressed JSON frame for (target, epoch_ts, rtt_ms_or_None, source) rows"""
+    body = json.dumps({
+        "version": FRAME_VERSION,
+        "agent": agent_id,
+        "frame": frame_id,
+        "hostname": socket.gethostname(),
+        "protocol": protocol,  # how the agent probes ("ICMP" / "TCP")
+        "samples": [list(row) for row in rows]
+    }, separators=(",", ":")).encode("utf-8")
+    gzip = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31 = gzip container
+    return gzip.compress(body) + gzip.flush()
+
+
+def decode_frame(data, max_bytes=MAX_FRAME_BYTES):
+    """Parse a frame; raises ValueError if it is malformed or too large"""
+    try:
+        gunzip = zlib.decompressobj(31)
+        body = gunzip.decompress(data, max_bytes)
+        if gunzip.unconsumed_tail:
+            raise ValueError(f"Frame larger than {max_bytes} bytes")
+        frame = json.loads(body)
+    except (zlib.error, UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ValueError(f"Bad frame: {str(e)}")
+    if not isinstance(frame, dict):
+        raise ValueError("Frame must be a JSON object")
+    for key in ("agent", "frame"):
+        if not isinstance(frame.get(key), str) or not frame[key]:
+            raise ValueError(f"Frame needs a non-empty string '{key}'")
+    for key in ("hostname", "protocol"):
+        if not isinstance(frame.get(key), (str, type(None))):
+            raise ValueError(f"Frame '{key}' must be a string")
+    samples = frame.get("samples", [])
+    if not isinstance(samples, list):
+        raise ValueError("Frame 'samples' must be a list")
+    rows = []
+    for row in samples:
+        if not isinstance(row, list) or len(row) != 4:
+            raise ValueError("Each sample must be [target, ts, rtt_ms, source]")
+        target, ts, rtt, source = row
+        if not isinstance(target, str) or not target or not isinstance(source, str):
+            raise ValueError("Sample target and source must be strings")
+        if not _is_number(ts) or not math.isfinite(ts) or not (rtt is None or _is_number(rtt)):
+            raise ValueError("Sample ts and rtt_ms must be numbers (rtt_ms null on loss)")
+        rows.append((target, float(ts), None if rtt is None else float(rtt), source))
+    frame["samples"] = rows
+    return frame
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+class Spool:
+    """Frames waiting on disk while the collector can't take them.
+
+    One file per frame, named so that sorting gives send order, written
+    atomically. When the spool grows past ``max_bytes`` the oldest frames
+    are dropped.
+    """
+
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._counter = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _files(self):
+        return sorted(name for name in os.listdir(self.directory) if name.endswith(".frame"))
+
+    def __len__(self):
+        with self._lock:
+            return len(self._files())
+
+    def put(self, data):
+        with self._lock:
+            self._counter += 1
+            name = f"{time.time_ns():020d}-{self._counter:06d}.frame"
+            path = os.path.join(self.directory, name)
+            with open(path + ".tmp", "wb") as f:
+                f.write(data)
+            os.replace(path + ".tmp", path)
+            self._trim()
+
+    def _trim(self):
+        files = self._files()
+        sizes = [os.path.getsize(os.path.join(self.directory, name)) for name in files]
+        total = sum(sizes)
+        for name, size in zip(files, sizes):
+            if total <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.directory, name))
+            total -= size
+            print(f"Spool full, dropped frame {name}")
+
+    def peek(self):
+        """(name, data) of the oldest spooled frame, or None"""
+        with self._lock:
+            files = self._files()
+            if not files:
+                return None
+            with open(os.path.join(self.directory, files[0]), "rb") as f:
+                return files[0], f.read()
+
+    def remove(self, name):
+        with self._lock:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+
+
+class CollectorError(Exception):
+    """The collector refused a frame for good (bad frame, wrong token)"""
+
+
+class Uploader:
+    """Batch samples into frames and deliver them to the collector.
+
+    Rows are sealed into a frame every ``frame_interval`` seconds or
+    ``frame_rows`` rows. Up to ``max_pending`` frames wait in memory; past
+    that (or while the collector is unreachable or answers 429/503) frames
+    go to the disk spool, and the sender backs off exponentially, honouring
+    Retry-After. Spooled frames are sent oldest first once the collector is
+    back, so nothing measured during an outage is lost unless the spool
+    itself fills up.
+    """
+
+    def __init__(self, collector_url, agent_id, spool, token=None, frame_interval=5.0, frame_rows=5000,
+                 max_pending=16, timeout=10, max_backoff=60.0):
+        self.url = collector_url.rstrip("/") + "/collector/frames"
+        self.agent_id = agent_id
+        self.protocol = None  # set by Agent to the prober it uses
+        self.spool = spool
+        self.token = token
+        self.frame_interval = frame_interval
+        self.frame_rows = frame_rows
+        self.timeout = timeout
+        self.max_backoff = max_backoff
+        self._session = uuid.uuid4().hex[:8]  # frame ids stay unique across restarts
+        self._frames = 0
+        self._rows = []
+        self._sealed_at = time.monotonic()
+        self._pending = deque()
+        self._max_pending = max_pending
+        self._cond = threading.Condition()
+        self._backoff = 0.0
+        self._retry_at = 0.0
+        self._thread = None
+        self._running = False
+        self.sent = 0
+        self.spooled = 0
+        self.dropped = 0
+
+    def add(self, rows):
+        """Queue (target, epoch_ts, rtt_ms_or_None, source) rows for upload"""
+        with self._cond:
+            self._rows.extend(rows)
+            if len(self._rows) >= self.frame_rows:
+                self._seal()
+
+    def _seal(self):
+        """Turn buffered rows into a frame (caller holds the lock)"""
+        self._sealed_at = time.monotonic()
+        if not self._rows:
+            return
+        self._frames += 1
+        frame_id = f"{self._session}-{self._frames}"
+        data = encode_frame(self.agent_id, frame_id, self._rows, self.protocol)
+        self._rows = []
+        if len(self._pending) >= self._max_pending or self._retry_at > time.monotonic():
+            # Backpressure: don't grow memory while the collector is behind
+            self.spool.put(data)
+            self.spooled += 1
+        else:
+            self._pending.append(data)
+        self._cond.notify()
+
+    def _post(self, data):
+        """Send one frame: 0 on success, else the collector's Retry-After
+        seconds, or None to fall back to exponential backoff"""
+        headers = {"Content-Type": "application/octet-stream", "Content-Encoding": "gzip"}
+        if self.token:
+            headers["X-Agent-Token"] = self.token
+        request = urllib.request.Request(self.url, data=data, headers=headers, method="POST")
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                response.read()
+            return 0
+        except urllib.error.HTTPError as e:
+            if e.code in (429, 503) or e.code >= 500:
+                retry_after = e.headers.get("Retry-After")
+                return max(float(retry_after), 0.5) if retry_after and retry_after.isdigit() else None
+            raise CollectorError(f"Collector rejected frame: HTTP {e.code}")
+        except (urllib.error.URLError, OSError) as e:
+            print(f"Collector unreachable: {str(e)}")
+            return None
+
+    def _next_frame(self):
+        """(spool name or None, data) to send next, waiting for one to be ready"""
+        with self._cond:
+            while self._running:
+                now = time.monotonic()
+                if now - self._sealed_at >= self.frame_interval:
+                    self._seal()
+                if now >= self._retry_at:
+                    spooled = self.spool.peek()
+                    if spooled is not None:
+                        return spooled
+                    if self._pending:
+                        return None, self._pending.popleft()
+                wake = self._sealed_at + self.frame_interval
+                if self._retry_at > now:
+                    wake = min(wake, self._retry_at)
+                self._cond.wait(max(wake - now, 0.05))
+        return None
+
+    def _run(self):
+        while True:
+            item = self._next_frame()
+            if item is None:
+                return
+            name, data = item
+            try:
+                wait = self._post(data)
+                if wait == 0:
+                    self.sent += 1
+            except CollectorError as e:
+                # Retrying won't help; drop the frame rather than block the queue
+                print(f"{str(e)}; dropping frame")
+                self.dropped += 1
+                wait = 0
+            if wait == 0:
+                self._backoff = 0.0
+                if name is not None:
+                    self.spool.remove(name)
+                continue
+            # Not delivered: keep it on disk and back off
+            if name is None:
+                self.spool.put(data)
+                self.spooled += 1
+            self._backoff = min(max(self._backoff * 2, 1.0), self.max_backoff)
+            with self._cond:
+                self._retry_at = time.monotonic() + (wait if wait is not None else self._backoff)
+                # Anything still in memory waits on disk instead
+                while self._pending:
+                    self.spool.put(self._pending.popleft())
+                    self.spooled += 1
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name="agent-uploader", daemon=True)
+        self._thread.start()
+
+    def stop(self, flush=True):
+        """Stop sending; unsent rows and frames are spooled for the next run"""
+        with self._cond:
+            if flush:
+                self._seal()
+                # Give the sender a moment to deliver what's queued in memory
+                deadline = time.monotonic() + self.timeout
+                while self._pending and self._retry_at <= time.monotonic() < deadline:
+                    self._cond.wait(0.1)
+            self._running = False
+            self._cond.notify()
+        if self._thread:
+            self._thread.join(timeout=self.timeout + 1)
+        with self._cond:
+            while self._pending:
+                self.spool.put(self._pending.popleft())
+                self.spooled += 1
+
+
+def open_probe(timeout=2, ports=(80, 443)):
+    """ICMP probe when raw sockets are allowed, TCP connect otherwise"""
+    try:
+        from icmp_prober import IcmpProber
+        return IcmpProber(timeout=timeout).ping_sample, "ICMP"
+    except (PermissionError, OSError):
+        from tcp_prober import TcpProber
+        return TcpProber(ports=ports, timeout=timeout).ping_sample, "TCP"
+
+
+class Agent:
+    """Monitor targets continuously and hand every batch to an Uploader"""
+
+    def __init__(self, targets, uploader, interval=10.0, probe=None, protocol=None, timeout=2, max_concurrency=256):
+        if probe is None:
+            probe, self.protocol = open_probe(timeout)
+        else:
+            self.protocol = protocol
+        self.targets = list(targets)
+        self.interval = interval
+        self.uploader = uploader
+        uploader.protocol = self.protocol
+        self.monitor = Monitor(probe, self._on_batch, max_concurrency=max_concurrency, timeout=timeout)
+
+    def _on_batch(self, batch):
+        self.uploader.add([
+            (target, ts, sample.rtt_ms if sample else None, sample.source if sample else "monotonic")
+            for target, sample, ts in batch
+        ])
+
+    def start(self):
+        self.uploader.start()
+        self.monitor.add_targets(self.targets, interval=self.interval)
+        self.monitor.start()
+
+    def stop(self):
+        self.monitor.stop()
+        self.uploader.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless latency probe agent")
+    parser.add_argument("--collector", required=True, help="Base URL of the collecting server, e.g. http://server:5000")
+    parser.add_argument("--id", default=socket.gethostname(), help="Vantage point name (default: hostname)")
+    parser.add_argument("--targets", required=True, help="Comma separated targets to probe")
+    parser.add_argument("--interval", type=float, default=10.0, help="Seconds between probes of each target")
+    parser.add_argument("--timeout", type=float, default=2.0, help="Probe timeout in seconds")
+    parser.add_argument("--frame-interval", type=float, default=5.0, help="Seconds of samples per uploaded frame")
+    parser.add_argument("--spool", default=None, help="Directory for frames the collector couldn't take yet")
+    parser.add_argument("--spool-mb", type=float, default=256, help="Maximum spool size in MB")
+    parser.add_argument("--token", default=os.environ.get("AGENT_TOKEN"), help="Shared collector token (or AGENT_TOKEN)")
+    args = parser.parse_args(argv)
+
+    targets = [t.strip() for t in args.targets.split(",") if t.strip()]
+    spool = Spool(args.spool or os.path.join(os.getcwd(), "agent_spool", args.id), max_bytes=int(args.spool_mb * 1024 * 1024))
+    uploader = Uploader(args.collector, args.id, spool, token=args.token, frame_interval=args.frame_interval)
+    agent = Agent(targets, uploader, interval=args.interval, timeout=args.timeout)
+    print(f"Agent {args.id}: probing {len(targets)} targets every {args.interval:g}s over {agent.protocol}, "
+          f"reporting to {args.collector} ({len(spool)} frames spooled)")
+    agent.start()
+    try:
+        while True:
+            time.sleep(60)
+            print(f"Agent {args.id}: {uploader.sent} frames sent, {len(spool)} spooled, {uploader.dropped} dropped")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        agent.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,84 +1,66 @@
-from flask import Flask, render_template, request, jsonify, send_file
+from flask import Flask, render_template, request, jsonify, Response
 from flask_socketio import SocketIO, emit
-import scapy.all as scapy
 import time
 import json
 import os
 from datetime import datetime
-import folium
-from folium.plugins import HeatMap
 import socket
 import threading
+import queue
+from collections import deque
 import struct
 import platform
 import subprocess
-
-# Add TCP ping function as fallback
-def tcp_ping(host, port=80, timeout=2):
-    """TCP ping as fallback when ICMP is not available"""
-    try:
-        start_time = time.time()
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(timeout)
-        sock.connect((host, port))
-        sock.close()
-        end_time = time.time()
-        return (end_time - start_time) * 1000  # Convert to ms
-    except:
-        return None
+import multiprocessing
+from probe_engine import ProbeEngine
+from sharded_engine import ShardedProbeEngine
+from icmp_prober import IcmpProber
+from tcp_prober import TcpProber
+import timing
+from resolver import ReverseResolver
+from monitor import Monitor
+from agent import decode_frame
+from jobs import JobManager
+from state_store import StateStore
+from history_store import HistoryStore, to_epoch
+import latency_stats
+from samples import SampleSeries, entry_to_json, results_to_json
+import exporters
+import columnar
+from map_layer import MapCache, locate_known
+import geoip
 
 # Traceroute function
-def traceroute(destination, max_hops=30, timeout=2):
-    """Perform traceroute to destination"""
-    hops = []
-    dest_ip = socket.gethostbyname(destination)
+def traceroute(destination, max_hops=30, timeout=2, probes_per_hop=3):
+    """Perform traceroute to destination, probing every TTL in parallel"""
+    hops = get_icmp_prober().traceroute(
+        destination,
+        max_hops=max_hops,
+        probes_per_hop=probes_per_hop,
+        timeout=timeout
+    )
     
-    for ttl in range(1, max_hops + 1):
-        try:
-            # Create ICMP packet with specific TTL
-            packet = scapy.IP(dst=dest_ip, ttl=ttl) / scapy.ICMP()
-            start_time = time.time()
-            reply = scapy.sr1(packet, timeout=timeout, verbose=0)
-            end_time = time.time()
-            
-            if reply is None:
-                hops.append({
-                    'hop': ttl,
-                    'ip': '*',
-                    'hostname': '*',
-                    'latency': None
-                })
-            else:
-                latency = (end_time - start_time) * 1000
-                try:
-                    hostname = socket.gethostbyaddr(reply.src)[0]
-                except:
-                    hostname = reply.src
-                
-                hops.append({
-                    'hop': ttl,
-                    'ip': reply.src,
-                    'hostname': hostname,
-                    'latency': latency
-                })
-                
-                # Check if we reached destination
-                if reply.src == dest_ip:
-                    break
-        except Exception as e:
-            print(f"Traceroute error at hop {ttl}: {str(e)}")
-            hops.append({
-                'hop': ttl,
-                'ip': '*',
-                'hostname': '*',
-                'latency': None
-            })
+    # Resolve every responding hop at once (cached across traceroutes)
+    names = resolver.resolve_many([hop['ip'] for hop in hops if hop['ip'] != '*'], timeout=timeout)
+    for hop in hops:
+        if hop['ip'] == '*':
+            hop['hostname'] = '*'
+        else:
+            hop['hostname'] = names.get(hop['ip']) or hop['ip']
     
     return hops
 
 # Network diagnostics
-def get_network_info(ip):
-    """Get detailed network information about an IP"""
+COMMON_PORTS = [21, 22, 23, 25, 53, 80, 110, 143, 443, 3306, 3389, 8080]
+
+def get_network_info(ip, ports=None, on_port=None):
+    """Get detailed network information about an IP
+    
+    The port checks, the reachability probe and the reverse DNS lookup all
+    run at the same time, so the whole call takes about one timeout no matter
+    how many ports are checked. on_port(port, is_open) is called as each port
+    check finishes.
+    """
     info = {
         'ip': ip,
         'hostname': None,
@@ -89,36 +71,44 @@ def get_network_info(ip):
         'protocol': None
     }
     
+    ports = ports or settings.get('scan_ports', COMMON_PORTS)
+    port_timeout = float(settings.get('port_timeout', 0.5))
+    ping_timeout = float(settings.get('ping_timeout', 2))
+    deadline = time.monotonic() + max(port_timeout, ping_timeout) + 0.5
+    
     try:
         # Get hostname
         info['hostname'] = socket.gethostbyname(ip)
         
-        # Reverse DNS lookup
-        try:
-            info['reverse_dns'] = socket.gethostbyaddr(ip)[0]
-        except:
-            pass
+        # Reverse DNS lookup (runs on the resolver pool while we probe)
+        reverse_dns = resolver.submit(ip)
+        
+        # Check all ports at once on the TCP prober's event loop
+        scan = get_tcp_prober().start_scan(ip, ports, timeout=port_timeout, on_result=on_port)
         
-        # Check common ports
-        common_ports = [21, 22, 23, 25, 53, 80, 110, 143, 443, 3306, 3389, 8080]
-        for port in common_ports:
+        # Simple reachability test
+        if has_admin:
             try:
-                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                sock.settimeout(0.5)
-                result = sock.connect_ex((ip, port))
-                sock.close()
-                if result == 0:
-                    info['open_ports'].append(port)
+                sample, ttl = get_icmp_prober().ping_with_ttl(ip, timeout=ping_timeout)
+                if sample.rtt_ms is not None:
+                    info['is_reachable'] = True
+                    info['ttl'] = ttl
+                info['protocol'] = 'ICMP'
             except:
                 pass
         
-        # Simple reachability test
         try:
-            packet = scapy.IP(dst=ip) / scapy.ICMP()
-            reply = scapy.sr1(packet, timeout=2, verbose=0)
-            if reply:
-                info['is_reachable'] = True
-                info['ttl'] = reply.ttl if hasattr(reply, 'ttl') else None
+            info['open_ports'] = scan.result(timeout=max(0, deadline - time.monotonic()))
+        except:
+            scan.cancel()
+        
+        if not has_admin:
+            # Without raw sockets an open port is our only sign of life
+            info['is_reachable'] = bool(info['open_ports'])
+            info['protocol'] = 'TCP'
+        
+        try:
+            info['reverse_dns'] = reverse_dns.result(timeout=max(0, deadline - time.monotonic()))
         except:
             pass
             
@@ -127,32 +117,6 @@ def get_network_info(ip):
     
     return info
 
-# Calculate network statistics
-def calculate_jitter(latencies):
-    """Calculate jitter (variation in latency)"""
-    if len(latencies) < 2:
-        return 0
-    
-    differences = []
-    for i in range(1, len(latencies)):
-        if latencies[i] is not None and latencies[i-1] is not None:
-            differences.append(abs(latencies[i] - latencies[i-1]))
-    
-    return sum(differences) / len(differences) if differences else 0
-
-def calculate_throughput_estimate(latency, packet_size=64):
-    """Estimate throughput based on latency (simplified)"""
-    if latency == 0:
-        return 0
-    # Simplified bandwidth estimation
-    # BDP (Bandwidth-Delay Product) estimation
-    rtt = latency / 1000  # Convert to seconds
-    if rtt == 0:
-        return 0
-    # Assume TCP window size of 64KB
-    estimated_bandwidth = (65536 * 8) / rtt  # bits per second
-    return estimated_bandwidth / 1_000_000  # Convert to Mbps
-
 # Check if we have raw socket privileges
 def check_raw_socket_privileges():
     """Check if we can create raw sockets (need admin/root)"""
@@ -176,225 +140,374 @@ app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your-secret-key-here'
 socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading')
 
-# Data storage
-latency_data = {}
-historical_data = []
-settings = {
+# Shared reverse-DNS cache for traceroute, network info and maps
+resolver = ReverseResolver()
+
+# Data storage. Both are shared between socket.io handlers, routes and the
+# monitor thread, so they are copy-on-write stores: take snapshot() once and
+# read from that, and publish changes with update()/replace().
+latency_data = StateStore()
+DEFAULT_SETTINGS = {
     "default_pings": 5,
     "ping_timeout": 2,
+    "max_concurrency": 64,  # Targets probed at the same time
+    "probe_interval": 0.1,  # Seconds between pings to the same target
+    "probe_processes": 1,  # Worker processes a sweep is sharded across (1 = probe in this process)
+    "stream_interval": 0.25,  # Seconds between live sample batches sent to the browser
+    "job_workers": 4,  # Measurement jobs that run at the same time (others queue)
+    "job_history": 100,  # Finished jobs kept for status/result queries
+    "tcp_ports": [80, 443],  # Ports raced by the unprivileged TCP ping
+    "scan_ports": COMMON_PORTS,  # Ports checked by /network_info
+    "port_timeout": 0.5,  # Seconds to wait for each port check
+    "monitor_interval": 10,  # Default seconds between probes of a monitored target
+    "monitor_window": 100,  # Recent samples kept per monitored target
+    "monitor_concurrency": 256,  # Monitored targets probed at the same time (applies when the monitor is created)
+    "collector_token": "",  # Shared secret agents send as X-Agent-Token ("" = accept any agent)
+    "collector_concurrency": 4,  # Agent frames decoded at the same time (more get 503 + Retry-After)
+    "geoip_database": "",  # Offline IP range file (CSV or .mmdb) used to place targets on the map
     "storage_path": os.path.join(os.getcwd(), "latency_data")
 }
+settings = StateStore(DEFAULT_SETTINGS)
 
-# Load settings if they exist
+def known_settings(changes):
+    """Only the keys of changes that are real settings"""
+    return {key: value for key, value in (changes or {}).items() if key in DEFAULT_SETTINGS}
+
+# Load settings if they exist (merged over the defaults, so new keys keep
+# their default when an older settings.json doesn't have them)
 if os.path.exists("settings.json"):
     with open("settings.json", 'r') as f:
-        settings = json.load(f)
+        settings.update(known_settings(json.load(f)))
+
+def open_history_store():
+    """Open the on-disk history under settings['storage_path']"""
+    return HistoryStore(settings.get('storage_path') or os.path.join(os.getcwd(), "latency_data"))
+
+# Measurement history lives on disk so it survives restarts
+history = open_history_store()
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
+def parse_time_arg(value):
+    """Epoch seconds from a query arg given as a number or '%Y-%m-%d %H:%M:%S'"""
+    if value is None or value == '':
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return to_epoch(value)
+
 @app.route('/get_historical_data')
 def get_historical_data():
-    return jsonify(historical_data)
+    """One page of history, newest first
+    
+    Query args: limit (default 50, max 500), cursor (next_cursor from the
+    previous page), from / to (epoch seconds or 'YYYY-MM-DD HH:MM:SS'),
+    target (only that IP) and summary=1 (leave out raw latencies).
+    """
+    try:
+        limit = min(max(int(request.args.get('limit', 50)), 1), 500)
+        cursor = request.args.get('cursor', type=int)
+        start = parse_time_arg(request.args.get('from'))
+        end = parse_time_arg(request.args.get('to'))
+    except ValueError as e:
+        return jsonify({"status": "error", "message": f"Invalid query: {str(e)}"}), 400
+    
+    runs, next_cursor = history.page_runs(
+        limit=limit,
+        cursor=cursor,
+        start=start,
+        end=end,
+        target=request.args.get('target') or None,
+        summary=request.args.get('summary') in ('1', 'true')
+    )
+    return jsonify({
+        "status": "success",
+        "runs": runs,
+        "next_cursor": next_cursor
+    })
+
+@app.route('/get_historical_data/<int:run_id>')
+def get_historical_entry(run_id):
+    """A single history entry by id"""
+    run = history.get_run(run_id, summary=request.args.get('summary') in ('1', 'true'))
+    if run is None:
+        return jsonify({"status": "error", "message": "No such history entry"}), 404
+    return jsonify({"status": "success", "run": run})
+
+@app.route('/get_series')
+def get_series():
+    """Latency series for one target, sized for a chart
+    
+    Query args: target (required), from / to (default: the last hour) and
+    width (chart width in points, default 800).
+    """
+    target = request.args.get('target')
+    if not target:
+        return jsonify({"status": "error", "message": "target is required"}), 400
+    try:
+        end = parse_time_arg(request.args.get('to')) or time.time()
+        start = parse_time_arg(request.args.get('from')) or end - 3600
+        width = min(max(int(request.args.get('width', 800)), 10), 5000)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": f"Invalid query: {str(e)}"}), 400
+    
+    series = history.series(target, start, end, width)
+    series.update({"status": "success", "target": target, "from": start, "to": end})
+    return jsonify(series)
+
+@app.route('/get_percentiles')
+def get_percentiles():
+    """p50/p95/p99 per target and across targets over a time window
+    
+    Query args: from / to (default: the last 24 hours) and target (repeat or
+    comma separate to pick several; default all). Merges the per-bucket
+    sketches kept with the rollups, so long windows stay cheap.
+    """
+    try:
+        end = parse_time_arg(request.args.get('to')) or time.time()
+        start = parse_time_arg(request.args.get('from')) or end - 86400
+    except ValueError as e:
+        return jsonify({"status": "error", "message": f"Invalid query: {str(e)}"}), 400
+    targets = parse_targets(','.join(request.args.getlist('target')))
+    
+    sketches, overall = history.percentiles(start, end, targets or None)
+    
+    def describe(sketch):
+        result = {"count": sketch.count, "avg": sketch.avg}
+        result.update(sketch.percentiles(50, 95, 99))
+        return result
+    
+    return jsonify({
+        "status": "success",
+        "from": start,
+        "to": end,
+        "targets": {target: describe(sketch) for target, sketch in sketches.items()},
+        "overall": describe(overall)
+    })
 
 @app.route('/get_current_data')
 def get_current_data():
-    return jsonify(latency_data)
+    return jsonify(results_to_json(latency_data.snapshot()))
 
 @app.route('/get_settings')
 def get_settings():
-    return jsonify(settings)
+    return jsonify(settings.snapshot())
 
 @app.route('/save_settings', methods=['POST'])
 def save_settings():
-    global settings
-    settings = request.json
+    global history
+    old_path = history.path
+    # Forms only post the fields they show; keep every other setting as is
+    settings.update(known_settings(request.json))
+    
+    # Move history to the new storage location if it changed
+    store = open_history_store()
+    if store.path != old_path:
+        history, old = store, history
+        old.close()
+    else:
+        store.close()
     
     # Save to file
     with open("settings.json", 'w') as f:
-        json.dump(settings, f, indent=4)
+        json.dump(settings.snapshot(), f, indent=4)
     
     return jsonify({"status": "success", "message": "Settings saved successfully"})
 
 @app.route('/clear_data', methods=['POST'])
 def clear_data():
-    global latency_data
-    latency_data = {}
+    latency_data.clear()
     return jsonify({"status": "success", "message": "Data cleared"})
 
 @app.route('/clear_history', methods=['POST'])
 def clear_history():
-    global historical_data
-    historical_data = []
+    history.clear()
     return jsonify({"status": "success", "message": "History cleared"})
 
+def export_response(chunks, filename, format):
+    """Stream export chunks as a download (gzip-compressed with ?gzip=1)"""
+    compress = request.args.get('gzip') in ('1', 'true')
+    if compress:
+        filename += '.gz'
+    return Response(
+        exporters.encode(chunks, compress=compress),
+        mimetype='application/gzip' if compress else exporters.FORMATS[format],
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
 @app.route('/export_data/<format>')
 def export_data(format):
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    """Current results as csv, json or ndjson (?target= to keep some IPs)"""
+    if format not in exporters.FORMATS:
+        return jsonify({"status": "error", "message": "Invalid format"})
     
-    if format == 'csv':
-        import csv
-        filename = f"latency_data_{timestamp}.csv"
-        filepath = os.path.join(os.getcwd(), filename)
-        
-        with open(filepath, 'w', newline='') as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow(["IP", "Average Latency (ms)", "Min Latency (ms)", "Max Latency (ms)", "Packet Loss (%)"])
-            
-            for ip, data in latency_data.items():
-                writer.writerow([
-                    ip,
-                    f"{data['avg']:.2f}",
-                    f"{data['min']:.2f}",
-                    f"{data['max']:.2f}",
-                    f"{data['packet_loss']:.1f}"
-                ])
-        
-        return send_file(filepath, as_attachment=True)
-    
-    elif format == 'json':
-        filename = f"latency_data_{timestamp}.json"
-        filepath = os.path.join(os.getcwd(), filename)
-        
-        with open(filepath, 'w') as jsonfile:
-            json.dump(latency_data, jsonfile, indent=4)
-        
-        return send_file(filepath, as_attachment=True)
-    
-    return jsonify({"status": "error", "message": "Invalid format"})
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    data = latency_data.snapshot()
+    targets = set(parse_targets(','.join(request.args.getlist('target'))))
+    pairs = (
+        (ip, entry_to_json(entry)) for ip, entry in data.items()
+        if not targets or ip in targets
+    )
+    return export_response(exporters.export_current(pairs, format), f"latency_data_{timestamp}.{format}", format)
 
 @app.route('/export_history/<format>')
 def export_history(format):
+    """Stream history as csv, json, ndjson, arrow or parquet straight from the store
+    
+    Query args: from / to (epoch seconds or 'YYYY-MM-DD HH:MM:SS'), target,
+    summary=1 (leave out raw latencies) and gzip=1. For arrow / parquet,
+    table=runs (default) or table=samples.
+    """
+    if format not in exporters.FORMATS and format not in columnar.FORMATS:
+        return jsonify({"status": "error", "message": "Invalid format"})
+    try:
+        start = parse_time_arg(request.args.get('from'))
+        end = parse_time_arg(request.args.get('to'))
+    except ValueError as e:
+        return jsonify({"status": "error", "message": f"Invalid query: {str(e)}"}), 400
+    
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    if format in columnar.FORMATS:
+        return export_columnar(format, start, end, timestamp)
     
-    if format == 'csv':
-        import csv
-        filename = f"latency_history_{timestamp}.csv"
-        filepath = os.path.join(os.getcwd(), filename)
-        
-        with open(filepath, 'w', newline='') as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow(["Timestamp", "IP", "Average Latency (ms)", "Min Latency (ms)", "Max Latency (ms)", "Packet Loss (%)"])
-            
-            for entry in historical_data:
-                ts = entry["timestamp"]
-                for ip, data in entry["data"].items():
-                    writer.writerow([
-                        ts,
-                        ip,
-                        f"{data['avg']:.2f}",
-                        f"{data['min']:.2f}",
-                        f"{data['max']:.2f}",
-                        f"{data['packet_loss']:.1f}"
-                    ])
-        
-        return send_file(filepath, as_attachment=True)
+    runs = history.iter_runs(
+        start=start,
+        end=end,
+        target=request.args.get('target') or None,
+        # CSV only has the summary columns
+        summary=format == 'csv' or request.args.get('summary') in ('1', 'true')
+    )
+    return export_response(exporters.export_history(runs, format), f"latency_history_{timestamp}.{format}", format)
+
+def export_columnar(format, start, end, timestamp):
+    """Arrow IPC stream / Parquet download of the runs or samples table"""
+    if not columnar.available():
+        return jsonify({"status": "error", "message": "Arrow/Parquet export needs pyarrow (pip install pyarrow)"})
+    table = request.args.get('table', 'runs')
+    if table not in columnar.TABLES:
+        return jsonify({"status": "error", "message": "Invalid table (runs or samples)"})
     
-    elif format == 'json':
-        filename = f"latency_history_{timestamp}.json"
-        filepath = os.path.join(os.getcwd(), filename)
-        
-        with open(filepath, 'w') as jsonfile:
-            json.dump(historical_data, jsonfile, indent=4)
-        
-        return send_file(filepath, as_attachment=True)
+    target = request.args.get('target') or None
+    if table == 'runs':
+        schema = columnar.runs_schema()
+        batches = columnar.run_batches(history.iter_runs(start=start, end=end, target=target))
+    else:
+        schema = columnar.samples_schema()
+        batches = columnar.sample_batches(history.iter_samples(target, start, end, with_run_id=True))
     
-    return jsonify({"status": "error", "message": "Invalid format"})
+    mimetype, extension = columnar.FORMATS[format]
+    return Response(
+        columnar.iter_encoded(batches, schema, format),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename=latency_{table}_{timestamp}.{extension}"}
+    )
+
+@app.route('/import_history', methods=['POST'])
+def import_history():
+    """Load an Arrow/Parquet runs or samples export (multipart field "file") into history"""
+    if not columnar.available():
+        return jsonify({"status": "error", "message": "Arrow/Parquet import needs pyarrow (pip install pyarrow)"})
+    upload = request.files.get('file')
+    if upload is None:
+        return jsonify({"status": "error", "message": "No file uploaded"})
+    try:
+        counts = columnar.import_into(history, upload.stream)
+    except Exception as e:
+        return jsonify({"status": "error", "message": f"Import failed: {str(e)}"})
+    return jsonify({
+        "status": "success",
+        "message": f"Imported {counts['runs']} runs and {counts['samples']} samples ({counts['skipped']} already present)",
+        **counts
+    })
+
+# Offline geolocation, loaded on first use from settings['geoip_database']
+geo_db = None
+geo_db_path = None
+geo_db_lock = threading.Lock()
+
+def get_geoip():
+    """The offline geolocation database, reloaded when the setting changes (None if unset)"""
+    global geo_db, geo_db_path
+    path = settings.get('geoip_database') or None
+    with geo_db_lock:
+        if path != geo_db_path:
+            try:
+                geo_db = geoip.load(path)
+            except Exception as e:
+                print(f"Could not load geolocation database {path}: {str(e)}")
+                geo_db = None
+            geo_db_path = path
+            map_cache.invalidate()
+        return geo_db
+
+def locate_targets(ips):
+    """{ip: (name, lat, lon)}: known locations first, then the offline database
+    
+    Uses the database as last loaded; callers run get_geoip() first so a
+    changed setting is picked up (and stale map layers dropped).
+    """
+    locations = locate_known(ips)
+    db = geo_db
+    if db is not None:
+        locations.update(db.lookup_many([ip for ip in ips if ip not in locations]))
+    return locations
+
+# Map layers are cached per data hash; hostnames come from the shared resolver
+map_cache = MapCache(
+    os.path.join(os.getcwd(), "static"),
+    locate=locate_targets,
+    resolve_names=lambda ips: resolver.resolve_many(ips, timeout=2)
+)
+
+@app.route('/geolocate')
+def geolocate():
+    """Offline locations for ?ip=... (repeat or comma separate for a batch)"""
+    ips = parse_targets(','.join(request.args.getlist('ip')))
+    db = get_geoip()
+    locations = locate_targets(ips)
+    return jsonify({
+        "status": "success",
+        "database": db is not None,
+        "locations": {ip: {"name": name, "lat": lat, "lon": lon} for ip, (name, lat, lon) in locations.items()}
+    })
 
 @app.route('/generate_map')
 def generate_map():
-    if not latency_data:
+    """Full folium map page (rendered once per distinct data)"""
+    current = latency_data.snapshot()
+    if not current:
         return jsonify({"status": "error", "message": "No latency data available. Please run a measurement first."})
     
     try:
-        # Create a map centered at a default location (world view)
-        m = folium.Map(location=[20, 0], zoom_start=2)
-        
-        # Create list for heatmap data
-        heat_data = []
-        
-        # Location mapping for common IPs
-        location_map = {
-            "8.8.8.8": ("Mountain View, CA, USA", 37.4056, -122.0775),
-            "8.8.4.4": ("Mountain View, CA, USA", 37.4056, -122.0775),
-            "1.1.1.1": ("San Francisco, CA, USA", 37.7749, -122.4194),
-            "1.0.0.1": ("San Francisco, CA, USA", 37.7749, -122.4194),
-            "208.67.222.222": ("San Francisco, CA, USA", 37.7749, -122.4194),
-            "208.67.220.220": ("San Francisco, CA, USA", 37.7749, -122.4194),
-        }
-        
-        # Process each IP address
-        for ip in latency_data.keys():
-            try:
-                if ip in location_map:
-                    loc_name, lat, lon = location_map[ip]
-                else:
-                    # Try to get hostname
-                    try:
-                        hostname = socket.gethostbyaddr(ip)[0]
-                        loc_name = hostname
-                    except:
-                        loc_name = ip
-                    
-                    # Default coordinates (can be enhanced with IP geolocation API)
-                    lat, lon = 0, 0
-                
-                if lat != 0 or lon != 0:  # Only add if we have valid coordinates
-                    # Get actual measured latency data
-                    data = latency_data[ip]
-                    avg_latency = data['avg']
-                    min_latency = data['min']
-                    max_latency = data['max']
-                    packet_loss = data['packet_loss']
-                    
-                    # Determine marker color based on latency
-                    if avg_latency < 50:
-                        color = 'green'
-                    elif avg_latency < 100:
-                        color = 'orange'
-                    else:
-                        color = 'red'
-                    
-                    # Create popup with real data
-                    popup_html = f"""
-                    <b>{loc_name}</b><br>
-                    IP: {ip}<br>
-                    Avg Latency: {avg_latency:.2f} ms<br>
-                    Min: {min_latency:.2f} ms<br>
-                    Max: {max_latency:.2f} ms<br>
-                    Packet Loss: {packet_loss:.1f}%
-                    """
-                    
-                    # Add marker with actual latency data
-                    folium.Marker(
-                        [lat, lon],
-                        popup=folium.Popup(popup_html, max_width=250),
-                        tooltip=f"{ip} - {avg_latency:.2f} ms",
-                        icon=folium.Icon(color=color, icon='info-sign')
-                    ).add_to(m)
-                    
-                    # Add to heatmap data
-                    heat_data.append([lat, lon, avg_latency / 10])
-            
-            except Exception as e:
-                print(f"Could not process location for {ip}: {str(e)}")
-                continue
-        
-        # Add heatmap layer if we have data
-        if heat_data:
-            HeatMap(heat_data, radius=25, blur=35, max_zoom=13).add_to(m)
-        
-        # Save map to HTML file
-        map_file = os.path.join(os.getcwd(), "static", "latency_map.html")
-        os.makedirs(os.path.dirname(map_file), exist_ok=True)
-        m.save(map_file)
-        
-        return jsonify({"status": "success", "message": "Map generated successfully", "map_url": "/static/latency_map.html"})
+        get_geoip()
+        map_url, cached = map_cache.html(current)
+        return jsonify({"status": "success", "message": "Map generated successfully", "map_url": map_url, "cached": cached})
     
     except Exception as e:
         return jsonify({"status": "error", "message": f"Error generating map: {str(e)}"})
 
+@app.route('/map_data')
+def map_data():
+    """Markers and heat points as JSON for the client-side map
+    
+    Pass since=<key> from the previous response to get only the markers
+    that changed (plus removed IPs), or {"unchanged": true}.
+    """
+    current = latency_data.snapshot()
+    if not current:
+        return jsonify({"status": "error", "message": "No latency data available. Please run a measurement first."})
+    
+    try:
+        get_geoip()
+        payload = map_cache.diff(current, since=request.args.get('since') or None)
+    except Exception as e:
+        return jsonify({"status": "error", "message": f"Error building map data: {str(e)}"})
+    payload["status"] = "success"
+    return jsonify(payload)
+
 @app.route('/traceroute/<destination>')
 def trace_route(destination):
     """Perform traceroute to destination"""
@@ -419,9 +532,26 @@ def trace_route(destination):
 
 @app.route('/network_info/<ip>')
 def network_info(ip):
-    """Get detailed network information about an IP"""
+    """Get detailed network information about an IP
+    
+    ?ports=22,80,443 overrides the configured port list; ?stream=1 returns
+    NDJSON with one line per finished port check followed by the full result.
+    """
     try:
-        info = get_network_info(ip)
+        ports = request.args.get('ports')
+        if ports:
+            ports = [int(port) for port in ports.split(',') if port.strip()]
+    except ValueError:
+        return jsonify({
+            "status": "error",
+            "message": "ports must be a comma separated list of integers"
+        })
+    
+    if request.args.get('stream'):
+        return Response(stream_network_info(ip, ports), mimetype='application/x-ndjson')
+    
+    try:
+        info = get_network_info(ip, ports)
         return jsonify({
             "status": "success",
             "info": info
@@ -432,17 +562,47 @@ def network_info(ip):
             "message": f"Failed to get network info: {str(e)}"
         })
 
+def stream_network_info(ip, ports):
+    """Yield port results as NDJSON lines while get_network_info runs"""
+    events = queue.Queue()
+    
+    def run():
+        try:
+            info = get_network_info(ip, ports, on_port=lambda port, is_open: events.put({"port": port, "open": is_open}))
+            events.put({"status": "success", "info": info})
+        except Exception as e:
+            events.put({"status": "error", "message": f"Failed to get network info: {str(e)}"})
+    
+    threading.Thread(target=run, daemon=True).start()
+    while True:
+        event = events.get()
+        yield json.dumps(event) + "\n"
+        if "status" in event:
+            break
+
+@app.route('/resolver_stats')
+def resolver_stats():
+    """Reverse-DNS cache hit/miss counters"""
+    return jsonify({
+        "status": "success",
+        "stats": resolver.stats()
+    })
+
 @app.route('/bandwidth_test')
 def bandwidth_test():
     """Simple bandwidth estimation based on latency measurements"""
-    if not latency_data:
+    current = latency_data.snapshot()
+    if not current:
         return jsonify({"status": "error", "message": "No latency data available"})
     
     results = {}
-    for ip, data in latency_data.items():
+    for ip, data in current.items():
         results[ip] = {
             "estimated_bandwidth_mbps": data.get('throughput_estimate', 0),
             "avg_latency_ms": data['avg'],
+            "p50_latency_ms": data.get('p50'),
+            "p95_latency_ms": data.get('p95'),
+            "p99_latency_ms": data.get('p99'),
             "jitter_ms": data.get('jitter', 0)
         }
     
@@ -451,112 +611,419 @@ def bandwidth_test():
         "results": results
     })
 
-@socketio.on('start_measurement')
-def handle_measurement(data):
-    global latency_data, historical_data
+_icmp_prober = None
+_icmp_prober_lock = threading.Lock()
+
+def get_icmp_prober():
+    """Return the process-wide ICMP prober, opening its socket on first use"""
+    global _icmp_prober
+    with _icmp_prober_lock:
+        if _icmp_prober is None:
+            _icmp_prober = IcmpProber(timeout=float(settings.get('ping_timeout', 2)))
+        return _icmp_prober
+
+_tcp_prober = None
+_tcp_prober_lock = threading.Lock()
+
+def get_tcp_prober():
+    """Return the process-wide TCP connect prober, starting its event loop on first use"""
+    global _tcp_prober
+    with _tcp_prober_lock:
+        if _tcp_prober is None:
+            _tcp_prober = TcpProber(
+                ports=settings.get('tcp_ports', [80, 443]),
+                timeout=float(settings.get('ping_timeout', 2))
+            )
+        return _tcp_prober
+
+def ping_once(ip, timeout=2):
+    """Send a single probe to ip and return a timing.RttSample (rtt_ms is None on loss)"""
+    if has_admin:
+        # Use ICMP ping (requires admin) over the shared raw socket
+        return get_icmp_prober().ping_sample(ip, timeout=timeout)
+    
+    # Fallback to TCP ping (doesn't require admin)
+    # Race port 80 and 443 on the shared event loop
+    return get_tcp_prober().ping_sample(ip, timeout=timeout)
+
+def build_results(series_by_ip):
+    """latency_data entries for {ip: samples.SampleSeries}
+    
+    Statistics for every target are computed in one vectorized batch. The
+    raw samples stay in their compact SampleSeries under "samples"; use
+    samples.results_to_json() to get the latencies/timestamp_sources lists
+    the UI and exports expect.
+    """
+    stats_by_ip = latency_stats.summarize_many({ip: series.rtts for ip, series in series_by_ip.items()})
+    
+    results = {}
+    for ip, series in series_by_ip.items():
+        result = {"samples": series}
+        result.update(stats_by_ip[ip])  # avg/min/max/loss/jitter/std_dev/throughput/p50/p95/p99
+        result["protocol"] = "ICMP" if has_admin else "TCP"  # Protocol used
+        results[ip] = result
+    return results
+
+def summary_data(results):
+    """latency_data-style results without the raw samples (statistics only)"""
+    return {ip: {k: v for k, v in result.items() if k != "samples"} for ip, result in results.items()}
+
+# Continuous monitoring
+monitor = None
+monitor_lock = threading.Lock()
+monitor_windows = {}  # ip -> SampleSeries of the most recent samples
+monitor_windows_lock = threading.Lock()
+
+def get_monitor():
+    """Return the background monitor, creating it on first use"""
+    global monitor
+    with monitor_lock:
+        if monitor is None:
+            monitor = Monitor(
+                ping_once,
+                on_monitor_batch,
+                max_concurrency=int(settings.get('monitor_concurrency', 256)),
+                timeout=float(settings.get('ping_timeout', 2))
+            )
+        return monitor
+
+def on_monitor_batch(batch):
+    """Fold a batch of monitor samples into latency_data and push them to clients"""
+    window_size = int(settings.get('monitor_window', 100))
+    samples = []
+    for ip, sample, ts in batch:
+        sample = sample or timing.RttSample(None, timing.SOURCE_MONOTONIC)
+        samples.append({"ip": ip, "timestamp": ts, "latency": sample.rtt_ms, "source": sample.source})
+    
+    # The lock keeps /monitor/remove from dropping a window mid-batch; samples
+    # of targets removed while they were in flight don't bring them back
+    with monitor_windows_lock:
+        registered = monitor.targets() if monitor is not None else {}
+        touched = set()
+        for s in samples:
+            ip = s["ip"]
+            if ip not in registered:
+                continue
+            window = monitor_windows.get(ip)
+            if window is None:
+                window = monitor_windows[ip] = SampleSeries(maxlen=window_size)
+            elif window.maxlen != window_size:
+                window.resize(window_size)
+            window.append(s["latency"], s["source"])
+            touched.add(ip)
+        # Entries are published as snapshots, so hand build_results copies of
+        # the windows (they keep changing with later batches)
+        results = build_results({ip: monitor_windows[ip].copy() for ip in touched})
+        latency_data.update(results)
+    stats = summary_data(results)
+    
+    history.add_samples([(s["ip"], s["timestamp"], s["latency"], s["source"]) for s in samples])
+    socketio.emit('monitor_samples', {"samples": samples, "stats": stats})
+
+def parse_targets(value):
+    """Accept a comma separated string or a list of targets"""
+    if isinstance(value, str):
+        value = value.split(',')
+    return [ip.strip() for ip in value if ip and ip.strip()]
+
+@app.route('/monitor')
+def monitor_status():
+    """Registered monitoring targets and their intervals"""
+    m = get_monitor()
+    return jsonify({
+        "status": "success",
+        "running": m.running,
+        "targets": m.targets()
+    })
+
+@app.route('/monitor/targets', methods=['POST'])
+def monitor_add_targets():
+    """Register targets for continuous monitoring and start the scheduler"""
+    body = request.json or {}
+    targets = parse_targets(body.get('ip_addresses', []))
+    try:
+        interval = float(body.get('interval', settings.get('monitor_interval', 10)))
+        get_monitor().add_targets(targets, interval=interval)
+    except (TypeError, ValueError) as e:
+        return jsonify({"status": "error", "message": f"Invalid monitoring request: {str(e)}"})
+    get_monitor().start()
+    return jsonify({"status": "success", "message": f"Monitoring {len(targets)} targets every {interval:g}s"})
+
+@app.route('/monitor/remove', methods=['POST'])
+def monitor_remove_targets():
+    """Stop monitoring the given targets"""
+    targets = parse_targets((request.json or {}).get('ip_addresses', []))
+    get_monitor().remove_targets(targets)
+    with monitor_windows_lock:
+        for ip in targets:
+            monitor_windows.pop(ip, None)
+            latency_data.pop(ip)
+    return jsonify({"status": "success", "message": f"Removed {len(targets)} targets"})
+
+@app.route('/monitor/stop', methods=['POST'])
+def monitor_stop():
+    """Pause the scheduler (targets stay registered)"""
+    get_monitor().stop()
+    return jsonify({"status": "success", "message": "Monitoring stopped"})
+
+# Collector for remote probe agents (agent.py)
+vantage_windows = {}  # agent -> {target: SampleSeries of the most recent samples}
+vantage_data = StateStore()  # agent -> {target: stats}, published per frame
+vantage_seen = {}  # agent -> {"recent": deque of recent frame ids, "frames", "hostname", "last_seen"}
+collector_lock = threading.Lock()
+collector_slots = threading.BoundedSemaphore(int(settings.get('collector_concurrency', 4)))
+
+def merge_vantage_frame(frame):
+    """Fold one agent frame into that vantage point's series; False if already merged"""
+    agent = frame["agent"]
+    window_size = int(settings.get('monitor_window', 100))
+    with collector_lock:
+        seen = vantage_seen.setdefault(agent, {"recent": deque(maxlen=1024), "frames": 0})
+        seen["hostname"] = frame.get("hostname")
+        seen["last_seen"] = time.time()
+        # Agents retry frames whose response got lost, so ignore repeats
+        if frame["frame"] in seen["recent"]:
+            return False
+        seen["recent"].append(frame["frame"])
+        seen["frames"] += 1
+        
+        windows = vantage_windows.setdefault(agent, {})
+        for target, ts, rtt, source in frame["samples"]:
+            window = windows.get(target)
+            if window is None:
+                window = windows[target] = SampleSeries(maxlen=window_size)
+            window.append(rtt, source)
+        touched = {target for target, _, _, _ in frame["samples"]}
+        stats = summary_data(build_results({target: windows[target].copy() for target in touched}))
+        # build_results labels the protocol this server would use; the agent
+        # reports the one it actually probed with
+        for entry in stats.values():
+            entry["protocol"] = frame.get("protocol")
+        vantage_data.update({agent: {**vantage_data.get(agent, {}), **stats}})
     
-    ip_addresses = [ip.strip() for ip in data['ip_addresses'].split(',')]
-    num_pings = int(data['num_pings'])
+    # Vantage samples are kept in history as "<target>@<agent>"
+    history.add_samples([(f"{target}@{agent}", ts, rtt, source) for target, ts, rtt, source in frame["samples"]])
+    socketio.emit('vantage_samples', {"agent": agent, "stats": stats})
+    return True
+
+@app.route('/collector/frames', methods=['POST'])
+def collector_frames():
+    """Accept a gzip-compressed sample frame from a probe agent"""
+    token = settings.get('collector_token')
+    if token and request.headers.get('X-Agent-Token') != token:
+        return jsonify({"status": "error", "message": "Invalid agent token"}), 401
+    # Backpressure: when busy, tell the agent to come back later (it spools meanwhile)
+    if not collector_slots.acquire(blocking=False):
+        response = jsonify({"status": "error", "message": "Collector busy"})
+        response.headers['Retry-After'] = '2'
+        return response, 503
+    try:
+        try:
+            frame = decode_frame(request.get_data())
+        except (ValueError, TypeError) as e:
+            return jsonify({"status": "error", "message": str(e)}), 400
+        merged = merge_vantage_frame(frame)
+        return jsonify({"status": "success", "accepted": len(frame["samples"]) if merged else 0, "duplicate": not merged})
+    finally:
+        collector_slots.release()
+
+@app.route('/collector/vantage_points')
+def collector_vantage_points():
+    """Per-vantage-point statistics reported by agents (?agent= for one)"""
+    data = vantage_data.snapshot()
+    agent = request.args.get('agent')
+    if agent:
+        data = {agent: data.get(agent, {})}
+    with collector_lock:
+        agents = {
+            name: {"hostname": seen.get("hostname"), "last_seen": seen.get("last_seen"), "frames": seen["frames"]}
+            for name, seen in vantage_seen.items() if not agent or name == agent
+        }
+    return jsonify({"status": "success", "agents": agents, "data": data})
+
+WORKER_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+def make_engine(num_targets):
+    """ProbeEngine for a sweep, sharded across processes when configured.
     
-    latency_data = {}
-    total_pings = len(ip_addresses) * num_pings
-    current_ping = 0
+    Sharding only pays off once there are enough targets to keep every
+    worker busy, so small sweeps always run in this process. Workers are
+    started with forkserver (spawn where that's missing) rather than fork,
+    which isn't safe from this multi-threaded server.
+    """
+    processes = int(settings.get('probe_processes', 1))
+    max_concurrency = int(settings.get('max_concurrency', 64))
+    interval = float(settings.get('probe_interval', 0.1))
+    timeout = float(settings.get('ping_timeout', 2))
+    if processes > 1 and num_targets >= 2 * processes:
+        # Each worker opens its own prober (and socket) of the same kind
+        probe_args = ("icmp", timeout) if has_admin else ("tcp", timeout, tuple(settings.get('tcp_ports', [80, 443])))
+        return ShardedProbeEngine(
+            probe_args,
+            processes=processes,
+            max_concurrency=max_concurrency,
+            interval=interval,
+            timeout=timeout,
+            start_method=WORKER_START_METHOD
+        )
+    return ProbeEngine(ping_once, max_concurrency=max_concurrency, interval=interval, timeout=timeout)
+
+def emit_to_owner(job, event, payload):
+    """Send a job event to the socket.io client that started the job.
+    
+    Jobs started over REST (POST /jobs) have no owner; they are followed by
+    polling /jobs/<id>, and broadcasting their events would clobber every
+    open dashboard.
+    """
+    if job.owner is None:
+        return
+    payload['job_id'] = job.id
+    socketio.emit(event, payload, to=job.owner)
+
+def run_measurement_job(job):
+    """Run one sweep for the job manager, streaming samples to the job's owner"""
+    def send(event, payload):
+        emit_to_owner(job, event, payload)
+    
+    def on_batch(samples, done, total):
+        job.done = done
+        # One compact frame per batch: progress plus [ip, index, rtt_ms] rows
+        # (rtt_ms is None on loss) so live charts can append as we go
+        send('measurement_samples', {
+            'status': f'Testing {len(job.targets)} targets... ({done}/{total} probes)',
+            'progress': (done / total) * 100,
+            'samples': [[ip, index, sample.rtt_ms if sample else None] for ip, index, sample in samples]
+        })
+    
+    engine = make_engine(len(job.targets))
     
     try:
-        # Measure latency for each IP
-        for ip in ip_addresses:
-            emit('progress', {
-                'status': f'Testing {ip}...',
-                'progress': (current_ping / total_pings) * 100
+        send('progress', {
+            'status': f'Testing {len(job.targets)} targets...',
+            'progress': 0
+        })
+        
+        # Warm the reverse-DNS cache for the map while we measure
+        resolver.prefetch(job.targets)
+        
+        # Probe all targets concurrently
+        results = engine.run(
+            job.targets, job.num_pings,
+            on_batch=on_batch,
+            batch_interval=float(settings.get('stream_interval', 0.25)),
+            cancel=job.cancel_event
+        )
+        
+        job.results = build_results({
+            ip: SampleSeries.from_samples(samples) for ip, samples in results.items() if samples
+        })
+        
+        if job.cancelled:
+            send('measurement_complete', {
+                'status': 'cancelled',
+                'message': 'Measurement cancelled',
+                'data': summary_data(job.results)
             })
-            
-            latencies = []
-            for j in range(num_pings):
-                current_ping += 1
-                
-                try:
-                    if has_admin:
-                        # Use ICMP ping (requires admin)
-                        packet = scapy.IP(dst=ip)/scapy.ICMP()
-                        start_time = time.time()
-                        reply = scapy.sr1(packet, timeout=2, verbose=0, retry=0)
-                        end_time = time.time()
-                        
-                        if reply:
-                            latency = (end_time - start_time) * 1000
-                            latencies.append(latency)
-                        else:
-                            latencies.append(None)
-                    else:
-                        # Fallback to TCP ping (doesn't require admin)
-                        # Try port 80 first, then 443 if that fails
-                        latency = tcp_ping(ip, port=80, timeout=2)
-                        if latency is None:
-                            latency = tcp_ping(ip, port=443, timeout=2)
-                        latencies.append(latency)
-                
-                except Exception as e:
-                    print(f"Error pinging {ip}: {str(e)}")
-                    latencies.append(None)
-                
-                # Send progress update
-                emit('progress', {
-                    'status': f'Testing {ip}... ({j+1}/{num_pings})',
-                    'progress': (current_ping / total_pings) * 100
-                })
-                
-                time.sleep(0.1)  # Reduced delay
-            
-            # Calculate statistics (including networking concepts)
-            valid_latencies = [lat for lat in latencies if lat is not None]
-            avg_latency = sum(valid_latencies) / len(valid_latencies) if valid_latencies else 0
-            min_latency = min(valid_latencies) if valid_latencies else 0
-            max_latency = max(valid_latencies) if valid_latencies else 0
-            packet_loss = (1 - len(valid_latencies)/num_pings) * 100 if num_pings > 0 else 100
-            
-            # Advanced networking metrics
-            jitter = calculate_jitter(valid_latencies)
-            throughput_estimate = calculate_throughput_estimate(avg_latency)
-            
-            # Calculate RTT statistics
-            if valid_latencies:
-                import statistics
-                std_dev = statistics.stdev(valid_latencies) if len(valid_latencies) > 1 else 0
-            else:
-                std_dev = 0
-            
-            latency_data[ip] = {
-                "latencies": latencies,
-                "avg": avg_latency,
-                "min": min_latency,
-                "max": max_latency,
-                "packet_loss": packet_loss,
-                "jitter": jitter,  # Network jitter
-                "std_dev": std_dev,  # Standard deviation
-                "throughput_estimate": throughput_estimate,  # Estimated bandwidth (Mbps)
-                "protocol": "ICMP" if has_admin else "TCP"  # Protocol used
-            }
+            return
+        
+        # Fold the sweep into the current data. Other jobs and the monitor
+        # publish there too, so only this sweep's targets are replaced; each
+        # job's own results stay available from /jobs/<id>/results
+        latency_data.update(job.results)
         
         # Add to historical data
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        historical_data.append({
-            "timestamp": timestamp,
-            "data": latency_data.copy()
-        })
+        history.add_run(results_to_json(job.results))
         
-        # Send completion message
-        emit('measurement_complete', {
+        # Send completion message (statistics only, the samples were streamed)
+        send('measurement_complete', {
             'status': 'success',
-            'data': latency_data
+            'data': summary_data(job.results)
         })
         
     except Exception as e:
         print(f"Measurement error: {str(e)}")
-        emit('measurement_complete', {
+        send('measurement_complete', {
             'status': 'error',
             'message': f'Error during measurement: {str(e)}',
-            'data': latency_data
+            'data': summary_data(job.results)
+        })
+        raise
+
+def notify_job_cancelled(job):
+    """Tell the owner of a job cancelled before it started that it is over"""
+    emit_to_owner(job, 'measurement_complete', {
+        'status': 'cancelled',
+        'message': 'Measurement cancelled',
+        'data': {}
+    })
+
+jobs = JobManager(
+    run_measurement_job,
+    max_workers=int(settings.get('job_workers', 4)),
+    max_jobs=int(settings.get('job_history', 100)),
+    on_cancelled=notify_job_cancelled
+)
+
+def submit_measurement(ip_addresses, num_pings, owner=None):
+    """Validate a sweep request and queue it; returns the Job"""
+    targets = parse_targets(ip_addresses)
+    num_pings = int(num_pings)
+    if not targets or num_pings < 1:
+        raise ValueError("Need at least one target and one ping")
+    return jobs.submit(targets, num_pings, owner=owner)
+
+@socketio.on('start_measurement')
+def handle_measurement(data):
+    try:
+        job = submit_measurement(data['ip_addresses'], data['num_pings'], owner=request.sid)
+    except (KeyError, TypeError, ValueError) as e:
+        emit('measurement_complete', {
+            'status': 'error',
+            'message': f'Invalid measurement request: {str(e)}',
+            'data': {}
         })
+        return
+    emit('job_started', job.to_dict())
+
+@socketio.on('cancel_measurement')
+def handle_cancel_measurement(data):
+    jobs.cancel((data or {}).get('job_id'))
+
+@app.route('/jobs', methods=['GET', 'POST'])
+def jobs_route():
+    """List jobs, or start a sweep with {"ip_addresses", "num_pings"}"""
+    if request.method == 'GET':
+        return jsonify({"status": "success", "jobs": [job.to_dict() for job in reversed(jobs.jobs())]})
+    body = request.json or {}
+    try:
+        job = submit_measurement(
+            body.get('ip_addresses', []),
+            body.get('num_pings', settings.get('default_pings', 5))
+        )
+    except (TypeError, ValueError) as e:
+        return jsonify({"status": "error", "message": f"Invalid measurement request: {str(e)}"})
+    return jsonify({"status": "success", "job_id": job.id, "job": job.to_dict()})
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": "Job not found"}), 404
+    return jsonify({"status": "success", "job": job.to_dict()})
+
+@app.route('/jobs/<job_id>/results')
+def job_results(job_id):
+    """Full results of one job (samples included once it has finished)"""
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": "Job not found"}), 404
+    return jsonify({"status": "success", "job": job.to_dict(), "data": results_to_json(job.results)})
+
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+def job_cancel(job_id):
+    if not jobs.cancel(job_id):
+        return jsonify({"status": "error", "message": "Job not found or already finished"})
+    return jsonify({"status": "success", "message": "Cancellation requested"})
 
 if __name__ == '__main__':
     socketio.run(app, debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,162 @@
+"""Response time and memory of the history, export and map routes as data grows.
+
+    python benchmarks/bench_endpoints.py --history 100,1000,10000 --map-targets 10,100,1000
+    python benchmarks/bench_endpoints.py --json
+
+Runs the Flask app in-process (test client) against a scratch storage
+directory, so the real history is never touched. History is grown in steps
+of ``--history`` runs (``--targets`` targets x ``--pings`` samples each) and
+every step times ``/get_historical_data`` and ``/export_history`` and
+records their peak traced memory; exports are consumed chunk by chunk, as a
+browser download would. ``/generate_map`` is timed for each
+``--map-targets`` count, first render and cached, with targets placed from a
+synthetic GeoIP file and reverse DNS turned off so the network doesn't
+dominate.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from harness import add_output_argument, measure, write_output
+
+import latency_stats
+
+EXPORTS = ("json", "ndjson", "csv", "parquet")
+
+
+def synthetic_run(targets, pings, rng):
+    latencies = {
+        f"10.1.{i // 250}.{i % 250 + 1}": [None if rng.random() < 0.02 else rng.lognormvariate(3, 0.4) for _ in range(pings)]
+        for i in range(targets)
+    }
+    stats = latency_stats.summarize_many(latencies)
+    return {
+        ip: dict(stats[ip], latencies=lat, timestamp_sources=["monotonic"] * pings, protocol="ICMP")
+        for ip, lat in latencies.items()
+    }
+
+
+def write_geoip(path, count):
+    """One /32 range per map target, scattered over the globe"""
+    rng = random.Random(7)
+    with open(path, "w") as f:
+        f.write("start,end,latitude,longitude,name\n")
+        for i in range(count):
+            ip = f"10.2.{i // 250}.{i % 250 + 1}"
+            f.write(f"{ip},{ip},{rng.uniform(-60, 70):.4f},{rng.uniform(-180, 180):.4f},Site {i}\n")
+
+
+def consume(client, url):
+    """Stream a response to the end; returns (status, bytes)"""
+    response = client.get(url, buffered=False)
+    size = sum(len(chunk) for chunk in response.response)
+    response.close()
+    return response.status_code, size
+
+
+def timed_request(client, url, repeat):
+    """Best time over ``repeat`` streamed requests, plus peak memory of one
+    more (traced separately, since tracemalloc slows everything down)"""
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        status, size = consume(client, url)
+        seconds.append(time.perf_counter() - start)
+        if status != 200:
+            raise RuntimeError(f"{url} returned HTTP {status}")
+    _, _, peak = measure(consume, client, url)
+    return {"seconds": min(seconds), "peak_bytes": peak, "bytes": size}
+
+
+def timed_get(client, url):
+    start = time.perf_counter()
+    response = client.get(url)
+    return response, time.perf_counter() - start
+
+
+def run(history_steps=(100, 1000, 10000), targets=10, pings=10, map_targets=(10, 100, 1000), repeat=3, workdir=None):
+    workdir = workdir or tempfile.mkdtemp(prefix="latency-bench-")
+    os.chdir(workdir)  # app reads settings.json and stores history relative to the cwd
+    import app
+    import columnar
+
+    client = app.app.test_client()
+    rng = random.Random(1)
+    results = {"workdir": workdir, "targets_per_run": targets, "pings": pings, "history": [], "map": []}
+
+    runs = 0
+    ts = 1_700_000_000
+    for step in history_steps:
+        while runs < step:
+            app.history.add_run(synthetic_run(targets, pings, rng), timestamp=ts)
+            runs += 1
+            ts += 60
+        row = {"runs": runs, "samples": runs * targets * pings}
+        row["get_historical_data"] = timed_request(client, "/get_historical_data", repeat)
+        row["get_historical_data_summary"] = timed_request(client, "/get_historical_data?summary=1&limit=500", repeat)
+        for format in EXPORTS:
+            if format in columnar.FORMATS and not columnar.available():
+                continue
+            row[f"export_history_{format}"] = timed_request(client, f"/export_history/{format}", repeat)
+        row["export_history_json_gzip"] = timed_request(client, "/export_history/json?gzip=1", repeat)
+        results["history"].append(row)
+        print(f"  history {runs:>7} runs: page {row['get_historical_data']['seconds'] * 1000:8.1f} ms, "
+              f"json export {row['export_history_json']['seconds']:7.2f} s "
+              f"(peak {row['export_history_json']['peak_bytes'] / 1e6:6.1f} MB)")
+
+    # Map: place synthetic targets offline, skip reverse DNS
+    geoip_path = os.path.join(workdir, "bench_geoip.csv")
+    write_geoip(geoip_path, max(map_targets))
+    app.settings.update({"geoip_database": geoip_path})
+    app.map_cache.static_dir = workdir
+    app.map_cache.resolve_names = None
+    for count in map_targets:
+        latencies = {f"10.2.{i // 250}.{i % 250 + 1}": [rng.lognormvariate(3, 0.6) for _ in range(pings)] for i in range(count)}
+        stats = latency_stats.summarize_many(latencies)
+        app.latency_data.replace({ip: dict(stats[ip], protocol="ICMP") for ip in latencies})
+        first = timed_get(client, "/generate_map")
+        cached = timed_get(client, "/generate_map")
+        map_data = timed_get(client, "/map_data")
+        if first[0].json.get("status") != "success":
+            raise RuntimeError(f"/generate_map failed: {first[0].json}")
+        # Render once more from scratch with tracing on for the memory peak
+        app.map_cache.invalidate()
+        _, _, peak = measure(client.get, "/generate_map")
+        row = {
+            "targets": count,
+            "markers": len(map_data[0].json.get("markers", [])),
+            "generate_map_s": first[1],
+            "generate_map_peak_bytes": peak,
+            "generate_map_cached_s": cached[1],
+            "map_data_s": map_data[1]
+        }
+        results["map"].append(row)
+        print(f"  map {count:>6} targets: render {row['generate_map_s'] * 1000:8.1f} ms, "
+              f"cached {row['generate_map_cached_s'] * 1000:6.2f} ms, map_data {row['map_data_s'] * 1000:6.1f} ms")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--history", default="100,1000,10000", help="History sizes (runs) to measure at")
+    parser.add_argument("--targets", type=int, default=10, help="Targets per history run")
+    parser.add_argument("--pings", type=int, default=10, help="Samples per target per run")
+    parser.add_argument("--map-targets", default="10,100,1000", help="Target counts for /generate_map")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--workdir", default=None, help="Scratch directory (default: a new temp dir, kept for inspection)")
+    add_output_argument(parser)
+    args = parser.parse_args()
+
+    result = run(
+        [int(n) for n in args.history.split(",")],
+        args.targets, args.pings,
+        [int(n) for n in args.map_targets.split(",")],
+        args.repeat, args.workdir
+    )
+    write_output(args, "endpoints", result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""Probe throughput (probes/sec) of the probe engines on loopback or behind netem.
+
+    python benchmarks/bench_probes.py --targets 200 --pings 20
+    sudo python benchmarks/bench_probes.py --netem 20ms --processes 4 --json
+
+Loopback runs need no setup: every 127.0.0.0/8 address answers ICMP, and a
+local listener answers the TCP probes. ``--netem`` moves the targets into a
+network namespace behind a veth pair with ``tc netem`` delay (needs root and
+iproute2), which shows how the engines cope with real in-flight time.
+"""
+import argparse
+import contextlib
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+from harness import add_output_argument, write_output
+
+from probe_engine import ProbeEngine
+from sharded_engine import ShardedProbeEngine, open_probe
+
+NETNS = "latbench"
+HOST_IF, NS_IF = "latb0", "latb1"
+HOST_ADDR = "10.203.0.1"
+
+# Stand-alone TCP listener started inside the namespace
+LISTENER = """
+import socket, sys
+s = socket.socket(); s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+s.bind(("0.0.0.0", int(sys.argv[1]))); s.listen(4096)
+while True:
+    c, _ = s.accept(); c.close()
+"""
+
+
+@contextlib.contextmanager
+def loopback(num_targets, port):
+    """Targets on 127.0.0.0/8 plus a TCP listener for them"""
+    server = socket.socket()
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind(("0.0.0.0", port))
+    server.listen(4096)
+
+    def accept():
+        while True:
+            try:
+                conn, _ = server.accept()
+            except OSError:
+                return
+            conn.close()
+
+    threading.Thread(target=accept, daemon=True).start()
+    try:
+        yield [f"127.0.{i // 250}.{i % 250 + 1}" for i in range(num_targets)]
+    finally:
+        server.close()
+
+
+def _ip(*args, check=True):
+    return subprocess.run(["ip"] + list(args), check=check, capture_output=True, text=True)
+
+
+@contextlib.contextmanager
+def netem(num_targets, port, delay, loss=None):
+    """Targets in a network namespace behind a veth pair with netem delay"""
+    if num_targets > 250:
+        raise ValueError("--netem supports up to 250 targets")
+    _ip("netns", "del", NETNS, check=False)
+    _ip("link", "del", HOST_IF, check=False)
+    listener = None
+    try:
+        _ip("netns", "add", NETNS)
+        _ip("link", "add", HOST_IF, "type", "veth", "peer", "name", NS_IF)
+        _ip("link", "set", NS_IF, "netns", NETNS)
+        _ip("addr", "add", f"{HOST_ADDR}/24", "dev", HOST_IF)
+        _ip("link", "set", HOST_IF, "up")
+        targets = [f"10.203.0.{i + 2}" for i in range(num_targets)]
+        for target in targets:
+            _ip("netns", "exec", NETNS, "ip", "addr", "add", f"{target}/24", "dev", NS_IF)
+        _ip("netns", "exec", NETNS, "ip", "link", "set", NS_IF, "up")
+        _ip("netns", "exec", NETNS, "ip", "link", "set", "lo", "up")
+        qdisc = ["tc", "qdisc", "add", "dev", HOST_IF, "root", "netem", "delay", delay, "limit", "100000"]
+        if loss:
+            qdisc += ["loss", loss]
+        added = subprocess.run(qdisc, capture_output=True, text=True)
+        if added.returncode:
+            raise RuntimeError(f"tc netem failed (is sch_netem available?): {added.stderr.strip()}")
+        listener = subprocess.Popen(
+            ["ip", "netns", "exec", NETNS, sys.executable, "-c", LISTENER, str(port)],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        time.sleep(0.5)  # let the listener bind
+        yield targets
+    finally:
+        if listener is not None:
+            listener.terminate()
+            listener.wait()
+        _ip("link", "del", HOST_IF, check=False)
+        _ip("netns", "del", NETNS, check=False)
+
+
+def run_engine(engine, targets, pings):
+    start = time.perf_counter()
+    results = engine.run(targets, pings)
+    elapsed = time.perf_counter() - start
+    rtts = sorted(s.rtt_ms for samples in results.values() for s in samples if s is not None and s.rtt_ms is not None)
+    total = len(targets) * pings
+    return {
+        "seconds": elapsed,
+        "probes": total,
+        "probes_per_sec": total / elapsed,
+        "loss_pct": (1 - len(rtts) / total) * 100,
+        "p50_ms": rtts[len(rtts) // 2] if rtts else None,
+        "p99_ms": rtts[int(len(rtts) * 0.99)] if rtts else None
+    }
+
+
+def bench_traceroute(targets, repeat=3):
+    """Seconds per traceroute to the first target (raw ICMP only)"""
+    from icmp_prober import IcmpProber
+    prober = IcmpProber(timeout=2)
+    try:
+        if not prober.raw:
+            return None
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            prober.traceroute(targets[0], max_hops=8, probes_per_hop=3)
+            timings.append(time.perf_counter() - start)
+        return min(timings)
+    finally:
+        prober.close()
+
+
+def run(targets=200, pings=20, processes=(1, 4), probers=("icmp", "tcp"), concurrency=256,
+        netem_delay=None, netem_loss=None, port=18765, timeout=2):
+    setup = netem(targets, port, netem_delay, netem_loss) if netem_delay else loopback(targets, port)
+    results = {
+        "network": f"netem {netem_delay}" + (f" loss {netem_loss}" if netem_loss else "") if netem_delay else "loopback",
+        "targets": targets,
+        "pings": pings,
+        "runs": []
+    }
+    with setup as target_list:
+        for kind in probers:
+            probe_args = (kind, timeout, (port,)) if kind == "tcp" else (kind, timeout)
+            try:
+                probe = open_probe(*probe_args)
+            except OSError as e:
+                print(f"  skipping {kind}: {str(e)}")
+                continue
+            for count in processes:
+                if count == 1:
+                    engine = ProbeEngine(probe, max_concurrency=concurrency, interval=0, timeout=timeout)
+                else:
+                    engine = ShardedProbeEngine(probe_args, processes=count, max_concurrency=concurrency,
+                                                interval=0, timeout=timeout)
+                result = run_engine(engine, target_list, pings)
+                result.update({"prober": kind, "processes": count})
+                results["runs"].append(result)
+        results["traceroute_s"] = bench_traceroute(target_list) if "icmp" in probers else None
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--targets", type=int, default=200)
+    parser.add_argument("--pings", type=int, default=20)
+    parser.add_argument("--processes", default="1,4", help="Comma separated worker process counts (1 = ProbeEngine)")
+    parser.add_argument("--probers", default="icmp,tcp")
+    parser.add_argument("--concurrency", type=int, default=256)
+    parser.add_argument("--netem", default=None, metavar="DELAY", help="Run behind tc netem with this delay, e.g. 20ms")
+    parser.add_argument("--netem-loss", default=None, metavar="PCT", help="Also drop this share of packets, e.g. 1%%")
+    parser.add_argument("--port", type=int, default=18765, help="Port of the local TCP listener")
+    add_output_argument(parser)
+    args = parser.parse_args()
+
+    result = run(
+        args.targets, args.pings,
+        processes=[int(p) for p in args.processes.split(",")],
+        probers=[p.strip() for p in args.probers.split(",")],
+        concurrency=args.concurrency,
+        netem_delay=args.netem,
+        netem_loss=args.netem_loss,
+        port=args.port
+    )
+    print(f"{result['targets']} targets x {result['pings']} pings on {result['network']}")
+    for r in result["runs"]:
+        p50 = f"{r['p50_ms']:.3f}" if r['p50_ms'] is not None else "-"
+        print(f"  {r['prober']:4} x{r['processes']:<2} {r['probes_per_sec']:10.0f} probes/s  "
+              f"{r['seconds']:7.2f} s  loss {r['loss_pct']:5.1f}%  p50 {p50} ms")
+    if result["traceroute_s"] is not None:
+        print(f"  traceroute            {result['traceroute_s'] * 1000:9.1f} ms")
+    write_output(args, "probes", result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Compare the vectorized statistics pipeline with the old per-target loop.
+
+    python benchmarks/bench_stats.py --targets 10000 --samples 100
+    python benchmarks/bench_stats.py --json
+"""
+import argparse
+import random
+import statistics
+
+from harness import add_output_argument, best_of, write_output
+
+import latency_stats
+
+
+def python_summary(latencies):
+    """The per-target loop handle_measurement used before latency_stats"""
+    valid_latencies = [lat for lat in latencies if lat is not None]
+    avg_latency = sum(valid_latencies) / len(valid_latencies) if valid_latencies else 0
+    differences = [abs(valid_latencies[i] - valid_latencies[i-1]) for i in range(1, len(valid_latencies))]
+    return {
+        "avg": avg_latency,
+        "min": min(valid_latencies) if valid_latencies else 0,
+        "max": max(valid_latencies) if valid_latencies else 0,
+        "packet_loss": (1 - len(valid_latencies)/len(latencies)) * 100 if latencies else 100,
+        "jitter": sum(differences) / len(differences) if differences else 0,
+        "std_dev": statistics.stdev(valid_latencies) if len(valid_latencies) > 1 else 0,
+        "throughput_estimate": (65536 * 8) / (avg_latency / 1000) / 1_000_000 if avg_latency else 0
+    }
+
+
+def synthetic_samples(targets, samples, loss=0.05, seed=1):
+    rng = random.Random(seed)
+    return {
+        f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}": [
+            None if rng.random() < loss else rng.lognormvariate(3, 0.5) for _ in range(samples)
+        ]
+        for i in range(targets)
+    }
+
+
+def run(targets=10000, samples=100, loss=0.05, repeat=3):
+    data = synthetic_samples(targets, samples, loss)
+    python_s = best_of(repeat, lambda d: {ip: python_summary(l) for ip, l in d.items()}, data)
+    numpy_s = best_of(repeat, latency_stats.summarize_many, data)
+    matrix, lengths = latency_stats.to_matrix(list(data.values()))
+    matrix_s = best_of(repeat, latency_stats.summarize_matrix, matrix, lengths)
+    return {
+        "targets": targets,
+        "samples": samples,
+        "loss": loss,
+        "python_loop_s": python_s,
+        "summarize_many_s": numpy_s,
+        "summarize_matrix_s": matrix_s,
+        "samples_per_sec": targets * samples / numpy_s,
+        "speedup": python_s / numpy_s,
+        "speedup_matrix_only": python_s / matrix_s
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--targets", type=int, default=10000)
+    parser.add_argument("--samples", type=int, default=100)
+    parser.add_argument("--loss", type=float, default=0.05)
+    parser.add_argument("--repeat", type=int, default=3)
+    add_output_argument(parser)
+    args = parser.parse_args()
+
+    result = run(args.targets, args.samples, args.loss, args.repeat)
+    print(f"{result['targets']} targets x {result['samples']} samples ({result['loss']:.0%} loss)")
+    print(f"  pure Python loop         {result['python_loop_s'] * 1000:9.1f} ms")
+    print(f"  summarize_many (lists)   {result['summarize_many_s'] * 1000:9.1f} ms  ({result['speedup']:.1f}x)")
+    print(f"  summarize_matrix (array) {result['summarize_matrix_s'] * 1000:9.1f} ms  ({result['speedup_matrix_only']:.1f}x)")
+    write_output(args, "stats", result)
+
+
+if __name__ == "__main__":
+    main()
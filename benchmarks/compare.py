@@ -0,0 +1,86 @@
+"""Compare two saved benchmark results metric by metric.
+
+    python benchmarks/compare.py benchmarks/results/suite-A.json benchmarks/results/suite-B.json
+
+Prints every timing, throughput and memory figure found in both files with
+the new/old ratio, flagging changes beyond ``--threshold``.
+"""
+import argparse
+import json
+
+# Leaf names compared, and whether a larger value is better
+METRICS = {
+    "seconds": False,
+    "peak_bytes": False,
+    "probes_per_sec": True,
+    "samples_per_sec": True,
+    "speedup": True
+}
+SUFFIXES = {"_s": False, "_peak_bytes": False}
+
+
+def _direction(name):
+    if name in METRICS:
+        return METRICS[name]
+    for suffix, higher_is_better in SUFFIXES.items():
+        if name.endswith(suffix):
+            return higher_is_better
+    return None
+
+
+def _label(item, index):
+    """Readable key for one element of a list of result rows"""
+    if isinstance(item, dict):
+        for keys in (("network",), ("prober", "processes"), ("runs",), ("targets", "samples", "loss"), ("targets",)):
+            if all(key in item for key in keys):
+                return ",".join(f"{key}={item[key]}" for key in keys)
+    return str(index)
+
+
+def flatten(value, prefix=""):
+    """``{path: number}`` for every comparable metric in a results tree"""
+    metrics = {}
+    if isinstance(value, dict):
+        for key, item in value.items():
+            path = f"{prefix}/{key}" if prefix else key
+            if isinstance(item, (int, float)) and not isinstance(item, bool):
+                if _direction(key) is not None:
+                    metrics[path] = (item, _direction(key))
+            else:
+                metrics.update(flatten(item, path))
+    elif isinstance(value, list):
+        for index, item in enumerate(value):
+            metrics.update(flatten(item, f"{prefix}[{_label(item, index)}]"))
+    return metrics
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative change worth flagging (default 10%%)")
+    args = parser.parse_args()
+
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    print(f"old: {old['environment'].get('commit')} {old['environment'].get('timestamp')}")
+    print(f"new: {new['environment'].get('commit')} {new['environment'].get('timestamp')}")
+
+    old_metrics = flatten(old["results"])
+    new_metrics = flatten(new["results"])
+    for path in sorted(set(old_metrics) & set(new_metrics)):
+        (before, higher_is_better), (after, _) = old_metrics[path], new_metrics[path]
+        if not before:
+            continue
+        ratio = after / before
+        better = ratio > 1 if higher_is_better else ratio < 1
+        flag = ""
+        if abs(ratio - 1) >= args.threshold:
+            flag = "  better" if better else "  WORSE"
+        print(f"  {path:90} {before:14.6g} -> {after:14.6g}  x{ratio:6.2f}{flag}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Shared helpers for the benchmark scripts: timing, memory and JSON results."""
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+def best_of(repeat, fn, *args):
+    """Fastest of ``repeat`` calls, in seconds"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def measure(fn, *args):
+    """(result, seconds, peak traced bytes) of one call"""
+    tracemalloc.start()
+    try:
+        start = time.perf_counter()
+        result = fn(*args)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, timeout=10
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def environment():
+    """What a result was measured on, so runs can be compared fairly"""
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count()
+    }
+
+
+def save(name, results, path=None):
+    """Write ``{"benchmark", "environment", "results"}`` as JSON; returns the path.
+
+    Without a path the file goes to benchmarks/results/<name>-<time>-<commit>.json.
+    """
+    env = environment()
+    if path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        path = os.path.join(RESULTS_DIR, f"{name}-{stamp}-{env['commit'] or 'nogit'}.json")
+    with open(path, "w") as f:
+        json.dump({"benchmark": name, "environment": env, "results": results}, f, indent=2)
+    return path
+
+
+def add_output_argument(parser):
+    parser.add_argument("--json", nargs="?", const="", default=None, metavar="PATH",
+                        help="Save results as JSON (default path: benchmarks/results/)")
+
+
+def write_output(args, name, results):
+    if args.json is not None:
+        print(f"Saved {save(name, results, args.json or None)}")
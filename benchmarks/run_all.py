@@ -0,0 +1,60 @@
+"""Run every benchmark and save one JSON file for later comparison.
+
+    python benchmarks/run_all.py                 # -> benchmarks/results/suite-<time>-<commit>.json
+    python benchmarks/run_all.py --quick --json out.json
+    sudo python benchmarks/run_all.py --netem 20ms
+
+Compare two saved runs with ``benchmarks/compare.py``.
+"""
+import argparse
+
+from harness import save
+
+import bench_endpoints
+import bench_probes
+import bench_stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--quick", action="store_true", help="Smaller sizes, for a smoke test")
+    parser.add_argument("--netem", default=None, metavar="DELAY", help="Also measure probes behind tc netem (root)")
+    parser.add_argument("--json", default=None, metavar="PATH", help="Output path (default: benchmarks/results/)")
+    args = parser.parse_args()
+
+    if args.quick:
+        stats_args = {"targets": 1000, "samples": 50, "repeat": 1}
+        probe_args = {"targets": 50, "pings": 5, "processes": (1, 2)}
+        endpoint_args = {"history_steps": (100, 1000), "map_targets": (10, 100), "repeat": 1}
+    else:
+        stats_args = {}
+        probe_args = {}
+        endpoint_args = {}
+
+    results = {}
+    print("Statistics")
+    results["stats"] = [bench_stats.run(**stats_args), bench_stats.run(**dict(stats_args, loss=0.3))]
+    for r in results["stats"]:
+        print(f"  {r['targets']} x {r['samples']} ({r['loss']:.0%} loss): summarize_many {r['summarize_many_s'] * 1000:.1f} ms "
+              f"({r['speedup']:.1f}x over the Python loop)")
+
+    print("Probes")
+    results["probes"] = [bench_probes.run(**probe_args)]
+    if args.netem:
+        try:
+            results["probes"].append(bench_probes.run(**dict(probe_args, netem_delay=args.netem)))
+        except (RuntimeError, OSError) as e:
+            print(f"  skipping netem: {str(e)}")
+    for result in results["probes"]:
+        for r in result["runs"]:
+            print(f"  {result['network']}: {r['prober']} x{r['processes']} {r['probes_per_sec']:.0f} probes/s")
+
+    # Last: this one changes the working directory and imports the app
+    print("Endpoints")
+    results["endpoints"] = bench_endpoints.run(**endpoint_args)
+
+    print(f"Saved {save('suite', results, args.json)}")
+
+
+if __name__ == "__main__":
+    main()
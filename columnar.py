@@ -0,0 +1,298 @@
+import io
+import os
+
+# pyarrow is optional: only the Arrow/Parquet export and import need it
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+from history_store import SUMMARY_FIELDS, to_epoch
+
+# format -> (content type, file extension)
+FORMATS = {
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+    "parquet": ("application/vnd.apache.parquet", "parquet")
+}
+
+TABLES = ("runs", "samples")
+
+# Rows per record batch / Parquet row group
+BATCH_ROWS = 50_000
+
+PARQUET_MAGIC = b"PAR1"
+ARROW_FILE_MAGIC = b"ARROW1"
+
+
+def available():
+    return pa is not None
+
+
+def _require():
+    if pa is None:
+        raise RuntimeError("Arrow/Parquet support needs pyarrow (pip install pyarrow)")
+
+
+def runs_schema():
+    """One row per (run, target): summary columns plus the raw samples as lists"""
+    _require()
+    return pa.schema(
+        [
+            ("run_id", pa.int64()),
+            ("timestamp", pa.string()),
+            ("ts", pa.float64()),
+            ("target", pa.string())
+        ]
+        + [(field, pa.float64()) for field in SUMMARY_FIELDS]
+        + [
+            ("protocol", pa.string()),
+            ("latencies", pa.list_(pa.float64())),
+            ("timestamp_sources", pa.list_(pa.string()))
+        ]
+    )
+
+
+def samples_schema():
+    """One row per raw sample (run_id is null for monitor samples)"""
+    _require()
+    return pa.schema([
+        ("target", pa.string()),
+        ("ts", pa.float64()),
+        ("rtt_ms", pa.float64()),
+        ("source", pa.string()),
+        ("run_id", pa.int64())
+    ])
+
+
+def _run_rows(runs):
+    """Flatten history runs (``{"id", "timestamp", "ts", "data"}``) into runs_schema rows.
+
+    ``ts`` is the exact stored time; runs without one (the desktop tool's
+    history) fall back to the second-resolution timestamp string.
+    """
+    for run in runs:
+        ts = run.get("ts")
+        if ts is None:
+            ts = to_epoch(run["timestamp"])
+        for target, stats in run["data"].items():
+            yield (
+                (run.get("id"), run["timestamp"], ts, target)
+                + tuple(stats.get(field) for field in SUMMARY_FIELDS)
+                + (stats.get("protocol"), stats.get("latencies"), stats.get("timestamp_sources"))
+            )
+
+
+def _batches(rows, schema, batch_rows=BATCH_ROWS):
+    """Group row tuples into RecordBatches of ``batch_rows``"""
+    names = schema.names
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= batch_rows:
+            yield pa.RecordBatch.from_arrays(
+                [pa.array(column, type=schema.field(i).type) for i, column in enumerate(zip(*chunk))],
+                names=names
+            )
+            chunk = []
+    if chunk:
+        yield pa.RecordBatch.from_arrays(
+            [pa.array(column, type=schema.field(i).type) for i, column in enumerate(zip(*chunk))],
+            names=names
+        )
+
+
+def run_batches(runs, batch_rows=BATCH_ROWS):
+    return _batches(_run_rows(runs), runs_schema(), batch_rows)
+
+
+def sample_batches(rows, batch_rows=BATCH_ROWS):
+    """Batches from (target, ts, rtt_ms, source, run_id) rows"""
+    return _batches(rows, samples_schema(), batch_rows)
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object whose contents are collected and drained as chunks"""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _writer(sink, schema, format):
+    if format == "arrow":
+        return pa.ipc.new_stream(sink, schema)
+    if format == "parquet":
+        return pq.ParquetWriter(sink, schema, compression="zstd")
+    raise ValueError(f"Unknown columnar format: {format}")
+
+
+def _write(writer, batch, format):
+    if format == "parquet":
+        writer.write_table(pa.Table.from_batches([batch]))
+    else:
+        writer.write_batch(batch)
+
+
+def iter_encoded(batches, schema, format):
+    """Bytes chunks of an Arrow IPC stream or Parquet file, one per batch.
+
+    Only one record batch is held at a time, so output of any size is
+    produced in constant memory.
+    """
+    _require()
+    sink = _ChunkSink()
+    writer = _writer(sink, schema, format)
+    for batch in batches:
+        _write(writer, batch, format)
+        data = sink.drain()
+        if data:
+            yield data
+    writer.close()
+    yield sink.drain()
+
+
+def write_file(path, batches, schema, format):
+    """Write batches to ``path`` as Arrow IPC stream or Parquet"""
+    _require()
+    with open(path, "wb") as f:
+        for chunk in iter_encoded(batches, schema, format):
+            f.write(chunk)
+
+
+def read_batches(source):
+    """Record batches from an Arrow IPC (stream or file) or Parquet file.
+
+    ``source`` is a path or a binary file object; the format is detected
+    from its magic bytes.
+    """
+    _require()
+    if isinstance(source, (str, os.PathLike)):
+        source = open(source, "rb")
+    head = source.read(8)
+    source.seek(0)
+    if head[:4] == PARQUET_MAGIC:
+        yield from pq.ParquetFile(source).iter_batches(batch_size=BATCH_ROWS)
+    elif head[:6] == ARROW_FILE_MAGIC:
+        reader = pa.ipc.open_file(source)
+        for i in range(reader.num_record_batches):
+            yield reader.get_batch(i)
+    else:
+        yield from pa.ipc.open_stream(source)
+
+
+def table_kind(schema):
+    """'runs' or 'samples' depending on the columns of an exported table"""
+    names = set(schema.names)
+    if {"run_id", "timestamp", "target", "avg"} <= names:
+        return "runs"
+    if {"target", "ts", "rtt_ms"} <= names:
+        return "samples"
+    raise ValueError("Not a latency history export (expected runs or samples columns)")
+
+
+def iter_runs(batches):
+    """Rebuild ``{"id", "timestamp", "ts", "data"}`` runs from runs_schema batches.
+
+    Rows of one run are consecutive in an export, so a run is yielded as soon
+    as the next one starts.
+    """
+    current, current_key = None, None
+    for batch in batches:
+        for row in batch.to_pylist():
+            key = (row.get("run_id"), row["timestamp"])
+            if current is None or key != current_key:
+                if current is not None:
+                    yield current
+                current_key = key
+                current = {"id": row.get("run_id"), "timestamp": row["timestamp"], "ts": row.get("ts"), "data": {}}
+            stats = {"latencies": row.get("latencies") or []}
+            for field in SUMMARY_FIELDS:
+                stats[field] = row.get(field)
+            stats["protocol"] = row.get("protocol")
+            if row.get("timestamp_sources") is not None:
+                stats["timestamp_sources"] = row["timestamp_sources"]
+            current["data"][row["target"]] = stats
+    if current is not None:
+        yield current
+
+
+def iter_sample_rows(batches):
+    """(target, ts, rtt_ms, source, run_id) tuples from samples_schema batches"""
+    for batch in batches:
+        columns = batch.to_pydict()
+        size = batch.num_rows
+        yield from zip(
+            columns["target"],
+            columns["ts"],
+            columns["rtt_ms"],
+            columns.get("source", [None] * size),
+            columns.get("run_id", [None] * size)
+        )
+
+
+def import_into(history, source):
+    """Load an exported runs or samples table back into a HistoryStore.
+
+    Runs are re-added with their original timestamps (their raw samples
+    and rollups come with them). From a samples table only samples without
+    a run are added, since sweep samples come back with the runs export.
+    Anything already stored, keyed on (ts, target), is skipped, so importing
+    the same file twice adds nothing the second time. Returns
+    ``{"table", "runs", "samples", "skipped"}`` counts.
+    """
+    batches = read_batches(source)
+    first = next(batches, None)
+    if first is None:
+        return {"table": None, "runs": 0, "samples": 0, "skipped": 0}
+    kind = table_kind(first.schema)
+
+    def all_batches():
+        yield first
+        yield from batches
+
+    if kind == "runs":
+        count = skipped = 0
+        for run in iter_runs(all_batches()):
+            ts = run["ts"] if run["ts"] is not None else to_epoch(run["timestamp"])
+            known = history.targets_at(ts)
+            data = {target: stats for target, stats in run["data"].items() if target not in known}
+            skipped += len(run["data"]) - len(data)
+            if data:
+                history.add_run(data, timestamp=ts)
+                count += 1
+        return {"table": kind, "runs": count, "samples": 0, "skipped": skipped}
+
+    count = skipped = 0
+    for batch in all_batches():
+        # Standalone samples only; sweep samples come back with their runs
+        rows = [(target, ts, rtt, source) for target, ts, rtt, source, run_id in iter_sample_rows([batch])
+                if run_id is None]
+        if not rows:
+            continue
+        stored = history.stored_samples([(target, ts) for target, ts, _, _ in rows])
+        missing = [row for row in rows if (row[0], row[1]) not in stored]
+        skipped += len(rows) - len(missing)
+        if missing:
+            history.add_samples(missing)
+            count += len(missing)
+    return {"table": kind, "runs": 0, "samples": count, "skipped": skipped}
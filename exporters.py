@@ -0,0 +1,122 @@
+import csv
+import io
+import json
+import zlib
+
+# Content types for each export format
+FORMATS = {
+    "csv": "text/csv",
+    "json": "application/json",
+    "ndjson": "application/x-ndjson"
+}
+
+STATS_HEADER = ["Average Latency (ms)", "Min Latency (ms)", "Max Latency (ms)", "Packet Loss (%)"]
+
+# Bytes handed to the server per write; keeps per-chunk overhead negligible
+CHUNK_SIZE = 64 * 1024
+
+
+def _stats_cells(stats):
+    return [
+        f"{stats['avg']:.2f}",
+        f"{stats['min']:.2f}",
+        f"{stats['max']:.2f}",
+        f"{stats['packet_loss']:.1f}"
+    ]
+
+
+def iter_csv(header, rows, chunk_size=CHUNK_SIZE):
+    """CSV text in chunks of roughly ``chunk_size`` characters"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= chunk_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def iter_json_array(items):
+    """A JSON array written one element at a time"""
+    yield "["
+    first = True
+    for item in items:
+        yield ("\n" if first else ",\n") + json.dumps(item)
+        first = False
+    yield "\n]\n"
+
+
+def iter_json_object(pairs):
+    """A JSON object written one (key, value) member at a time"""
+    yield "{"
+    first = True
+    for key, value in pairs:
+        yield ("\n" if first else ",\n") + json.dumps(key) + ": " + json.dumps(value)
+        first = False
+    yield "\n}\n"
+
+
+def iter_ndjson(items):
+    for item in items:
+        yield json.dumps(item) + "\n"
+
+
+def coalesce(chunks, chunk_size=CHUNK_SIZE):
+    """Join small string chunks into ~``chunk_size`` pieces"""
+    parts = []
+    size = 0
+    for chunk in chunks:
+        parts.append(chunk)
+        size += len(chunk)
+        if size >= chunk_size:
+            yield "".join(parts)
+            parts = []
+            size = 0
+    if parts:
+        yield "".join(parts)
+
+
+def encode(chunks, compress=False, level=6):
+    """UTF-8 bytes, optionally as one gzip stream, chunk by chunk"""
+    if not compress:
+        for chunk in chunks:
+            yield chunk.encode("utf-8")
+        return
+    gzip = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31 = gzip container
+    for chunk in chunks:
+        data = gzip.compress(chunk.encode("utf-8"))
+        if data:
+            yield data
+    yield gzip.flush()
+
+
+def export_history(runs, format):
+    """Text chunks for an iterable of history runs (``{"id", "timestamp", "data"}``)"""
+    if format == "csv":
+        rows = (
+            [run["timestamp"], ip] + _stats_cells(stats)
+            for run in runs
+            for ip, stats in run["data"].items()
+        )
+        return iter_csv(["Timestamp", "IP"] + STATS_HEADER, rows)
+    if format == "json":
+        return coalesce(iter_json_array(runs))
+    if format == "ndjson":
+        return coalesce(iter_ndjson(runs))
+    raise ValueError(f"Unknown export format: {format}")
+
+
+def export_current(data, format):
+    """Text chunks for current results given as ``(ip, entry)`` pairs (entries in JSON shape)"""
+    if format == "csv":
+        rows = ([ip] + _stats_cells(stats) for ip, stats in data)
+        return iter_csv(["IP"] + STATS_HEADER, rows)
+    if format == "json":
+        return coalesce(iter_json_object(data))
+    if format == "ndjson":
+        return coalesce(iter_ndjson(dict(ip=ip, **entry) for ip, entry in data))
+    raise ValueError(f"Unknown export format: {format}")
@@ -0,0 +1,197 @@
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS geocodes (
+    key TEXT PRIMARY KEY,
+    name TEXT,
+    lat REAL,
+    lon REAL,
+    expires REAL NOT NULL
+);
+"""
+
+
+def nominatim_geocoder(geolocator, timeout=10):
+    """Adapt a geopy geocoder to ``geocode(query) -> (name, lat, lon) or None``"""
+    def geocode(query):
+        location = geolocator.geocode(query, timeout=timeout)
+        if location is None:
+            return None
+        return (location.address, location.latitude, location.longitude)
+    return geocode
+
+
+class GeocodeCache:
+    """SQLite-backed cache in front of a (slow, rate-limited) geocoder.
+
+    Results are stored under both the IP and the hostname that was looked
+    up, so a target is found again even after its reverse DNS changes, and
+    several IPs sharing a hostname cost one remote call. Hits expire after
+    ``ttl`` seconds; "not found" answers are cached too, for
+    ``negative_ttl``. Errors (timeouts, rate limiting) are not cached.
+    Remote calls are spaced at least ``min_interval`` seconds apart
+    (Nominatim's usage policy asks for one per second), so ``prefetch`` can
+    run alongside a measurement without bursting.
+
+    ``geocode(query)`` is any callable returning ``(name, lat, lon)`` or
+    None, so tests can pass a local stub instead of Nominatim.
+    """
+
+    def __init__(self, path, geocode, ttl=30 * 86400, negative_ttl=86400, min_interval=1.0, max_workers=4):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.geocode = geocode
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.min_interval = min_interval
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._db_lock = threading.Lock()
+        self._throttle_lock = threading.Lock()
+        self._last_call = 0.0
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="geocode")
+        self._in_flight = {}  # query -> Future, so concurrent callers share one remote call
+        self._in_flight_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    # Storage
+
+    def _get(self, key):
+        """(found, location) from the cache; found is False on a miss or expiry"""
+        with self._db_lock:
+            row = self._conn.execute(
+                "SELECT name, lat, lon, expires FROM geocodes WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or row[3] < time.time():
+            return False, None
+        if row[1] is None:
+            return True, None  # cached "not found"
+        return True, (row[0], row[1], row[2])
+
+    def _put(self, keys, location):
+        expires = time.time() + (self.ttl if location is not None else self.negative_ttl)
+        name, lat, lon = location if location is not None else (None, None, None)
+        with self._db_lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO geocodes (key, name, lat, lon, expires) VALUES (?, ?, ?, ?, ?)",
+                [(key, name, lat, lon, expires) for key in keys]
+            )
+
+    def purge_expired(self):
+        with self._db_lock, self._conn:
+            return self._conn.execute("DELETE FROM geocodes WHERE expires < ?", (time.time(),)).rowcount
+
+    def clear(self):
+        with self._db_lock, self._conn:
+            self._conn.execute("DELETE FROM geocodes")
+
+    # Lookups
+
+    def _remote(self, query):
+        """Call the geocoder, spacing calls min_interval apart"""
+        with self._throttle_lock:
+            delay = self._last_call + self.min_interval - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            try:
+                return self.geocode(query)
+            finally:
+                self._last_call = time.monotonic()
+
+    def locate(self, ip, hostname=None):
+        """(name, lat, lon) for a target, or None if it can't be geocoded.
+
+        Checks the IP, then the hostname, in the cache before geocoding the
+        hostname (or the IP when it has none).
+        """
+        keys = ["ip:" + ip]
+        query = hostname or ip
+        if hostname:
+            keys.append("host:" + hostname)
+        for key in keys:
+            found, location = self._get(key)
+            if found:
+                self.hits += 1
+                if key != keys[0]:
+                    self._put(keys[:1], location)
+                return location
+        self.misses += 1
+
+        # Share one remote call between threads asking for the same query.
+        # The owner caches the answer before it stops being in flight, so a
+        # caller that finds no call in flight finds the answer cached instead
+        with self._in_flight_lock:
+            future = self._in_flight.get(query)
+            owner = future is None
+            if owner:
+                found, location = self._get(keys[-1])
+                if found:
+                    self._put(keys, location)
+                    return location
+                future = self._in_flight[query] = Future()
+        if owner:
+            try:
+                location = self._remote(query)
+            except Exception as e:
+                future.set_exception(e)
+            else:
+                self._put(keys, location)
+                future.set_result(location)
+            finally:
+                with self._in_flight_lock:
+                    self._in_flight.pop(query, None)
+        try:
+            location = future.result()
+        except Exception as e:
+            print(f"Geocoding {query} failed: {str(e)}")
+            return None
+        if not owner:
+            self._put(keys, location)
+        return location
+
+    def locate_many(self, hostnames_by_ip):
+        """``{ip: (name, lat, lon)}`` for ``{ip: hostname_or_None}``; misses run concurrently"""
+        futures = {ip: self._pool.submit(self.locate, ip, hostname) for ip, hostname in hostnames_by_ip.items()}
+        results = {}
+        for ip, future in futures.items():
+            location = future.result()
+            if location is not None:
+                results[ip] = location
+        return results
+
+    def prefetch(self, ips, resolve=None):
+        """Warm the cache for ips in the background; returns a Future.
+
+        ``resolve(ips)`` returns ``{ip: hostname}`` (e.g.
+        ``ReverseResolver.resolve_many``); without it the IPs themselves are
+        geocoded.
+        """
+        def run():
+            hostnames = resolve(list(ips)) if resolve else {}
+            return self.locate_many({ip: hostnames.get(ip) for ip in ips})
+        return threading_future(run)
+
+    def close(self):
+        self._pool.shutdown(wait=False)
+        with self._db_lock:
+            self._conn.close()
+
+
+def threading_future(fn):
+    """Run fn on its own daemon thread and return a Future for its result"""
+    future = Future()
+
+    def run():
+        try:
+            future.set_result(fn())
+        except Exception as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, daemon=True, name="geocode-prefetch").start()
+    return future
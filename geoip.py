@@ -0,0 +1,233 @@
+import bisect
+import csv
+import ipaddress
+import itertools
+import os
+import socket
+
+import numpy as np
+
+# maxminddb is optional: only needed to read .mmdb files
+try:
+    import maxminddb
+except ImportError:
+    maxminddb = None
+
+# Header names understood in range CSVs (first match wins)
+START_COLUMNS = ("start", "ip_start", "start_ip", "ip_from", "range_start")
+END_COLUMNS = ("end", "ip_end", "end_ip", "ip_to", "range_end")
+NETWORK_COLUMNS = ("network", "cidr", "prefix")
+LAT_COLUMNS = ("lat", "latitude")
+LON_COLUMNS = ("lon", "lng", "long", "longitude")
+NAME_COLUMNS = ("name", "location")
+PLACE_COLUMNS = (("city", "city_name"), ("region", "stateprov", "region_name", "subdivision"),
+                 ("country", "country_code", "country_name", "country_iso_code"))
+
+# Layout of header-less DB-IP style "city lite" CSVs:
+# ip_start, ip_end, continent, country, stateprov, city, latitude, longitude
+DBIP_COLUMNS = 8
+
+
+def _ip_int(value):
+    """Integer form of an address given as text or as a decimal integer"""
+    value = value.strip()
+    if value.isdigit():
+        return int(value)
+    return int(ipaddress.ip_address(value))
+
+
+def _pick(header, names):
+    for name in names:
+        if name in header:
+            return header.index(name)
+    return None
+
+
+class _RangeIndex:
+    """Sorted, non-overlapping [start, end] ranges of one address family.
+
+    IPv4 bounds fit in uint64 arrays, so whole batches are looked up with
+    one ``np.searchsorted``; IPv6 bounds don't, so they stay in Python lists
+    and are searched with ``bisect``. Both are O(log n) per address.
+    """
+
+    def __init__(self, rows, wide):
+        rows.sort()
+        self.wide = wide
+        if wide:
+            self.starts = [row[0] for row in rows]
+            self.ends = [row[1] for row in rows]
+        else:
+            self.starts = np.fromiter((row[0] for row in rows), dtype=np.uint64, count=len(rows))
+            self.ends = np.fromiter((row[1] for row in rows), dtype=np.uint64, count=len(rows))
+        self.locations = np.fromiter((row[2] for row in rows), dtype=np.int32, count=len(rows))
+
+    def __len__(self):
+        return len(self.locations)
+
+    def find(self, value):
+        """Location index for one address, or -1"""
+        i = bisect.bisect_right(self.starts, value) - 1
+        if i >= 0 and value <= self.ends[i]:
+            return int(self.locations[i])
+        return -1
+
+    def find_many(self, values):
+        """Location indexes for a list of addresses (-1 = not covered)"""
+        if self.wide or not len(self.starts):
+            return [self.find(value) for value in values]
+        values = np.asarray(values, dtype=np.uint64)
+        i = np.searchsorted(self.starts, values, side="right").astype(np.int64) - 1
+        safe = np.maximum(i, 0)
+        hit = (i >= 0) & (values <= self.ends[safe])
+        return np.where(hit, self.locations[safe], -1).tolist()
+
+
+class GeoIpDatabase:
+    """Offline IP -> (name, lat, lon) lookups from a range file.
+
+    Loads a CSV of address ranges (``start,end`` as dotted/colon text or
+    integers, or a ``network`` CIDR column) with latitude/longitude and
+    optional city/region/country or name columns, as shipped by DB-IP,
+    IP2Location or MaxMind's GeoLite2 CSV blocks. Files without a header are
+    read as DB-IP "city lite" layout or as ``start,end,lat,lon[,name]``.
+    Locations are interned, so a multi-million-range file costs a few
+    arrays rather than one object per row. A ``.mmdb`` file is read with the
+    optional ``maxminddb`` package instead.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.names = []  # location id -> (name, lat, lon)
+        self._location_ids = {}
+        self._reader = None
+        if path.endswith(".mmdb"):
+            if maxminddb is None:
+                raise RuntimeError("Reading .mmdb files needs maxminddb (pip install maxminddb)")
+            self._reader = maxminddb.open_database(path)
+            self._v4 = self._v6 = None
+            return
+        v4, v6 = [], []
+        with open(path, newline="", encoding="utf-8") as f:
+            for start, end, location in self._parse(csv.reader(f)):
+                (v4 if end <= 0xFFFFFFFF else v6).append((start, end, location))
+        self._v4 = _RangeIndex(v4, wide=False)
+        self._v6 = _RangeIndex(v6, wide=True)
+
+    def __len__(self):
+        if self._reader is not None:
+            return self._reader.metadata().node_count
+        return len(self._v4) + len(self._v6)
+
+    def _location(self, name, lat, lon):
+        key = (name, lat, lon)
+        location = self._location_ids.get(key)
+        if location is None:
+            location = self._location_ids[key] = len(self.names)
+            self.names.append(key)
+        return location
+
+    def _parse(self, reader):
+        """Yield (start_int, end_int, location_id) for every usable row"""
+        first = next(reader, None)
+        if first is None:
+            return
+        header = [column.strip().lower() for column in first]
+        start_col = _pick(header, START_COLUMNS)
+        network_col = _pick(header, NETWORK_COLUMNS)
+        lat_col = _pick(header, LAT_COLUMNS)
+        lon_col = _pick(header, LON_COLUMNS)
+        if (start_col is not None or network_col is not None) and lat_col is not None and lon_col is not None:
+            end_col = _pick(header, END_COLUMNS)
+            name_col = _pick(header, NAME_COLUMNS)
+            place_cols = [col for col in (_pick(header, names) for names in PLACE_COLUMNS) if col is not None]
+            rows = reader
+        else:
+            # No header: guess the layout from the first row
+            rows = itertools.chain([first], reader)
+            if len(first) >= DBIP_COLUMNS:
+                start_col, end_col, lat_col, lon_col = 0, 1, 6, 7
+                name_col, place_cols = None, [5, 4, 3]
+            else:
+                start_col, end_col, lat_col, lon_col = 0, 1, 2, 3
+                name_col, place_cols = (4 if len(first) > 4 else None), []
+            network_col = None
+
+        for row in rows:
+            try:
+                if network_col is not None and start_col is None:
+                    network = ipaddress.ip_network(row[network_col].strip(), strict=False)
+                    start, end = int(network.network_address), int(network.broadcast_address)
+                else:
+                    start = _ip_int(row[start_col])
+                    end = _ip_int(row[end_col]) if end_col is not None else start
+                lat, lon = float(row[lat_col]), float(row[lon_col])
+            except (ValueError, IndexError):
+                continue  # blank coordinates, comments, malformed rows
+            if name_col is not None and row[name_col].strip():
+                name = row[name_col].strip()
+            else:
+                name = ", ".join(row[col].strip() for col in place_cols if row[col].strip()) or None
+            yield start, end, self._location(name, lat, lon)
+
+    def _mmdb_lookup(self, ip):
+        try:
+            record = self._reader.get(ip)
+        except ValueError:
+            return None
+        if not record or "location" not in record:
+            return None
+        location = record["location"]
+        parts = [
+            record.get("city", {}).get("names", {}).get("en"),
+            record.get("country", {}).get("names", {}).get("en")
+        ]
+        return (", ".join(p for p in parts if p) or None, location.get("latitude"), location.get("longitude"))
+
+    def lookup(self, ip):
+        """(name, lat, lon) for one address, or None"""
+        return self.lookup_many([ip]).get(ip)
+
+    def lookup_many(self, ips):
+        """``{ip: (name, lat, lon)}`` for every address the database covers.
+
+        Unparseable addresses (hostnames) are skipped. Name falls back to the
+        IP itself when the file has no place columns.
+        """
+        if self._reader is not None:
+            results = {}
+            for ip in ips:
+                found = self._mmdb_lookup(ip)
+                if found is not None:
+                    results[ip] = (found[0] or ip, found[1], found[2])
+            return results
+
+        v4, v6 = [], []
+        for ip in dict.fromkeys(ips):
+            # inet_pton is several times faster than ipaddress for the common case
+            try:
+                v4.append((ip, int.from_bytes(socket.inet_pton(socket.AF_INET, ip), "big")))
+                continue
+            except (OSError, TypeError):
+                pass
+            try:
+                v6.append((ip, int.from_bytes(socket.inet_pton(socket.AF_INET6, ip), "big")))
+            except (OSError, TypeError):
+                continue
+
+        results = {}
+        for index, addresses in ((self._v4, v4), (self._v6, v6)):
+            if not addresses:
+                continue
+            for (ip, _), location in zip(addresses, index.find_many([value for _, value in addresses])):
+                if location >= 0:
+                    name, lat, lon = self.names[location]
+                    results[ip] = (name or ip, lat, lon)
+        return results
+
+
+def load(path):
+    """GeoIpDatabase for path, or None when no path is configured / the file is missing"""
+    if not path or not os.path.exists(path):
+        return None
+    return GeoIpDatabase(path)
@@ -0,0 +1,344 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from rollups import ROLLUP_FIELDS, Rollups, lttb, merge_sketches, pick_tier
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Summary columns stored for every target of a run, in latency_data order
+SUMMARY_FIELDS = ("avg", "min", "max", "packet_loss", "jitter", "std_dev", "throughput_estimate")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    timestamp TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_ts ON runs (ts);
+
+CREATE TABLE IF NOT EXISTS results (
+    run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    target TEXT NOT NULL,
+    ts REAL NOT NULL,
+    avg REAL, min REAL, max REAL, packet_loss REAL,
+    jitter REAL, std_dev REAL, throughput_estimate REAL,
+    protocol TEXT,
+    latencies TEXT,
+    timestamp_sources TEXT
+);
+CREATE INDEX IF NOT EXISTS results_run ON results (run_id);
+CREATE INDEX IF NOT EXISTS results_target_ts ON results (target, ts);
+
+CREATE TABLE IF NOT EXISTS samples (
+    target TEXT NOT NULL,
+    ts REAL NOT NULL,
+    rtt_ms REAL,
+    source TEXT,
+    run_id INTEGER
+);
+CREATE INDEX IF NOT EXISTS samples_target_ts ON samples (target, ts);
+CREATE INDEX IF NOT EXISTS samples_ts ON samples (ts);
+"""
+
+
+def to_epoch(timestamp):
+    """Epoch seconds for a history timestamp string (or pass numbers through)"""
+    if isinstance(timestamp, (int, float)):
+        return float(timestamp)
+    return datetime.strptime(timestamp, TIMESTAMP_FORMAT).timestamp()
+
+
+class HistoryStore:
+    """Append-only SQLite (WAL) store for measurement history.
+
+    A *run* is one sweep and keeps the same shape as the old in-memory
+    ``historical_data`` entries (``{"timestamp", "data": {ip: stats}}``).
+    Raw samples, from sweeps and from the background monitor, go to the
+    ``samples`` table indexed on (target, ts), so time-range queries never
+    have to load the whole history. Writes share one connection behind a
+    lock; each reading thread gets its own connection, which WAL lets run
+    alongside the writer.
+    """
+
+    def __init__(self, directory, filename="history.sqlite3"):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, filename)
+        self._write_lock = threading.Lock()
+        self._local = threading.local()
+        self._writer = self._connect()
+        self._writer.execute("PRAGMA journal_mode=WAL")
+        self._writer.executescript(SCHEMA)
+        self.rollups = Rollups(self._writer)
+        self._writer.commit()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    def _reader(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def close(self):
+        with self._write_lock:
+            self._writer.close()
+
+    # Writes
+
+    def add_run(self, data, timestamp=None, store_samples=True):
+        """Append one sweep (a latency_data dict) and return its run id"""
+        ts = time.time() if timestamp is None else to_epoch(timestamp)
+        timestamp = datetime.fromtimestamp(ts).strftime(TIMESTAMP_FORMAT)
+        with self._write_lock, self._writer:
+            run_id = self._writer.execute(
+                "INSERT INTO runs (ts, timestamp) VALUES (?, ?)", (ts, timestamp)
+            ).lastrowid
+            self._writer.executemany(
+                "INSERT INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (run_id, target, ts) + tuple(stats.get(field) for field in SUMMARY_FIELDS) + (
+                        stats.get("protocol"),
+                        json.dumps(list(stats.get("latencies", []))),
+                        json.dumps(list(stats["timestamp_sources"])) if "timestamp_sources" in stats else None
+                    )
+                    for target, stats in data.items()
+                ]
+            )
+            if store_samples:
+                rows = []
+                for target, stats in data.items():
+                    sources = stats.get("timestamp_sources") or [None] * len(stats.get("latencies", []))
+                    rows.extend((target, ts, rtt, source, run_id)
+                                for rtt, source in zip(stats.get("latencies", []), sources))
+                self.rollups.add(rows)
+                self._writer.executemany("INSERT INTO samples VALUES (?, ?, ?, ?, ?)", rows)
+        return run_id
+
+    def add_samples(self, rows):
+        """Append raw samples given as (target, epoch_ts, rtt_ms_or_None, source)"""
+        rows = list(rows)
+        with self._write_lock, self._writer:
+            self.rollups.add(rows)
+            self._writer.executemany(
+                "INSERT INTO samples (target, ts, rtt_ms, source) VALUES (?, ?, ?, ?)", rows
+            )
+
+    def clear(self):
+        with self._write_lock, self._writer:
+            self._writer.execute("DELETE FROM samples")
+            self._writer.execute("DELETE FROM results")
+            self._writer.execute("DELETE FROM runs")
+            self.rollups.clear()
+
+    # Reads
+
+    def _runs_data(self, conn, run_ids, target=None, summary=False):
+        """``{run_id: {target: stats}}`` for many runs in one query.
+
+        ``summary`` leaves out the raw latencies and timestamp sources.
+        """
+        data = {run_id: {} for run_id in run_ids}
+        if not run_ids:
+            return data
+        columns = "run_id, target, " + ", ".join(SUMMARY_FIELDS) + ", protocol"
+        if not summary:
+            columns += ", latencies, timestamp_sources"
+        query = f"SELECT {columns} FROM results WHERE run_id IN ({','.join('?' * len(run_ids))})"
+        params = list(run_ids)
+        if target is not None:
+            query += " AND target = ?"
+            params.append(target)
+        for row in conn.execute(query + " ORDER BY rowid", params):
+            stats = {} if summary else {"latencies": json.loads(row["latencies"] or "[]")}
+            for field in SUMMARY_FIELDS:
+                stats[field] = row[field]
+            stats["protocol"] = row["protocol"]
+            if not summary and row["timestamp_sources"] is not None:
+                stats["timestamp_sources"] = json.loads(row["timestamp_sources"])
+            data[row["run_id"]][row["target"]] = stats
+        return data
+
+    def _run_data(self, conn, run_id, target=None, summary=False):
+        return self._runs_data(conn, [run_id], target, summary)[run_id]
+
+    def iter_runs(self, start=None, end=None, target=None, summary=False, chunk_size=500):
+        """Yield runs oldest first as ``{"id", "timestamp", "ts", "data"}`` dicts.
+
+        Runs are read ``chunk_size`` at a time (keyed on id, like page_runs),
+        so iterating the whole history keeps memory flat. ``target`` keeps
+        only runs that measured it, and only its entry within each run.
+        """
+        conn = self._reader()
+        query = "SELECT id, timestamp, ts FROM runs WHERE id > ? AND ts >= ? AND ts <= ?"
+        params = [float("-inf") if start is None else start, float("inf") if end is None else end]
+        if target is not None:
+            query += " AND EXISTS (SELECT 1 FROM results WHERE results.run_id = runs.id AND results.target = ?)"
+            params.append(target)
+        query += " ORDER BY id LIMIT ?"
+        last_id = 0
+        while True:
+            rows = conn.execute(query, [last_id] + params + [chunk_size]).fetchall()
+            if not rows:
+                return
+            data = self._runs_data(conn, [row["id"] for row in rows], target, summary)
+            for row in rows:
+                yield {"id": row["id"], "timestamp": row["timestamp"], "ts": row["ts"], "data": data[row["id"]]}
+            last_id = rows[-1]["id"]
+
+    def targets_at(self, ts):
+        """Targets with a run result stored at exactly ``ts``"""
+        rows = self._reader().execute("SELECT target FROM results WHERE ts = ?", (to_epoch(ts),))
+        return {row["target"] for row in rows}
+
+    def stored_samples(self, keys):
+        """The (target, ts) pairs among ``keys`` already stored as standalone samples.
+
+        The keys go into a temporary table joined against the samples index,
+        so a whole import batch is checked in one query.
+        """
+        conn = self._reader()
+        with conn:
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS sample_keys (target TEXT NOT NULL, ts REAL NOT NULL)")
+            conn.executemany("INSERT INTO sample_keys VALUES (?, ?)", keys)
+            rows = conn.execute(
+                "SELECT DISTINCT k.target, k.ts FROM sample_keys k JOIN samples s"
+                " ON s.target = k.target AND s.ts = k.ts AND s.run_id IS NULL"
+            ).fetchall()
+            conn.execute("DELETE FROM sample_keys")
+        return {(row["target"], row["ts"]) for row in rows}
+
+    def runs(self, start=None, end=None):
+        return list(self.iter_runs(start, end))
+
+    def get_run(self, run_id, summary=False):
+        conn = self._reader()
+        run = conn.execute("SELECT id, timestamp FROM runs WHERE id = ?", (run_id,)).fetchone()
+        if run is None:
+            return None
+        return {"id": run["id"], "timestamp": run["timestamp"], "data": self._run_data(conn, run_id, summary=summary)}
+
+    def page_runs(self, limit=50, cursor=None, start=None, end=None, target=None, summary=False):
+        """One page of runs, newest first, and the cursor for the next page.
+
+        ``cursor`` is the id of the last run of the previous page (the next
+        page starts just below it), so page cost doesn't depend on how deep
+        into the history the client is. ``target`` keeps only runs that
+        measured it, and only its entry within each run.
+        """
+        conn = self._reader()
+        query = "SELECT id, timestamp FROM runs WHERE 1"
+        params = []
+        if cursor is not None:
+            query += " AND id < ?"
+            params.append(cursor)
+        if start is not None:
+            query += " AND ts >= ?"
+            params.append(start)
+        if end is not None:
+            query += " AND ts <= ?"
+            params.append(end)
+        if target is not None:
+            query += " AND EXISTS (SELECT 1 FROM results WHERE results.run_id = runs.id AND results.target = ?)"
+            params.append(target)
+        # Fetch one extra row to know whether another page exists
+        rows = conn.execute(query + " ORDER BY id DESC LIMIT ?", params + [limit + 1]).fetchall()
+        more = len(rows) > limit
+        rows = rows[:limit]
+        data = self._runs_data(conn, [row["id"] for row in rows], target, summary)
+        runs = [{"id": row["id"], "timestamp": row["timestamp"], "data": data[row["id"]]} for row in rows]
+        return runs, (rows[-1]["id"] if more else None)
+
+    def count_runs(self):
+        return self._reader().execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+
+    def iter_samples(self, target=None, start=None, end=None, with_run_id=False):
+        """Yield (target, ts, rtt_ms, source) rows in time order (plus run_id if asked)"""
+        conn = self._reader()
+        bounds = (float("-inf") if start is None else start, float("inf") if end is None else end)
+        columns = "target, ts, rtt_ms, source" + (", run_id" if with_run_id else "")
+        if target is None:
+            cursor = conn.execute(
+                f"SELECT {columns} FROM samples WHERE ts >= ? AND ts <= ? ORDER BY ts",
+                bounds
+            )
+        else:
+            cursor = conn.execute(
+                f"SELECT {columns} FROM samples "
+                "WHERE target = ? AND ts >= ? AND ts <= ? ORDER BY ts",
+                (target,) + bounds
+            )
+        for row in cursor:
+            yield tuple(row)
+
+    def targets(self):
+        return [row[0] for row in self._reader().execute("SELECT DISTINCT target FROM samples ORDER BY target")]
+
+    def series(self, target, start, end, width=800):
+        """Chart-ready latency series for target over [start, end].
+
+        Returns raw samples when there are no more than ``width`` of them,
+        otherwise the finest rollup tier that fits ``width`` points (LTTB
+        downsampled if even the coarsest tier has more), so the payload size
+        follows the chart's pixel width instead of the window length.
+        """
+        conn = self._reader()
+        raw_count = conn.execute(
+            "SELECT COUNT(*) FROM (SELECT 1 FROM samples WHERE target = ? AND ts >= ? AND ts <= ? LIMIT ?)",
+            (target, start, end, width + 1)
+        ).fetchone()[0]
+        if raw_count <= width:
+            points = []
+            for _, ts, rtt, _ in self.iter_samples(target, start, end):
+                point = {"t": ts, "count": 1, "lost": int(rtt is None), "loss": 100.0 if rtt is None else 0.0}
+                for field in ("min", "max", "avg", "p50", "p95", "p99"):
+                    point[field] = rtt
+                points.append(point)
+            return {"tier": "raw", "step": None, "points": points}
+
+        tier, step = pick_tier(start, end, width)
+        points = []
+        for row in conn.execute(
+            "SELECT bucket, " + ", ".join(ROLLUP_FIELDS) + " FROM rollups "
+            "WHERE tier = ? AND target = ? AND bucket >= ? AND bucket <= ? ORDER BY bucket",
+            (tier, target, start - start % step, end)
+        ):
+            point = {"t": row["bucket"]}
+            for field in ROLLUP_FIELDS:
+                point[field] = row[field]
+            point["loss"] = row["lost"] / row["count"] * 100 if row["count"] else 0.0
+            points.append(point)
+        if len(points) > width:
+            points = lttb(points, width)
+        return {"tier": tier, "step": step, "points": points}
+
+    def percentiles(self, start, end, targets=None):
+        """Merged latency sketch over [start, end], per target and overall.
+
+        Uses the finest rollup tier that keeps the merge to a few thousand
+        bucket sketches, so the cost doesn't grow with the raw sample count.
+        Returns ``({target: DDSketch}, overall DDSketch)``.
+        """
+        tier, step = pick_tier(start, end, 2000)
+        conn = self._reader()
+        query = "SELECT target, sketch FROM rollups WHERE tier = ? AND bucket >= ? AND bucket <= ?"
+        params = [tier, start - start % step, end]
+        if targets:
+            query += f" AND target IN ({','.join('?' * len(targets))})"
+            params.extend(targets)
+        per_target = {}
+        for row in conn.execute(query, params):
+            per_target.setdefault(row["target"], []).append((row["sketch"],))
+        sketches = {target: merge_sketches(rows) for target, rows in per_target.items()}
+        overall = merge_sketches([])
+        for sketch in sketches.values():
+            overall.merge(sketch)
+        return sketches, overall
@@ -0,0 +1,313 @@
+import itertools
+import os
+import select
+import socket
+import struct
+import threading
+import time
+
+import timing
+
+ICMP_ECHO_REPLY = 0
+ICMP_DEST_UNREACHABLE = 3
+ICMP_ECHO_REQUEST = 8
+ICMP_TIME_EXCEEDED = 11
+
+DEFAULT_TTL = 64
+
+# Receive buffer asked for: a few thousand echoes can be in flight at once,
+# and replies that don't fit in the socket's queue are silently dropped
+DEFAULT_RCVBUF = 4 * 1024 * 1024
+
+# Linux only; lets CAP_NET_ADMIN go past net.core.rmem_max
+SO_RCVBUFFORCE = 33
+
+_instance_ids = itertools.count()
+
+
+def icmp_checksum(data):
+    """Internet checksum (RFC 1071) of data"""
+    if len(data) % 2:
+        data += b'\x00'
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+def build_echo_request(identifier, sequence, payload=b''):
+    """Build an ICMP echo request packet with a valid checksum"""
+    header = struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, 0, identifier, sequence)
+    checksum = icmp_checksum(header + payload)
+    header = struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, checksum, identifier, sequence)
+    return header + payload
+
+
+def set_receive_buffer(sock, size):
+    """Raise the socket's receive buffer to ``size`` bytes (best effort).
+
+    Tries SO_RCVBUFFORCE first, which ignores net.core.rmem_max but needs
+    CAP_NET_ADMIN, then plain SO_RCVBUF (capped by the kernel). Returns the
+    size the kernel actually granted.
+    """
+    for option in (SO_RCVBUFFORCE, socket.SO_RCVBUF):
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, option, size)
+            break
+        except OSError:
+            continue
+    return sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+
+
+class _Pending:
+    __slots__ = ('dst', 'traceroute', 'sent', 'sample', 'responder', 'ttl', 'event')
+
+    def __init__(self, dst, traceroute=False):
+        self.dst = dst
+        self.traceroute = traceroute  # sent with a short TTL; ICMP errors are answers
+        self.sent = None
+        self.sample = None
+        self.responder = None
+        self.ttl = None
+        self.event = threading.Event()
+
+
+class IcmpProber:
+    """ICMP echo prober that keeps one socket open for every probe.
+
+    A background thread reads replies and matches them to outstanding
+    requests by (identifier, sequence), so any number of threads can call
+    ``ping`` at once and ``ping_many`` can put a whole batch of echoes on the
+    wire in one pass. Uses a raw socket when running as root, otherwise the
+    Linux unprivileged ICMP "ping socket" (net.ipv4.ping_group_range).
+    The receive buffer is raised to ``rcvbuf`` bytes (where the kernel
+    allows) so replies to a large batch aren't dropped before the reader
+    gets to them.
+    """
+
+    def __init__(self, timeout=2, payload=b'latency-tool', rcvbuf=DEFAULT_RCVBUF):
+        self.timeout = timeout
+        self.payload = payload
+        self.identifier = (os.getpid() + next(_instance_ids)) & 0xFFFF
+        self._sequence = itertools.count()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._closed = False
+
+        try:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP)
+            self.raw = True
+        except PermissionError:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP)
+            self.raw = False
+        self.rcvbuf = set_receive_buffer(self.sock, rcvbuf) if rcvbuf else None
+        self.sock.setblocking(False)
+        self.kernel_timestamps = timing.enable_kernel_timestamps(self.sock)
+
+        self._reader = threading.Thread(target=self._read_loop, name="icmp-reader", daemon=True)
+        self._reader.start()
+
+    def close(self):
+        self._closed = True
+        self._reader.join(timeout=1)
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _next_sequence(self):
+        # Skip sequences that are still waiting for a reply after a wrap
+        while True:
+            seq = next(self._sequence) & 0xFFFF
+            if seq not in self._pending:
+                return seq
+
+    def _send(self, dst, ttl=None):
+        """Send one echo request to dst and return its sequence number"""
+        with self._lock:
+            seq = self._next_sequence()
+            pending = _Pending(dst, traceroute=ttl is not None)
+            self._pending[seq] = pending
+        packet = build_echo_request(self.identifier, seq, self.payload)
+        # The TTL is a socket option, so setting it and sending must not interleave
+        with self._send_lock:
+            try:
+                if ttl is not None:
+                    self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_TTL, ttl)
+                pending.sent = timing.SendStamp()
+                self.sock.sendto(packet, (dst, 0))
+            except OSError:
+                # Unreachable network, bad address, full buffer: count as loss
+                pending.event.set()
+            finally:
+                if ttl is not None:
+                    self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_TTL, DEFAULT_TTL)
+        return seq
+
+    def _release(self, seq):
+        with self._lock:
+            return self._pending.pop(seq, None)
+
+    def _collect(self, seq):
+        pending = self._release(seq)
+        if pending is None or pending.sample is None:
+            return timing.RttSample(None, timing.SOURCE_MONOTONIC)
+        return pending.sample
+
+    def _read_loop(self):
+        while not self._closed:
+            ready, _, _ = select.select([self.sock], [], [], 0.1)
+            if not ready:
+                continue
+            while True:
+                try:
+                    data, ancdata, _, addr = self.sock.recvmsg(65535, timing.ANCILLARY_BUFSIZE)
+                except (BlockingIOError, InterruptedError):
+                    break
+                except OSError:
+                    if self._closed:
+                        return
+                    break
+                received_ns = timing.now_ns()
+                kernel_ns = timing.kernel_rx_timestamp_ns(ancdata) if self.kernel_timestamps else None
+                self._handle_packet(data, addr, received_ns, kernel_ns)
+
+    def _handle_packet(self, data, addr, received_ns, kernel_ns=None):
+        reply_ttl = None
+        if self.raw:
+            # Raw sockets deliver the IP header as well
+            reply_ttl = data[8] if len(data) > 8 else None
+            data = data[(data[0] & 0x0F) * 4:]
+        if len(data) < 8:
+            return
+        icmp_type, _, _, identifier, seq = struct.unpack("!BBHHH", data[:8])
+        if icmp_type in (ICMP_TIME_EXCEEDED, ICMP_DEST_UNREACHABLE):
+            # Errors quote the original IP header plus the first 8 bytes of our echo
+            inner = data[8:]
+            if len(inner) < 20:
+                return
+            inner = inner[(inner[0] & 0x0F) * 4:]
+            if len(inner) < 8:
+                return
+            inner_type, _, _, identifier, seq = struct.unpack("!BBHHH", inner[:8])
+            if inner_type != ICMP_ECHO_REQUEST:
+                return
+        elif icmp_type != ICMP_ECHO_REPLY:
+            return
+        # Ping sockets rewrite the identifier, and the kernel only hands us our own replies
+        if self.raw and identifier != self.identifier:
+            return
+        with self._lock:
+            pending = self._pending.get(seq)
+        if pending is None or pending.sent is None:
+            return
+        if icmp_type == ICMP_ECHO_REPLY and addr[0] != pending.dst:
+            return
+        if icmp_type != ICMP_ECHO_REPLY and not pending.traceroute:
+            # An error about an ordinary ping (host unreachable, TTL ran out
+            # on a loop) means it won't be answered: a loss, not an RTT
+            pending.event.set()
+            return
+        if not pending.event.is_set():
+            pending.sample = timing.rtt_from_stamps(pending.sent, received_ns, kernel_ns)
+            pending.responder = addr[0]
+            pending.ttl = reply_ttl
+            pending.event.set()
+
+    def ping_sample(self, dst, timeout=None):
+        """Ping dst once and return an RttSample (rtt_ms is None on timeout)"""
+        timeout = self.timeout if timeout is None else timeout
+        dst = socket.gethostbyname(dst)
+        seq = self._send(dst)
+        self._pending[seq].event.wait(timeout)
+        return self._collect(seq)
+
+    def ping_with_ttl(self, dst, timeout=None):
+        """Ping dst once; returns (RttSample, reply IP TTL or None)"""
+        timeout = self.timeout if timeout is None else timeout
+        dst = socket.gethostbyname(dst)
+        seq = self._send(dst)
+        self._pending[seq].event.wait(timeout)
+        pending = self._release(seq)
+        if pending is None or pending.sample is None:
+            return timing.RttSample(None, timing.SOURCE_MONOTONIC), None
+        return pending.sample, pending.ttl
+
+    def ping(self, dst, timeout=None):
+        """Ping dst once and return the RTT in ms, or None on timeout"""
+        return self.ping_sample(dst, timeout).rtt_ms
+
+    def ping_many(self, destinations, timeout=None):
+        """Send one echo to every destination in a single pass.
+
+        Returns ``{destination: RttSample}`` once every reply is in or
+        ``timeout`` seconds after the last request went out.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        sent = []
+        for dst in destinations:
+            try:
+                addr = socket.gethostbyname(dst)
+            except OSError:
+                sent.append((dst, None))
+                continue
+            sent.append((dst, self._send(addr)))
+
+        deadline = time.monotonic() + timeout
+        results = {}
+        for dst, seq in sent:
+            if seq is not None:
+                self._pending[seq].event.wait(max(0, deadline - time.monotonic()))
+                results[dst] = self._collect(seq)
+            else:
+                results[dst] = timing.RttSample(None, timing.SOURCE_MONOTONIC)
+        return results
+
+    def traceroute(self, dst, max_hops=30, probes_per_hop=3, timeout=None):
+        """Probe every TTL at once and return the hops up to dst.
+
+        All ``max_hops * probes_per_hop`` echoes go out in one pass; ICMP
+        time-exceeded replies are matched back to their TTL through the
+        echo header they quote. Returns a list of
+        ``{'hop', 'ip', 'latency', 'latencies'}`` dicts (``ip`` is ``'*'``
+        for silent hops, ``latency`` the best RTT), ending at the first hop
+        where dst answered. The whole path costs about one ``timeout``.
+        """
+        if not self.raw:
+            raise PermissionError("Traceroute needs a raw ICMP socket (run as root)")
+        timeout = self.timeout if timeout is None else timeout
+        dst = socket.gethostbyname(dst)
+
+        sent = {ttl: [self._send(dst, ttl=ttl) for _ in range(probes_per_hop)]
+                for ttl in range(1, max_hops + 1)}
+        deadline = time.monotonic() + timeout
+
+        hops = []
+        try:
+            for ttl, seqs in sent.items():
+                probes = []
+                for seq in seqs:
+                    pending = self._pending[seq]
+                    pending.event.wait(max(0, deadline - time.monotonic()))
+                    probes.append(pending)
+                responders = [p.responder for p in probes if p.responder]
+                latencies = [p.sample.rtt_ms if p.sample else None for p in probes]
+                answered = [lat for lat in latencies if lat is not None]
+                hops.append({
+                    'hop': ttl,
+                    'ip': responders[0] if responders else '*',
+                    'latency': min(answered) if answered else None,
+                    'latencies': latencies
+                })
+                # Higher TTLs only repeat the destination
+                if dst in responders:
+                    break
+        finally:
+            for seqs in sent.values():
+                for seq in seqs:
+                    self._release(seq)
+        return hops
@@ -0,0 +1,139 @@
+import itertools
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+CANCELLED = "cancelled"
+FAILED = "failed"
+
+FINISHED = (COMPLETED, CANCELLED, FAILED)
+
+
+class Job:
+    """One measurement sweep and everything it produced.
+
+    ``results`` belongs to this job alone, so concurrent sweeps never see
+    each other's data. ``done``/``total`` are updated by the runner as
+    probes complete.
+    """
+
+    def __init__(self, job_id, targets, num_pings, owner=None):
+        self.id = job_id
+        self.targets = targets
+        self.num_pings = num_pings
+        self.owner = owner  # socket.io sid of the client that started it
+        self.status = QUEUED
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.done = 0
+        self.total = len(targets) * num_pings
+        self.results = {}
+        self.error = None
+        self.cancel_event = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def to_dict(self):
+        """Status summary (without results) for the API"""
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "targets": self.targets,
+            "num_pings": self.num_pings,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+            "done": self.done,
+            "total": self.total,
+            "progress": (self.done / self.total) * 100 if self.total else 100.0,
+            "error": self.error
+        }
+
+
+class JobManager:
+    """Run measurement jobs on a bounded worker pool.
+
+    ``submit`` returns immediately with a Job; ``run_job(job)`` is called on
+    one of ``max_workers`` threads and fills in ``job.results``, checking
+    ``job.cancel_event`` to stop early. Jobs beyond the pool size wait in
+    the queue and can be cancelled before they start; ``on_cancelled(job)``
+    is then called instead of ``run_job`` so the owner still hears that the
+    job ended. The most recent
+    ``max_jobs`` finished jobs are kept for status and result queries.
+    """
+
+    def __init__(self, run_job, max_workers=4, max_jobs=100, on_cancelled=None):
+        self.run_job = run_job
+        self.on_cancelled = on_cancelled
+        self.max_jobs = max_jobs
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._jobs = OrderedDict()  # job_id -> Job, oldest first
+        self._lock = threading.Lock()
+        self._counter = itertools.count(1)
+
+    def submit(self, targets, num_pings, owner=None):
+        job = Job(f"{next(self._counter)}-{uuid.uuid4().hex[:8]}", targets, num_pings, owner)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._evict()
+        self._pool.submit(self._run, job)
+        return job
+
+    def _run(self, job):
+        if job.cancelled:
+            job.status = CANCELLED
+            job.finished = time.time()
+            if self.on_cancelled:
+                try:
+                    self.on_cancelled(job)
+                except Exception as e:
+                    print(f"Job {job.id} cancel notification failed: {str(e)}")
+            return
+        job.status = RUNNING
+        job.started = time.time()
+        try:
+            self.run_job(job)
+            job.status = CANCELLED if job.cancelled else COMPLETED
+        except Exception as e:
+            print(f"Job {job.id} failed: {str(e)}")
+            job.error = str(e)
+            job.status = FAILED
+        finally:
+            job.finished = time.time()
+
+    def _evict(self):
+        """Forget the oldest finished jobs beyond max_jobs (caller holds the lock)"""
+        excess = len(self._jobs) - self.max_jobs
+        if excess <= 0:
+            return
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.status in FINISHED][:excess]:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    def cancel(self, job_id):
+        """Ask a queued or running job to stop; False if unknown or already finished"""
+        job = self.get(job_id)
+        if job is None or job.status in FINISHED:
+            return False
+        job.cancel_event.set()
+        return True
+
+    def shutdown(self):
+        for job in self.jobs():
+            job.cancel_event.set()
+        self._pool.shutdown(wait=False)
@@ -0,0 +1,120 @@
+import numpy as np
+
+# TCP window assumed by the throughput estimate (bytes)
+TCP_WINDOW_BYTES = 65536
+
+STAT_FIELDS = ("avg", "min", "max", "packet_loss", "jitter", "std_dev", "throughput_estimate")
+
+
+def to_matrix(latency_lists):
+    """Pack lists of RTTs (None = loss) into a float matrix plus row lengths.
+
+    Loss and row padding are both NaN; ``lengths`` tells them apart so packet
+    loss is computed against the number of probes actually sent.
+    """
+    lengths = np.fromiter((len(latencies) for latencies in latency_lists), dtype=np.int64,
+                          count=len(latency_lists))
+    width = int(lengths.max()) if len(lengths) else 0
+    matrix = np.full((len(latency_lists), width), np.nan)
+    for row, latencies in enumerate(latency_lists):
+        if latencies:
+            matrix[row, :len(latencies)] = np.array(latencies, dtype=float)
+    return matrix, lengths
+
+
+def summarize_matrix(matrix, lengths=None, percentiles=(50, 95, 99)):
+    """Statistics for every row of an RTT matrix (NaN = loss) in one pass.
+
+    Returns a dict of 1-D arrays, one entry per row: avg, min, max,
+    packet_loss, jitter, std_dev, throughput_estimate and ``p<q>`` for each
+    requested percentile. Rows without a single reply get 0 for the latency
+    statistics (matching what the UI has always shown) and NaN percentiles.
+    """
+    matrix = np.asarray(matrix, dtype=float)
+    rows, width = matrix.shape
+    if lengths is None:
+        lengths = np.full(rows, width)
+    valid = ~np.isnan(matrix)
+    n = valid.sum(axis=1)
+    has_data = n > 0
+    safe_n = np.maximum(n, 1)
+
+    filled = np.where(valid, matrix, 0.0)
+    avg = filled.sum(axis=1) / safe_n
+    minimum = np.where(has_data, np.where(valid, matrix, np.inf).min(axis=1, initial=np.inf), 0.0)
+    maximum = np.where(has_data, np.where(valid, matrix, -np.inf).max(axis=1, initial=-np.inf), 0.0)
+
+    # Sample standard deviation (ddof=1), 0 with fewer than two replies
+    sq_dev = np.where(valid, (matrix - avg[:, None]) ** 2, 0.0).sum(axis=1)
+    std_dev = np.where(n > 1, np.sqrt(sq_dev / np.maximum(n - 1, 1)), 0.0)
+
+    # Jitter: mean |difference| between consecutive replies, skipping losses.
+    # np.sort puts NaN last, so sort a stable key that moves replies to the
+    # front of each row without reordering them.
+    order = np.argsort(~valid, axis=1, kind="stable")
+    compact = np.take_along_axis(matrix, order, axis=1)
+    if width > 1:
+        diffs = np.abs(np.diff(compact, axis=1))
+        diff_valid = ~np.isnan(diffs)
+        diff_n = diff_valid.sum(axis=1)
+        jitter = np.where(diff_n > 0, np.where(diff_valid, diffs, 0.0).sum(axis=1) / np.maximum(diff_n, 1), 0.0)
+    else:
+        jitter = np.zeros(rows)
+
+    lengths = np.asarray(lengths)
+    packet_loss = np.where(lengths > 0, (1 - n / np.maximum(lengths, 1)) * 100, 100.0)
+
+    # Simplified BDP estimate: window / RTT, in Mbps
+    throughput = np.where(avg > 0, (TCP_WINDOW_BYTES * 8) / (np.where(avg > 0, avg, 1) / 1000) / 1_000_000, 0.0)
+
+    stats = {
+        "avg": avg,
+        "min": minimum,
+        "max": maximum,
+        "packet_loss": packet_loss,
+        "jitter": jitter,
+        "std_dev": std_dev,
+        "throughput_estimate": throughput,
+    }
+
+    # Percentiles with linear interpolation over each row's sorted replies
+    ordered = np.sort(matrix, axis=1)  # NaN sorts last
+    for q in percentiles:
+        pos = (safe_n - 1) * (q / 100)
+        lo = np.floor(pos).astype(np.int64)
+        hi = np.minimum(lo + 1, safe_n - 1)
+        if width:
+            lo_val = np.take_along_axis(ordered, lo[:, None], axis=1)[:, 0]
+            hi_val = np.take_along_axis(ordered, hi[:, None], axis=1)[:, 0]
+            value = lo_val + (hi_val - lo_val) * (pos - lo)
+        else:
+            value = np.full(rows, np.nan)
+        stats[f"p{q:g}"] = np.where(has_data, value, np.nan)
+    return stats
+
+
+def summarize_many(latencies_by_target, percentiles=(50, 95, 99)):
+    """``{target: stats_dict}`` for ``{target: [rtt_or_None, ...]}`` in one batch.
+
+    Values are plain floats (percentiles are None without replies) so the
+    result drops straight into latency_data and JSON.
+    """
+    targets = list(latencies_by_target)
+    if not targets:
+        return {}
+    matrix, lengths = to_matrix([latencies_by_target[target] for target in targets])
+    columns = summarize_matrix(matrix, lengths, percentiles)
+    as_lists = {field: values.tolist() for field, values in columns.items()}
+    results = {}
+    for i, target in enumerate(targets):
+        stats = {}
+        for field, values in as_lists.items():
+            value = values[i]
+            stats[field] = None if value != value else value  # NaN -> None
+        results[target] = stats
+    return results
+
+
+def summarize(latencies, percentiles=(50, 95, 99)):
+    """Statistics dict for a single list of RTTs (None = loss)"""
+    return summarize_many({0: latencies}, percentiles)[0]
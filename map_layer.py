@@ -0,0 +1,171 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import folium
+from folium.plugins import HeatMap
+
+# Location mapping for common IPs
+LOCATION_MAP = {
+    "8.8.8.8": ("Mountain View, CA, USA", 37.4056, -122.0775),
+    "8.8.4.4": ("Mountain View, CA, USA", 37.4056, -122.0775),
+    "1.1.1.1": ("San Francisco, CA, USA", 37.7749, -122.4194),
+    "1.0.0.1": ("San Francisco, CA, USA", 37.7749, -122.4194),
+    "208.67.222.222": ("San Francisco, CA, USA", 37.7749, -122.4194),
+    "208.67.220.220": ("San Francisco, CA, USA", 37.7749, -122.4194),
+}
+
+# Stats shown on the map; a change to any of them changes the data key
+MARKER_FIELDS = ("avg", "min", "max", "packet_loss")
+
+
+def locate_known(ips):
+    """``{ip: (name, lat, lon)}`` for the IPs in LOCATION_MAP"""
+    return {ip: LOCATION_MAP[ip] for ip in ips if ip in LOCATION_MAP}
+
+
+def marker_color(avg_latency):
+    if avg_latency < 50:
+        return 'green'
+    elif avg_latency < 100:
+        return 'orange'
+    return 'red'
+
+
+def data_key(current, salt=""):
+    """Short hash of everything the map shows for a latency_data snapshot"""
+    digest = hashlib.sha1(salt.encode())
+    for ip in sorted(current):
+        stats = current[ip]
+        digest.update(repr((ip,) + tuple(stats.get(field) for field in MARKER_FIELDS)).encode())
+    return digest.hexdigest()[:16]
+
+
+class MapCache:
+    """Map layers (markers + heat points) cached by a hash of the data.
+
+    ``layer()`` only locates and resolves targets when the data key
+    changes; ``diff()`` returns what changed since a key the client already
+    has, so a persistent client-side map only touches the markers that
+    moved. ``html()`` renders the full folium page once per key, written
+    atomically under a key-specific name so concurrent requests never see a
+    half-written file.
+
+    ``locate(ips)`` returns ``{ip: (name, lat, lon)}`` for the IPs it can
+    place; ``resolve_names(ips)`` optionally returns ``{ip: hostname}``.
+    """
+
+    def __init__(self, static_dir, locate=locate_known, resolve_names=None, keep=8):
+        self.static_dir = static_dir
+        self.locate = locate
+        self.resolve_names = resolve_names
+        self.keep = keep
+        self._layers = OrderedDict()  # key -> layer dict, newest last
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._html_lock = threading.Lock()
+
+    def _build(self, key, current):
+        locations = self.locate(list(current))
+        hostnames = self.resolve_names(list(locations)) if self.resolve_names and locations else {}
+        markers = {}
+        for ip, (name, lat, lon) in locations.items():
+            stats = current[ip]
+            marker = {"ip": ip, "name": name, "hostname": hostnames.get(ip), "lat": lat, "lon": lon}
+            for field in MARKER_FIELDS:
+                marker[field] = stats.get(field)
+            marker["color"] = marker_color(stats.get('avg') or 0)
+            markers[ip] = marker
+        heat = [[m["lat"], m["lon"], (m["avg"] or 0) / 10] for m in markers.values()]
+        return {"key": key, "markers": markers, "heat": heat}
+
+    def invalidate(self):
+        """Forget cached layers (e.g. after the location source changed)"""
+        with self._lock:
+            self._generation += 1
+            self._layers.clear()
+
+    def layer(self, current):
+        """Cached layer for a latency_data snapshot"""
+        key = data_key(current, salt=str(self._generation))
+        with self._lock:
+            layer = self._layers.get(key)
+            if layer is None:
+                layer = self._layers[key] = self._build(key, current)
+                while len(self._layers) > self.keep:
+                    self._layers.popitem(last=False)
+            else:
+                self._layers.move_to_end(key)
+            return layer
+
+    def diff(self, current, since=None):
+        """JSON payload bringing a client at layer ``since`` up to date"""
+        layer = self.layer(current)
+        if since == layer["key"]:
+            return {"key": layer["key"], "unchanged": True}
+        with self._lock:
+            previous = self._layers.get(since) if since else None
+        markers = layer["markers"]
+        if previous is None:
+            return {"key": layer["key"], "full": True, "markers": list(markers.values()), "removed": [], "heat": layer["heat"]}
+        old = previous["markers"]
+        return {
+            "key": layer["key"],
+            "full": False,
+            "markers": [m for ip, m in markers.items() if old.get(ip) != m],
+            "removed": [ip for ip in old if ip not in markers],
+            "heat": layer["heat"]
+        }
+
+    def html(self, current):
+        """URL path of the rendered folium map and whether it was already cached"""
+        layer = self.layer(current)
+        filename = f"latency_map_{layer['key']}.html"
+        path = os.path.join(self.static_dir, "maps", filename)
+        url = f"/static/maps/{filename}"
+        with self._html_lock:
+            if os.path.exists(path):
+                return url, True
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._render(layer).save(path + ".tmp")
+            os.replace(path + ".tmp", path)
+            self._prune(os.path.dirname(path))
+        return url, False
+
+    def _render(self, layer):
+        # Create a map centered at a default location (world view)
+        m = folium.Map(location=[20, 0], zoom_start=2)
+        for marker in layer["markers"].values():
+            # Create popup with real data
+            popup_html = f"""
+            <b>{marker['name']}</b><br>
+            IP: {marker['ip']}<br>
+            Avg Latency: {marker['avg']:.2f} ms<br>
+            Min: {marker['min']:.2f} ms<br>
+            Max: {marker['max']:.2f} ms<br>
+            Packet Loss: {marker['packet_loss']:.1f}%
+            """
+            folium.Marker(
+                [marker['lat'], marker['lon']],
+                popup=folium.Popup(popup_html, max_width=250),
+                tooltip=f"{marker['ip']} - {marker['avg']:.2f} ms",
+                icon=folium.Icon(color=marker['color'], icon='info-sign')
+            ).add_to(m)
+        # Add heatmap layer if we have data
+        if layer["heat"]:
+            HeatMap(layer["heat"], radius=25, blur=35, max_zoom=13).add_to(m)
+        return m
+
+    def _prune(self, directory):
+        """Keep only the newest ``keep`` rendered maps"""
+        files = sorted(
+            (os.path.join(directory, name) for name in os.listdir(directory)
+             if name.startswith("latency_map_") and name.endswith(".html")),
+            key=os.path.getmtime
+        )
+        for path in files[:-self.keep]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
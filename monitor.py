@@ -0,0 +1,149 @@
+import heapq
+import itertools
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class _Target:
+    __slots__ = ('name', 'interval', 'generation')
+
+    def __init__(self, name, interval, generation):
+        self.name = name
+        self.interval = interval
+        self.generation = generation
+
+
+class Monitor:
+    """Probe a registered target set continuously in the background.
+
+    Every target has its own interval. First probes are spread uniformly over
+    one interval so a large target set doesn't fire in a single burst, and
+    later slots are computed from the previous *scheduled* time rather than
+    from when the probe finished, so schedules don't drift. If the monitor
+    falls behind (e.g. the pool is saturated) missed slots are skipped rather
+    than replayed.
+
+    ``probe(target, timeout)`` runs on a bounded worker pool; finished samples
+    are handed to ``on_batch([(target, sample, wall_time), ...])`` at most
+    every ``flush_interval`` seconds so thousands of targets don't turn into
+    thousands of callbacks.
+    """
+
+    def __init__(self, probe, on_batch, max_concurrency=256, timeout=2, flush_interval=1.0):
+        self.probe = probe
+        self.on_batch = on_batch
+        self.timeout = timeout
+        self.flush_interval = flush_interval
+        self.max_concurrency = max_concurrency
+        self._targets = {}
+        self._heap = []
+        self._generations = itertools.count()
+        self._cond = threading.Condition()
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._results = []
+        self._results_lock = threading.Lock()
+        self._pool = None
+        self._thread = None
+        self._running = False
+
+    def add_targets(self, targets, interval=10.0):
+        """Register targets (or change their interval); starts their schedule"""
+        if interval <= 0:
+            raise ValueError("interval must be positive")
+        now = time.monotonic()
+        with self._cond:
+            for name in targets:
+                target = _Target(name, interval, next(self._generations))
+                self._targets[name] = target
+                first_due = now + random.uniform(0, interval)
+                heapq.heappush(self._heap, (first_due, target.generation, target))
+            self._cond.notify()
+
+    def remove_targets(self, targets):
+        with self._cond:
+            for name in targets:
+                self._targets.pop(name, None)
+            # Stale heap entries are skipped when they come due
+            self._cond.notify()
+
+    def targets(self):
+        with self._cond:
+            return {name: target.interval for name, target in self._targets.items()}
+
+    @property
+    def running(self):
+        return self._running
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+            self._pool = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="monitor")
+            self._thread = threading.Thread(target=self._run, name="monitor", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            if not self._running:
+                return
+            self._running = False
+            self._cond.notify()
+        self._thread.join()
+        self._pool.shutdown(wait=True)
+        self._flush()
+
+    def _run(self):
+        next_flush = time.monotonic() + self.flush_interval
+        while True:
+            due = []
+            with self._cond:
+                if not self._running:
+                    return
+                now = time.monotonic()
+                while self._heap and self._heap[0][0] <= now:
+                    due_at, generation, target = heapq.heappop(self._heap)
+                    if self._targets.get(target.name) is not target:
+                        continue  # removed or re-registered
+                    due.append(target)
+                    # Next slot from the schedule, skipping any we already missed
+                    next_due = due_at + target.interval
+                    if next_due <= now:
+                        missed = int((now - next_due) // target.interval) + 1
+                        next_due += missed * target.interval
+                    heapq.heappush(self._heap, (next_due, generation, target))
+                if not due:
+                    wake_at = self._heap[0][0] if self._heap else next_flush
+                    self._cond.wait(max(0, min(wake_at, next_flush) - now))
+
+            for target in due:
+                # Block here rather than queue unboundedly when the pool is full
+                self._slots.acquire()
+                self._pool.submit(self._probe_one, target.name)
+
+            if time.monotonic() >= next_flush:
+                self._flush()
+                next_flush = time.monotonic() + self.flush_interval
+
+    def _probe_one(self, name):
+        try:
+            try:
+                sample = self.probe(name, self.timeout)
+            except Exception as e:
+                print(f"Monitor error probing {name}: {str(e)}")
+                sample = None
+            with self._results_lock:
+                self._results.append((name, sample, time.time()))
+        finally:
+            self._slots.release()
+
+    def _flush(self):
+        with self._results_lock:
+            batch, self._results = self._results, []
+        if batch:
+            try:
+                self.on_batch(batch)
+            except Exception as e:
+                print(f"Monitor callback error: {str(e)}")
@@ -1,4 +1,3 @@
-import scapy.all as scapy
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import pandas as pd
@@ -14,6 +13,14 @@ import json
 import csv
 import os
 from datetime import datetime
+from icmp_prober import IcmpProber
+from resolver import ReverseResolver
+import latency_stats
+from samples import SampleSeries, results_to_json
+import columnar
+import geoip
+from map_layer import locate_known
+from geocode_cache import GeocodeCache, nominatim_geocoder
 
 class NetworkLatencyTool:
     def __init__(self, root):  # Fixed from _init_ to __init__
@@ -25,6 +32,12 @@ class NetworkLatencyTool:
         self.latency_data = {}
         self.historical_data = []
         self.geolocator = Nominatim(user_agent="network_latency_tool")
+        self.prober = None
+        self.geo_db = None  # offline geolocation database, loaded on first map
+        self.geo_db_path = None
+        self.geocode_cache = None  # persistent Nominatim cache, opened on first use
+        self.geo_lock = threading.Lock()  # the map and the prefetch thread both open these
+        self.resolver = ReverseResolver()
         
         # Create GUI elements
         self.create_gui()
@@ -137,6 +150,7 @@ class NetworkLatencyTool:
         
         ttk.Button(button_frame, text="View Details", command=self.view_historical_details).pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="Export History", command=self.export_history).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Import History", command=self.import_history).pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="Clear History", command=self.clear_history).pack(side=tk.LEFT, padx=5)
     
     def create_tab3(self):
@@ -203,24 +217,27 @@ class NetworkLatencyTool:
         
         ttk.Button(advanced_frame, text="Browse", command=self.browse_storage_path).grid(row=0, column=2, padx=5, pady=5)
         
+        ttk.Label(advanced_frame, text="GeoIP Database (CSV/MMDB):").grid(row=1, column=0, padx=5, pady=5, sticky=tk.W)
+        self.geoip_path = ttk.Entry(advanced_frame, width=50)
+        self.geoip_path.grid(row=1, column=1, padx=5, pady=5)
+        
+        ttk.Button(advanced_frame, text="Browse", command=self.browse_geoip_path).grid(row=1, column=2, padx=5, pady=5)
+        
         # Save settings button
         ttk.Button(settings_frame, text="Save Settings", command=self.save_settings).pack(pady=10)
     
+    def get_prober(self):
+        # Open the shared ICMP socket on first use so the GUI can start without it
+        if self.prober is None:
+            self.prober = IcmpProber(timeout=2)
+        return self.prober
+    
     def measure_latency(self, ip_address, num_pings=10):
         # This method is now only used for individual measurements, not from the UI
         # The main measurement functionality has been moved to the start_measurement method
         latencies = []
         for _ in range(num_pings):
-            packet = scapy.IP(dst=ip_address)/scapy.ICMP()
-            start_time = time.time()
-            reply = scapy.sr1(packet, timeout=2, verbose=0)
-            end_time = time.time()
-            
-            if reply:
-                latency = (end_time - start_time) * 1000  # Convert to milliseconds
-                latencies.append(latency)
-            else:
-                latencies.append(None)  # No response
+            latencies.append(self.get_prober().ping(ip_address, timeout=2))  # None if no response
             
             time.sleep(0.2)  # Reduced wait time between pings
         
@@ -259,6 +276,10 @@ class NetworkLatencyTool:
         # Disable the start button to prevent multiple clicks
         self.start_button.configure(state="disabled")
         
+        # Geocode the targets while they are being measured, so the map is
+        # ready (from cache) by the time it is asked for
+        self.prefetch_locations(ip_addresses)
+        
         # Function to run in background thread
         def background_task():
             self.latency_data = {}
@@ -270,7 +291,7 @@ class NetworkLatencyTool:
                 # Update status
                 self.root.after(0, lambda ip=ip: status_label.config(text=f"Testing {ip}..."))
                 
-                latencies = []
+                series = SampleSeries()
                 for j in range(num_pings):
                     # Update progress
                     current_ping += 1
@@ -278,34 +299,18 @@ class NetworkLatencyTool:
                     self.root.after(0, lambda p=progress_percent: progress_var.set(p))
                     
                     # Measure single ping
-                    packet = scapy.IP(dst=ip)/scapy.ICMP()
-                    start_time = time.time()
-                    reply = scapy.sr1(packet, timeout=2, verbose=0)
-                    end_time = time.time()
-                    
-                    if reply:
-                        latency = (end_time - start_time) * 1000  # Convert to milliseconds
-                        latencies.append(latency)
-                    else:
-                        latencies.append(None)  # No response
+                    sample = self.get_prober().ping_sample(ip, timeout=2)  # rtt_ms is None if no response
+                    series.append(sample.rtt_ms, sample.source)
                     
                     time.sleep(0.2)  # Reduced wait time between pings
                 
-                # Calculate statistics
-                valid_latencies = [lat for lat in latencies if lat is not None]
-                avg_latency = sum(valid_latencies) / len(valid_latencies) if valid_latencies else 0
-                min_latency = min(valid_latencies) if valid_latencies else 0
-                max_latency = max(valid_latencies) if valid_latencies else 0
-                packet_loss = (1 - len(valid_latencies)/num_pings) * 100
-                
-                # Store data for visualization
-                self.latency_data[ip] = {
-                    "latencies": latencies,
-                    "avg": avg_latency,
-                    "min": min_latency,
-                    "max": max_latency,
-                    "packet_loss": packet_loss
-                }
+                # Store data for visualization (compact buffers, see samples.py)
+                self.latency_data[ip] = {"samples": series}
+            
+            # Calculate statistics for all IPs in one batch
+            stats = latency_stats.summarize_many({ip: data["samples"].rtts for ip, data in self.latency_data.items()})
+            for ip, data in self.latency_data.items():
+                data.update(stats[ip])
             
             # When all measurements are complete, update UI in main thread
             self.root.after(0, complete_measurements)
@@ -354,7 +359,7 @@ class NetworkLatencyTool:
         
         # Plot latency for each IP
         for ip, data in self.latency_data.items():
-            latencies = data["latencies"]
+            latencies = data["samples"].latencies()
             x = list(range(1, len(latencies)+1))
             y = [lat if lat is not None else 0 for lat in latencies]
             
@@ -468,34 +473,31 @@ class NetworkLatencyTool:
             # Create list for heatmap data
             heat_data = []
             
+            # Place what we can offline in one batch: well-known IPs, then the
+            # GeoIP database; only the rest needs a hostname and a geocode call
+            locations = locate_known(ip_addresses)
+            db = self.get_geoip(self.geoip_path.get().strip() or None)
+            if db is not None:
+                locations.update(db.lookup_many([ip for ip in ip_addresses if ip not in locations]))
+            
+            # Resolve and geocode the rest concurrently; answers (including
+            # "not found") are cached on disk, so repeat maps skip Nominatim
+            remaining = [ip for ip in ip_addresses if ip not in locations]
+            hostnames = self.resolver.resolve_many(remaining, timeout=5)
+            geocoded = self.get_geocode_cache(self.storage_path.get()).locate_many({ip: hostnames.get(ip) for ip in remaining})
+            
             # Process each IP address
             for ip in ip_addresses:
                 try:
-                    # Try to get hostname/location info for the IP
-                    import socket
-                    try:
-                        hostname = socket.gethostbyaddr(ip)[0]
-                    except:
-                        hostname = ip
-                    
-                    # Try to geocode the hostname or use a geolocation API for the IP
-                    # For DNS servers and well-known IPs, manually map some common ones
-                    location_map = {
-                        "8.8.8.8": ("Mountain View, CA, USA", 37.4056, -122.0775),  # Google DNS
-                        "8.8.4.4": ("Mountain View, CA, USA", 37.4056, -122.0775),  # Google DNS
-                        "1.1.1.1": ("San Francisco, CA, USA", 37.7749, -122.4194),  # Cloudflare DNS
-                        "1.0.0.1": ("San Francisco, CA, USA", 37.7749, -122.4194),  # Cloudflare DNS
-                        "208.67.222.222": ("San Francisco, CA, USA", 37.7749, -122.4194),  # OpenDNS
-                        "208.67.220.220": ("San Francisco, CA, USA", 37.7749, -122.4194),  # OpenDNS
-                    }
-                    
-                    if ip in location_map:
-                        loc_name, lat, lon = location_map[ip]
+                    if ip in locations:
+                        loc_name, lat, lon = locations[ip]
+                        location = type('obj', (object,), {'latitude': lat, 'longitude': lon})()
+                    elif ip in geocoded:
+                        _, lat, lon = geocoded[ip]
                         location = type('obj', (object,), {'latitude': lat, 'longitude': lon})()
+                        loc_name = hostnames.get(ip) or ip
                     else:
-                        # Try to geocode the hostname
-                        location = self.geolocator.geocode(hostname)
-                        loc_name = hostname
+                        location = None
                     
                     if location:
                         # Get actual measured latency data
@@ -561,12 +563,66 @@ class NetworkLatencyTool:
             self.storage_path.delete(0, tk.END)
             self.storage_path.insert(0, directory)
     
+    def browse_geoip_path(self):
+        # Pick an offline IP range file for the map
+        filename = filedialog.askopenfilename(
+            title="GeoIP Database",
+            filetypes=[("IP range files", "*.csv *.mmdb"), ("All files", "*.*")]
+        )
+        if filename:
+            self.geoip_path.delete(0, tk.END)
+            self.geoip_path.insert(0, filename)
+    
+    def get_geoip(self, path):
+        # Load (or reload after the setting changed) the offline geolocation database
+        with self.geo_lock:
+            if path != self.geo_db_path:
+                try:
+                    self.geo_db = geoip.load(path)
+                except Exception as e:
+                    print(f"Could not load geolocation database {path}: {str(e)}")
+                    self.geo_db = None
+                self.geo_db_path = path
+            return self.geo_db
+    
+    def get_geocode_cache(self, storage_path):
+        # Open the geocode cache in the storage directory (reopened if that moves)
+        path = os.path.join(storage_path, "geocode_cache.sqlite3")
+        with self.geo_lock:
+            if self.geocode_cache is None or self.geocode_cache.path != path:
+                if self.geocode_cache is not None:
+                    self.geocode_cache.close()
+                self.geocode_cache = GeocodeCache(path, nominatim_geocoder(self.geolocator))
+            return self.geocode_cache
+    
+    def prefetch_locations(self, ip_addresses):
+        # Warm the geocode cache for targets the offline sources can't place.
+        # Loading the GeoIP file can take a while, so everything but reading
+        # the settings widgets happens off the Tk thread
+        geoip_path = self.geoip_path.get().strip() or None
+        storage_path = self.storage_path.get()
+        
+        def prefetch():
+            try:
+                locations = locate_known(ip_addresses)
+                db = self.get_geoip(geoip_path)
+                if db is not None:
+                    locations.update(db.lookup_many([ip for ip in ip_addresses if ip not in locations]))
+                remaining = [ip for ip in ip_addresses if ip not in locations]
+                if remaining:
+                    self.get_geocode_cache(storage_path).prefetch(remaining, resolve=lambda ips: self.resolver.resolve_many(ips, timeout=5))
+            except Exception as e:
+                print(f"Could not prefetch locations: {str(e)}")
+        
+        threading.Thread(target=prefetch, daemon=True).start()
+    
     def save_settings(self):
         # Save settings
         settings = {
             "default_pings": self.default_pings.get(),
             "ping_timeout": self.ping_timeout.get(),
-            "storage_path": self.storage_path.get()
+            "storage_path": self.storage_path.get(),
+            "geoip_database": self.geoip_path.get()
         }
         
         # Create settings directory if it doesn't exist
@@ -611,7 +667,7 @@ class NetworkLatencyTool:
             filename = f"latency_data_{timestamp}.json"
             
             with open(filename, 'w') as jsonfile:
-                json.dump(self.latency_data, jsonfile, indent=4)
+                json.dump(results_to_json(self.latency_data), jsonfile, indent=4)
             
             messagebox.showinfo("Export Complete", f"Data exported to {filename}")
         
@@ -620,7 +676,7 @@ class NetworkLatencyTool:
     
     def export_history(self):
         # Ask for file format
-        file_format = simpledialog.askstring("Export History", "Enter file format (csv/json):", initialvalue="json")
+        file_format = simpledialog.askstring("Export History", "Enter file format (csv/json/arrow/parquet):", initialvalue="json")
         
         if file_format and file_format.lower() == "csv":
             # Export to CSV
@@ -654,12 +710,76 @@ class NetworkLatencyTool:
             filename = f"latency_history_{timestamp}.json"
             
             with open(filename, 'w') as jsonfile:
-                json.dump(self.historical_data, jsonfile, indent=4)
+                json.dump([
+                    {"timestamp": entry["timestamp"], "data": results_to_json(entry["data"])}
+                    for entry in self.historical_data
+                ], jsonfile, indent=4)
+            
+            messagebox.showinfo("Export Complete", f"Historical data exported to {filename}")
+        
+        elif file_format and file_format.lower() in columnar.FORMATS:
+            # Columnar export (same runs table as the web app's /export_history)
+            if not columnar.available():
+                messagebox.showerror("Export Error", "Arrow/Parquet export needs pyarrow (pip install pyarrow)")
+                return
+            file_format = file_format.lower()
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            filename = f"latency_runs_{timestamp}.{columnar.FORMATS[file_format][1]}"
+            
+            runs = (
+                {"timestamp": entry["timestamp"], "data": results_to_json(entry["data"])}
+                for entry in self.historical_data
+            )
+            columnar.write_file(filename, columnar.run_batches(runs), columnar.runs_schema(), file_format)
             
             messagebox.showinfo("Export Complete", f"Historical data exported to {filename}")
         
         else:
-            messagebox.showerror("Export Error", "Invalid file format. Please enter 'csv' or 'json'.")
+            messagebox.showerror("Export Error", "Invalid file format. Please enter 'csv', 'json', 'arrow' or 'parquet'.")
+    
+    def import_history(self):
+        # Load a runs export (from this tool or the web app) into the history
+        if not columnar.available():
+            messagebox.showerror("Import Error", "Arrow/Parquet import needs pyarrow (pip install pyarrow)")
+            return
+        filename = filedialog.askopenfilename(
+            title="Import History",
+            filetypes=[("Arrow / Parquet", "*.arrows *.arrow *.parquet"), ("All files", "*.*")]
+        )
+        if not filename:
+            return
+        
+        try:
+            with open(filename, "rb") as f:
+                batches = columnar.read_batches(f)
+                first = next(batches, None)
+                if first is None:
+                    messagebox.showinfo("Import Complete", "The file contains no history")
+                    return
+                if columnar.table_kind(first.schema) != "runs":
+                    messagebox.showerror("Import Error", "Only runs exports can be imported here")
+                    return
+                
+                count = 0
+                known = {entry["timestamp"] for entry in self.historical_data}
+                for run in columnar.iter_runs([first, *batches]):
+                    if run["timestamp"] in known:
+                        continue
+                    data = {}
+                    for ip, stats in run["data"].items():
+                        entry = {"samples": SampleSeries.from_latencies(stats.pop("latencies"), stats.pop("timestamp_sources", None))}
+                        entry.update(stats)
+                        data[ip] = entry
+                    self.historical_data.append({"timestamp": run["timestamp"], "data": data})
+                    known.add(run["timestamp"])
+                    count += 1
+        except Exception as e:
+            messagebox.showerror("Import Error", f"Could not import {filename}: {str(e)}")
+            return
+        
+        self.historical_data.sort(key=lambda entry: entry["timestamp"])
+        self.update_historical_view()
+        messagebox.showinfo("Import Complete", f"Imported {count} historical entries")
 
 if __name__ == "__main__":
     root = tk.Tk()
@@ -0,0 +1,110 @@
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class ProbeEngine:
+    """Probe many targets at once with a concurrency cap and per-target pacing.
+
+    ``probe`` is any callable ``probe(target, timeout)`` returning a sample
+    (an RTT in milliseconds or a ``timing.RttSample``); ``None`` means loss.
+    Each target gets its own worker that sends ``num_pings`` probes spaced
+    ``interval`` seconds apart, so a sweep takes roughly as long as the
+    slowest target instead of the sum of all of them (as long as the number
+    of targets stays under ``max_concurrency``).
+    """
+
+    def __init__(self, probe, max_concurrency=64, interval=0.1, timeout=2):
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        self.probe = probe
+        self.max_concurrency = max_concurrency
+        self.interval = interval
+        self.timeout = timeout
+
+    def run(self, targets, num_pings, on_progress=None, on_batch=None, batch_interval=0.25, cancel=None):
+        """Probe every target and return ``{target: [sample_or_None, ...]}``.
+
+        ``on_progress(target, index, done, total)`` is called from the calling
+        thread after each probe completes, so socket.io handlers can ``emit``
+        from it without leaving their request context.
+
+        ``on_batch(samples, done, total)`` is the coalesced alternative: it is
+        also called from the calling thread, with the ``(target, index,
+        sample)`` tuples completed since the last call, at most once every
+        ``batch_interval`` seconds plus once at the end. Use it to stream
+        results without sending one message per probe.
+
+        ``cancel`` is an optional ``threading.Event``; once it is set no new
+        probes are sent and ``run`` returns after the probes in flight finish,
+        with each target's list cut down to the probes actually sent.
+        """
+        # Keep the caller's order (and drop duplicates) in the result dict
+        targets = list(dict.fromkeys(targets))
+        results = {target: [None] * num_pings for target in targets}
+        total = len(targets) * num_pings
+        if total == 0:
+            return results
+
+        events = queue.Queue()
+        stop = threading.Event()
+        cancel = cancel or threading.Event()
+        sent = dict.fromkeys(targets, 0)
+
+        def worker(target):
+            next_send = time.monotonic()
+            for i in range(num_pings):
+                # Per-target pacing: wait until this target's next slot
+                delay = next_send - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                if stop.is_set() or cancel.is_set():
+                    return
+                next_send = time.monotonic() + self.interval
+                sent[target] = i + 1
+                try:
+                    rtt = self.probe(target, self.timeout)
+                except Exception as e:
+                    print(f"Error pinging {target}: {str(e)}")
+                    rtt = None
+                results[target][i] = rtt
+                events.put((target, i))
+
+        workers = min(self.max_concurrency, len(targets))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="probe") as pool:
+            futures = [pool.submit(worker, target) for target in targets]
+            try:
+                pending = []
+                next_flush = time.monotonic() + batch_interval
+                done = 0
+                while done < total and not (cancel.is_set() and done == sum(sent.values())):
+                    if on_batch and pending:
+                        wait = max(next_flush - time.monotonic(), 0)
+                    else:
+                        wait = 0.5  # wake up now and then to notice cancellation
+                    try:
+                        target, index = events.get(timeout=wait)
+                    except queue.Empty:
+                        target = None
+                    if target is not None:
+                        done += 1
+                        if on_progress:
+                            on_progress(target, index, done, total)
+                        if on_batch:
+                            pending.append((target, index, results[target][index]))
+                    if on_batch and pending and (done == total or time.monotonic() >= next_flush):
+                        on_batch(pending, done, total)
+                        pending = []
+                        next_flush = time.monotonic() + batch_interval
+                if on_batch and pending:
+                    on_batch(pending, done, total)
+            finally:
+                stop.set()
+            for future in futures:
+                future.result()
+
+        if cancel.is_set():
+            for target in targets:
+                del results[target][sent[target]:]
+        return results
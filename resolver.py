@@ -0,0 +1,119 @@
+import socket
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+
+class ReverseResolver:
+    """Shared reverse-DNS service with a TTL-bounded LRU cache.
+
+    Lookups run on a small thread pool so callers can resolve a whole batch
+    at once (or prefetch it off the request path) instead of stalling on
+    ``socket.gethostbyaddr`` one address at a time. Failed lookups are cached
+    too, for ``negative_ttl`` seconds, so unresolvable hops don't hit the
+    resolver on every traceroute. Concurrent requests for the same address
+    share one lookup.
+    """
+
+    def __init__(self, max_workers=16, max_entries=4096, positive_ttl=3600,
+                 negative_ttl=300, lookup=None):
+        self.max_entries = max_entries
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self._lookup = lookup or (lambda ip: socket.gethostbyaddr(ip)[0])
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="rdns")
+        self._cache = OrderedDict()  # ip -> (hostname or None, expires_at)
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+
+    def _cached(self, ip):
+        """Return (found, hostname) from the cache; caller holds the lock"""
+        entry = self._cache.get(ip)
+        if entry is None:
+            return False, None
+        hostname, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._cache[ip]
+            return False, None
+        self._cache.move_to_end(ip)
+        if hostname is None:
+            self.negative_hits += 1
+        else:
+            self.hits += 1
+        return True, hostname
+
+    def _store(self, ip, hostname):
+        ttl = self.positive_ttl if hostname is not None else self.negative_ttl
+        with self._lock:
+            self._cache[ip] = (hostname, time.monotonic() + ttl)
+            self._cache.move_to_end(ip)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+            self._inflight.pop(ip, None)
+
+    def _run_lookup(self, ip):
+        try:
+            hostname = self._lookup(ip)
+        except Exception:
+            # herror / gaierror / bad address: remember the failure
+            hostname = None
+        self._store(ip, hostname)
+        return hostname
+
+    def submit(self, ip):
+        """Return a Future resolving to ip's hostname (None if it has none)"""
+        with self._lock:
+            found, hostname = self._cached(ip)
+            if not found:
+                future = self._inflight.get(ip)
+                if future is None:
+                    self.misses += 1
+                    future = self._pool.submit(self._run_lookup, ip)
+                    self._inflight[ip] = future
+                return future
+        future = Future()
+        future.set_result(hostname)
+        return future
+
+    def resolve(self, ip, timeout=None):
+        """Hostname for ip, or None if unknown or not resolved within timeout"""
+        future = self.submit(ip)
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            return None
+
+    def resolve_many(self, ips, timeout=None):
+        """Resolve a batch concurrently; returns ``{ip: hostname_or_None}``.
+
+        Lookups still running at the timeout keep going in the background and
+        land in the cache for the next caller.
+        """
+        futures = {ip: self.submit(ip) for ip in dict.fromkeys(ips)}
+        wait(futures.values(), timeout=timeout)
+        return {ip: future.result() if future.done() and not future.exception() else None
+                for ip, future in futures.items()}
+
+    def prefetch(self, ips):
+        """Start lookups for ips without waiting for them"""
+        for ip in dict.fromkeys(ips):
+            self.submit(ip)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "negative_hits": self.negative_hits,
+                "misses": self.misses,
+                "size": len(self._cache),
+                "inflight": len(self._inflight)
+            }
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
@@ -0,0 +1,186 @@
+import json
+
+from sketches import DDSketch
+
+# (name, bucket width in seconds), finest first
+TIERS = (("1m", 60), ("5m", 300), ("1h", 3600))
+
+ROLLUP_FIELDS = ("count", "lost", "min", "max", "avg", "p50", "p95", "p99")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rollups (
+    tier TEXT NOT NULL,
+    target TEXT NOT NULL,
+    bucket REAL NOT NULL,
+    count INTEGER NOT NULL,
+    lost INTEGER NOT NULL,
+    min REAL, max REAL, avg REAL,
+    p50 REAL, p95 REAL, p99 REAL,
+    sketch TEXT,
+    PRIMARY KEY (tier, target, bucket)
+);
+"""
+
+
+class _Bucket:
+    __slots__ = ('count', 'lost', 'sketch')
+
+    def __init__(self, sketch=None, count=0, lost=0):
+        self.count = count
+        self.lost = lost
+        self.sketch = sketch if sketch is not None else DDSketch()
+
+    def add(self, rtt):
+        self.count += 1
+        if rtt is None:
+            self.lost += 1
+        else:
+            self.sketch.add(rtt)
+
+    def row(self):
+        """Values for the rollup columns after (tier, target, bucket)"""
+        sketch = self.sketch
+        return (
+            self.count,
+            self.lost,
+            sketch.min if sketch.count else None,
+            sketch.max if sketch.count else None,
+            sketch.avg,
+            sketch.quantile(0.50),
+            sketch.quantile(0.95),
+            sketch.quantile(0.99),
+            json.dumps(sketch.to_dict())
+        )
+
+
+class Rollups:
+    """1m / 5m / 1h rollups kept up to date as samples are appended.
+
+    Buckets that can still receive samples stay open in memory and their
+    current aggregates are upserted with every batch, so charts always see
+    the latest bucket. Percentiles come from a DDSketch per bucket, which is
+    stored with the row, so memory per bucket is bounded and buckets can be
+    merged later across time and targets. A bucket is closed (dropped from
+    memory) once samples more than one bucket-width newer have arrived; a
+    late sample for a closed bucket reopens it from its stored sketch. Must
+    be called with the owning HistoryStore's write lock held, inside its
+    transaction.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.conn.executescript(SCHEMA)
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(rollups)")]
+        if "sketch" not in columns:
+            self.conn.execute("ALTER TABLE rollups ADD COLUMN sketch TEXT")
+        self._open = {}  # (tier, target, bucket_start) -> _Bucket
+        self._latest = float("-inf")
+
+    def _reopen(self, tier, step, target, start):
+        row = self.conn.execute(
+            "SELECT count, lost, sketch FROM rollups WHERE tier = ? AND target = ? AND bucket = ?",
+            (tier, target, start)
+        ).fetchone()
+        if row is None:
+            return _Bucket()
+        count, lost, sketch = row[0], row[1], row[2]
+        if sketch is not None:
+            return _Bucket(DDSketch.from_dict(json.loads(sketch)), count, lost)
+        # Rows written before sketches were stored: rebuild from raw samples
+        bucket = _Bucket()
+        for (rtt,) in self.conn.execute(
+            "SELECT rtt_ms FROM samples WHERE target = ? AND ts >= ? AND ts < ?",
+            (target, start, start + step)
+        ):
+            bucket.add(rtt)
+        return bucket
+
+    def add(self, rows):
+        """Fold (target, ts, rtt_ms_or_None, ...) rows into every tier.
+
+        Call before the rows themselves are inserted into ``samples``.
+        """
+        touched = set()
+        for row in rows:
+            target, ts, rtt = row[0], row[1], row[2]
+            self._latest = max(self._latest, ts)
+            for tier, step in TIERS:
+                start = ts - ts % step
+                key = (tier, target, start)
+                bucket = self._open.get(key)
+                if bucket is None:
+                    bucket = self._open[key] = self._reopen(tier, step, target, start)
+                bucket.add(rtt)
+                touched.add(key)
+
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO rollups (tier, target, bucket, " + ", ".join(ROLLUP_FIELDS) + ", sketch) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [key + self._open[key].row() for key in touched]
+        )
+        self._close_old()
+
+    def _close_old(self):
+        steps = dict(TIERS)
+        for key in [key for key in self._open if key[2] + 2 * steps[key[0]] <= self._latest]:
+            del self._open[key]
+
+    def clear(self):
+        self._open.clear()
+        self._latest = float("-inf")
+        self.conn.execute("DELETE FROM rollups")
+
+
+def merge_sketches(rows):
+    """Merge the stored sketches of rollup rows into one DDSketch"""
+    merged = DDSketch()
+    for (sketch,) in rows:
+        if sketch is not None:
+            merged.merge(DDSketch.from_dict(json.loads(sketch)))
+    return merged
+
+
+def pick_tier(start, end, width):
+    """Finest tier that needs at most ``width`` points for [start, end]"""
+    span = max(end - start, 1)
+    for tier, step in TIERS:
+        if span / step <= width:
+            return tier, step
+    return TIERS[-1]
+
+
+def lttb(points, threshold, key="avg"):
+    """Largest-Triangle-Three-Buckets downsampling of ``[{"t", key, ...}]``.
+
+    Keeps the first and last points and, from each of ``threshold - 2``
+    equal buckets, the point forming the largest triangle with its
+    neighbours, which preserves spikes far better than averaging. Points
+    whose ``key`` is None (total loss) are passed through untouched.
+    """
+    valid = [p for p in points if p.get(key) is not None]
+    if threshold >= len(valid) or threshold < 3:
+        return points
+    sampled = [valid[0]]
+    every = (len(valid) - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        # Average of the next bucket is the third triangle vertex
+        next_start = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, len(valid))
+        next_bucket = valid[next_start:next_end] or valid[-1:]
+        avg_t = sum(p["t"] for p in next_bucket) / len(next_bucket)
+        avg_v = sum(p[key] for p in next_bucket) / len(next_bucket)
+
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        at, av = valid[a]["t"], valid[a][key]
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs((at - avg_t) * (valid[j][key] - av) - (at - valid[j]["t"]) * (avg_v - av))
+            if area > best_area:
+                best, best_area = j, area
+        sampled.append(valid[best])
+        a = best
+    sampled.append(valid[-1])
+    lost = [p for p in points if p.get(key) is None]
+    return sorted(sampled + lost, key=lambda p: p["t"]) if lost else sampled
@@ -0,0 +1,116 @@
+import math
+from array import array
+
+import numpy as np
+
+import timing
+
+# One byte per sample for the timestamp source
+SOURCE_CODES = {timing.SOURCE_MONOTONIC: 0, timing.SOURCE_KERNEL: 1}
+SOURCE_NAMES = {code: name for name, code in SOURCE_CODES.items()}
+
+NAN = math.nan
+
+
+class SampleSeries:
+    """RTT samples for one target kept in compact typed buffers.
+
+    RTTs live in an ``array('d')`` with NaN marking a lost probe (8 bytes a
+    sample instead of a float object plus a list slot), and timestamp
+    sources take one byte each. With ``maxlen`` only the most recent samples
+    are kept, like ``deque(maxlen=...)``. ``latencies()`` and
+    ``source_names()`` give back the list shape the UI and exports expect.
+    """
+
+    __slots__ = ('rtts', 'sources', 'maxlen')
+
+    def __init__(self, maxlen=None):
+        self.rtts = array('d')
+        self.sources = bytearray()
+        self.maxlen = maxlen
+
+    @classmethod
+    def from_samples(cls, samples, maxlen=None):
+        """Build from timing.RttSample objects (None entries count as loss)"""
+        series = cls(maxlen)
+        series.extend(samples)
+        return series
+
+    @classmethod
+    def from_latencies(cls, latencies, sources=None, maxlen=None):
+        """Build from the JSON shape (RTT list with None for loss, source names)"""
+        series = cls(maxlen)
+        sources = sources or [timing.SOURCE_MONOTONIC] * len(latencies)
+        for rtt, source in zip(latencies, sources):
+            series.append(rtt, source)
+        return series
+
+    def __len__(self):
+        return len(self.rtts)
+
+    def append(self, rtt_ms, source=timing.SOURCE_MONOTONIC):
+        self.rtts.append(NAN if rtt_ms is None else rtt_ms)
+        self.sources.append(SOURCE_CODES.get(source, 0))
+        if self.maxlen is not None and len(self.rtts) > self.maxlen:
+            excess = len(self.rtts) - self.maxlen
+            del self.rtts[:excess]
+            del self.sources[:excess]
+
+    def extend(self, samples):
+        for sample in samples:
+            if sample is None:
+                self.append(None)
+            else:
+                self.append(sample.rtt_ms, sample.source)
+
+    def resize(self, maxlen):
+        """Change the window size, dropping the oldest samples if needed"""
+        self.maxlen = maxlen
+        if maxlen is not None and len(self.rtts) > maxlen:
+            excess = len(self.rtts) - maxlen
+            del self.rtts[:excess]
+            del self.sources[:excess]
+
+    def copy(self):
+        series = SampleSeries(self.maxlen)
+        series.rtts = array('d', self.rtts)
+        series.sources = bytearray(self.sources)
+        return series
+
+    def as_array(self):
+        """RTTs as a float64 NumPy array (a copy, NaN = loss)"""
+        return np.frombuffer(self.rtts, dtype=np.float64).copy() if self.rtts else np.empty(0)
+
+    def loss_mask(self):
+        """Boolean array, True where the probe was lost"""
+        return np.isnan(self.as_array())
+
+    def latencies(self):
+        """RTTs as a list with None for lost probes"""
+        return [None if rtt != rtt else rtt for rtt in self.rtts]
+
+    def source_names(self):
+        return [SOURCE_NAMES[code] for code in self.sources]
+
+    @property
+    def nbytes(self):
+        return self.rtts.itemsize * len(self.rtts) + len(self.sources)
+
+
+def entry_to_json(entry):
+    """JSON shape of a latency_data entry (``samples`` expanded to lists)"""
+    result = {}
+    samples = entry.get("samples")
+    if samples is not None:
+        result["latencies"] = samples.latencies()
+    for key, value in entry.items():
+        if key != "samples":
+            result[key] = value
+    if samples is not None:
+        result["timestamp_sources"] = samples.source_names()
+    return result
+
+
+def results_to_json(results):
+    """``{ip: entry}`` with every entry in its JSON shape"""
+    return {ip: entry_to_json(entry) for ip, entry in results.items()}
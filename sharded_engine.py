@@ -0,0 +1,171 @@
+import math
+import multiprocessing
+import struct
+import time
+from multiprocessing.connection import wait
+
+import timing
+from probe_engine import ProbeEngine
+from samples import SOURCE_CODES, SOURCE_NAMES
+
+# One sample on the wire: target index, ping index, rtt_ms (NaN = loss),
+# timestamp source code. 17 bytes instead of a pickled tuple.
+RECORD = struct.Struct("<IIdB")
+
+
+def open_probe(kind, timeout=2, ports=(80, 443)):
+    """Probe callable for a worker process, with its own prober and socket"""
+    if kind == "icmp":
+        from icmp_prober import IcmpProber
+        return IcmpProber(timeout=timeout).ping_sample
+    if kind == "tcp":
+        from tcp_prober import TcpProber
+        return TcpProber(ports=ports, timeout=timeout).ping_sample
+    raise ValueError(f"Unknown probe kind: {kind}")
+
+
+def pack_samples(samples, index_of):
+    """Pack ``(target, index, sample)`` tuples into one bytes frame"""
+    frame = bytearray(RECORD.size * len(samples))
+    for n, (target, index, sample) in enumerate(samples):
+        rtt = sample.rtt_ms if sample is not None else None
+        source = sample.source if sample is not None else timing.SOURCE_MONOTONIC
+        RECORD.pack_into(
+            frame, n * RECORD.size,
+            index_of[target], index,
+            math.nan if rtt is None else rtt,
+            SOURCE_CODES.get(source, 0)
+        )
+    return bytes(frame)
+
+
+def unpack_samples(frame):
+    """``(target_index, index, RttSample)`` tuples from a packed frame"""
+    for target_index, index, rtt, source in RECORD.iter_unpack(frame):
+        yield target_index, index, timing.RttSample(None if rtt != rtt else rtt, SOURCE_NAMES.get(source, timing.SOURCE_MONOTONIC))
+
+
+def _shard_main(conn, probe_args, targets, positions, num_pings, engine_args, batch_interval, cancel):
+    """Worker process: probe one shard and stream packed frames back.
+
+    ``positions[i]`` is the index of ``targets[i]`` in the parent's target
+    list, which is what goes on the wire. An empty frame marks a clean
+    finish; the parent treats EOF without one as a crashed worker.
+    """
+    index_of = dict(zip(targets, positions))
+    try:
+        engine = ProbeEngine(open_probe(*probe_args), **engine_args)
+
+        def on_batch(samples, done, total):
+            conn.send_bytes(pack_samples(samples, index_of))
+
+        engine.run(targets, num_pings, on_batch=on_batch, batch_interval=batch_interval, cancel=cancel)
+        conn.send_bytes(b"")
+    except (BrokenPipeError, KeyboardInterrupt):
+        pass
+    finally:
+        conn.close()
+
+
+class ShardedProbeEngine:
+    """ProbeEngine that spreads the targets over several worker processes.
+
+    One CPython process tops out at one core for packet building and
+    per-sample bookkeeping. Here the target list is dealt round-robin over
+    ``processes`` workers, each running its own ``ProbeEngine`` with its own
+    prober (``open_probe(*probe_args)``, so its own socket). Workers send
+    samples back over a pipe as packed ``RECORD`` structs, one frame per
+    batch, and the parent calls ``on_progress`` / ``on_batch`` from the
+    calling thread exactly like ``ProbeEngine.run``.
+
+    ``max_concurrency`` is the total across all workers.
+    """
+
+    def __init__(self, probe_args, processes=2, max_concurrency=64, interval=0.1, timeout=2, start_method=None):
+        if processes < 1:
+            raise ValueError("processes must be at least 1")
+        self.probe_args = tuple(probe_args)
+        self.processes = processes
+        self.max_concurrency = max_concurrency
+        self.interval = interval
+        self.timeout = timeout
+        self.context = multiprocessing.get_context(start_method)
+
+    def run(self, targets, num_pings, on_progress=None, on_batch=None, batch_interval=0.25, cancel=None):
+        """Same contract as ``ProbeEngine.run``"""
+        targets = list(dict.fromkeys(targets))
+        results = {target: [None] * num_pings for target in targets}
+        total = len(targets) * num_pings
+        if total == 0:
+            return results
+
+        processes = min(self.processes, len(targets))
+        per_shard = max(1, -(-self.max_concurrency // processes))
+        engine_args = {"max_concurrency": per_shard, "interval": self.interval, "timeout": self.timeout}
+        shard_cancel = self.context.Event()
+        received = dict.fromkeys(targets, 0)
+
+        workers = {}  # parent end of the pipe -> Process
+        for shard in range(processes):
+            positions = list(range(shard, len(targets), processes))
+            reader, writer = self.context.Pipe(duplex=False)
+            process = self.context.Process(
+                target=_shard_main,
+                args=(writer, self.probe_args, [targets[i] for i in positions], positions,
+                      num_pings, engine_args, batch_interval, shard_cancel),
+                name=f"probe-shard-{shard}",
+                daemon=True
+            )
+            process.start()
+            writer.close()  # only the child writes; lets us see EOF if it dies
+            workers[reader] = process
+
+        pending = []
+        next_flush = time.monotonic() + batch_interval
+        done = 0
+        failed = []
+        try:
+            while workers:
+                if cancel is not None and cancel.is_set():
+                    shard_cancel.set()
+                for conn in wait(list(workers), timeout=0.5):
+                    try:
+                        frame = conn.recv_bytes()
+                    except EOFError:
+                        frame = None
+                    if not frame:
+                        process = workers.pop(conn)
+                        conn.close()
+                        process.join()
+                        if frame is None:
+                            failed.append(process.name)
+                        continue
+                    for target_index, index, sample in unpack_samples(frame):
+                        target = targets[target_index]
+                        results[target][index] = sample
+                        received[target] = max(received[target], index + 1)
+                        done += 1
+                        if on_progress:
+                            on_progress(target, index, done, total)
+                        if on_batch:
+                            pending.append((target, index, sample))
+                if on_batch and pending and (done == total or time.monotonic() >= next_flush):
+                    on_batch(pending, done, total)
+                    pending = []
+                    next_flush = time.monotonic() + batch_interval
+            if on_batch and pending:
+                on_batch(pending, done, total)
+        finally:
+            shard_cancel.set()
+            for conn, process in workers.items():
+                conn.close()
+                process.join(timeout=self.timeout + 1)
+                if process.is_alive():
+                    process.terminate()
+
+        if failed:
+            raise RuntimeError(f"Probe worker(s) exited early: {', '.join(failed)}")
+        if cancel is not None and cancel.is_set():
+            for target in targets:
+                del results[target][received[target]:]
+        return results
@@ -0,0 +1,130 @@
+import math
+
+
+class DDSketch:
+    """Mergeable quantile sketch with a relative-error guarantee (DDSketch).
+
+    Values are counted in logarithmic bins of ratio ``gamma``, so any
+    quantile is returned within ``relative_accuracy`` of the true value
+    (1% by default) no matter how many samples were added. Two sketches with
+    the same accuracy merge exactly by adding bin counts, which makes them
+    cheap to combine across time buckets, targets and measuring nodes.
+    Memory is bounded by ``max_bins``: past that the lowest bins are folded
+    together, which only costs accuracy at the low end, never in the tail
+    percentiles we care about for latency.
+    """
+
+    __slots__ = ('relative_accuracy', 'gamma', '_log_gamma', 'max_bins', 'bins',
+                 'zero_count', 'count', 'sum', 'min', 'max')
+
+    # Anything at or below this is counted as zero (sub-nanosecond RTTs)
+    MIN_VALUE = 1e-6
+
+    def __init__(self, relative_accuracy=0.01, max_bins=2048):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.max_bins = max_bins
+        self.bins = {}
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def __len__(self):
+        return self.count
+
+    def add(self, value, weight=1):
+        if value <= self.MIN_VALUE:
+            self.zero_count += weight
+        else:
+            index = math.ceil(math.log(value) / self._log_gamma)
+            self.bins[index] = self.bins.get(index, 0) + weight
+            if len(self.bins) > self.max_bins:
+                self._collapse()
+        self.count += weight
+        self.sum += value * weight
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def update(self, values):
+        for value in values:
+            if value is not None:
+                self.add(value)
+        return self
+
+    def _collapse(self):
+        indexes = sorted(self.bins)
+        excess = indexes[:len(indexes) - self.max_bins + 1]
+        folded = sum(self.bins.pop(index) for index in excess)
+        keep = indexes[len(excess)]
+        self.bins[keep] = self.bins.get(keep, 0) + folded
+
+    def merge(self, other):
+        """Add other's counts into this sketch (accuracies must match)"""
+        if other.gamma != self.gamma:
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+        for index, count in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + count
+        if len(self.bins) > self.max_bins:
+            self._collapse()
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def quantile(self, q):
+        """Estimated q-quantile (0 <= q <= 1), or None if empty"""
+        if self.count == 0:
+            return None
+        if q <= 0:
+            return self.min
+        if q >= 1:
+            return self.max
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if seen > rank:
+            return max(self.min, 0.0)
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if seen > rank:
+                value = 2 * self.gamma ** index / (self.gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def percentiles(self, *qs):
+        """``{"p50": ..., "p95": ...}`` for percentile numbers like 50, 95"""
+        return {f"p{q:g}": self.quantile(q / 100) for q in qs}
+
+    @property
+    def avg(self):
+        return self.sum / self.count if self.count else None
+
+    def to_dict(self):
+        """JSON-friendly form (used for storage and for shipping between nodes)"""
+        indexes = sorted(self.bins)
+        return {
+            "alpha": self.relative_accuracy,
+            "indexes": indexes,
+            "counts": [self.bins[index] for index in indexes],
+            "zero": self.zero_count,
+            "count": self.count,
+            "sum": self.sum,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None
+        }
+
+    @classmethod
+    def from_dict(cls, data, max_bins=2048):
+        sketch = cls(relative_accuracy=data["alpha"], max_bins=max_bins)
+        sketch.bins = dict(zip(data["indexes"], data["counts"]))
+        sketch.zero_count = data["zero"]
+        sketch.count = data["count"]
+        sketch.sum = data["sum"]
+        if data["count"]:
+            sketch.min = data["min"]
+            sketch.max = data["max"]
+        return sketch
@@ -0,0 +1,55 @@
+import threading
+
+
+class StateStore:
+    """A dict shared between threads, updated copy-on-write.
+
+    Writers build a new dict under a lock and publish it with a single
+    assignment; readers take ``snapshot()`` (a plain attribute read, no lock)
+    and get a dict that is never modified afterwards, so they can iterate it
+    or serialize it while writers keep going. Values stored here must be
+    treated as immutable too: replace an entry instead of changing it.
+    """
+
+    def __init__(self, initial=None):
+        self._lock = threading.Lock()
+        self._data = dict(initial or {})
+        self._version = 0
+
+    def snapshot(self):
+        """The current dict; do not modify it"""
+        return self._data
+
+    def get(self, key, default=None):
+        return self._data.get(key, default)
+
+    @property
+    def version(self):
+        """Incremented on every write"""
+        return self._version
+
+    def replace(self, data):
+        with self._lock:
+            self._data = dict(data)
+            self._version += 1
+
+    def update(self, changes):
+        """Set several keys at once (one new snapshot)"""
+        with self._lock:
+            data = dict(self._data)
+            data.update(changes)
+            self._data = data
+            self._version += 1
+
+    def pop(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            data = dict(self._data)
+            value = data.pop(key)
+            self._data = data
+            self._version += 1
+            return value
+
+    def clear(self):
+        self.replace({})
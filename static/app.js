@@ -2,7 +2,9 @@
 const socket = io();
 
 let latencyChart = null;
+let trendChart = null;
 let currentData = {};
+let currentJobId = null;
 
 // Initialize Chart
 function initChart() {
@@ -62,6 +64,10 @@ function startMeasurement() {
     document.getElementById('progressBar').textContent = '0%';
     document.getElementById('progressStatus').textContent = 'Initializing...';
     
+    // Start a fresh chart; samples are appended as they stream in
+    currentData = {};
+    resetChart();
+    
     // Disable button
     const btn = event.target;
     btn.disabled = true;
@@ -74,7 +80,19 @@ function startMeasurement() {
     });
 }
 
+// Cancel the running measurement job
+function cancelMeasurement() {
+    if (currentJobId) {
+        socket.emit('cancel_measurement', { job_id: currentJobId });
+        document.getElementById('progressStatus').textContent = 'Cancelling...';
+    }
+}
+
 // Socket.IO event handlers
+socket.on('job_started', function(data) {
+    currentJobId = data.job_id;
+});
+
 socket.on('progress', function(data) {
     document.getElementById('progressStatus').textContent = data.status;
     const progress = Math.round(data.progress);
@@ -82,8 +100,21 @@ socket.on('progress', function(data) {
     document.getElementById('progressBar').textContent = progress + '%';
 });
 
+// Batches of samples streamed while a measurement runs
+socket.on('measurement_samples', function(data) {
+    currentJobId = data.job_id;
+    document.getElementById('progressStatus').textContent = data.status;
+    const progress = Math.round(data.progress);
+    document.getElementById('progressBar').style.width = progress + '%';
+    document.getElementById('progressBar').textContent = progress + '%';
+    
+    updateChart(data.samples);
+});
+
+// Final statistics (the samples themselves were already streamed)
 socket.on('measurement_complete', function(data) {
     currentData = data.data;
+    currentJobId = null;
     
     // Hide progress bar
     document.getElementById('progressContainer').style.display = 'none';
@@ -98,14 +129,18 @@ socket.on('measurement_complete', function(data) {
         return;
     }
     
+    if (data.status === 'cancelled') {
+        updateResultsTable(data.data);
+        showAlert(data.message || 'Measurement cancelled', 'info');
+        return;
+    }
+    
     // Update results table
     updateResultsTable(data.data);
     
-    // Update chart
-    updateChart(data.data);
-    
     // Refresh history
     loadHistoricalData();
+    scheduleMapRefresh();
     
     // Check if all pings failed (might be permission issue)
     let allFailed = true;
@@ -123,6 +158,15 @@ socket.on('measurement_complete', function(data) {
     }
 });
 
+// Samples pushed by the background monitor
+socket.on('monitor_samples', function(data) {
+    for (const [ip, stats] of Object.entries(data.stats)) {
+        currentData[ip] = Object.assign(currentData[ip] || {}, stats);
+    }
+    updateResultsTable(currentData);
+    scheduleMapRefresh();
+});
+
 // Update results table
 function updateResultsTable(data) {
     const tbody = document.getElementById('resultsTable');
@@ -177,41 +221,53 @@ function updateResultsTable(data) {
     }
 }
 
-// Update chart
-function updateChart(data) {
-    const colors = [
-        'rgba(255, 99, 132, 1)',
-        'rgba(54, 162, 235, 1)',
-        'rgba(255, 206, 86, 1)',
-        'rgba(75, 192, 192, 1)',
-        'rgba(153, 102, 255, 1)',
-        'rgba(255, 159, 64, 1)'
-    ];
-    
-    const datasets = [];
-    let maxLength = 0;
+// Chart colors, one per target
+const chartColors = [
+    'rgba(255, 99, 132, 1)',
+    'rgba(54, 162, 235, 1)',
+    'rgba(255, 206, 86, 1)',
+    'rgba(75, 192, 192, 1)',
+    'rgba(153, 102, 255, 1)',
+    'rgba(255, 159, 64, 1)'
+];
+
+// Empty the latency chart
+function resetChart() {
+    latencyChart.data.labels = [];
+    latencyChart.data.datasets = [];
+    latencyChart.update();
+}
+
+// Append streamed [ip, index, latency] samples to the chart
+function updateChart(samples) {
+    const datasets = latencyChart.data.datasets;
+    const labels = latencyChart.data.labels;
     
-    let colorIndex = 0;
-    for (const [ip, stats] of Object.entries(data)) {
-        const validLatencies = stats.latencies.map(l => l !== null ? l : 0);
-        maxLength = Math.max(maxLength, validLatencies.length);
+    for (const [ip, index, latency] of samples) {
+        let dataset = datasets.find(d => d.label === ip);
+        if (!dataset) {
+            const color = chartColors[datasets.length % chartColors.length];
+            dataset = {
+                label: ip,
+                data: [],
+                borderColor: color,
+                backgroundColor: color.replace('1)', '0.1)'),
+                tension: 0.1,
+                borderWidth: 2,
+                pointRadius: 4,
+                pointHoverRadius: 6
+            };
+            datasets.push(dataset);
+        }
+        dataset.data[index] = latency !== null ? latency : 0;
         
-        datasets.push({
-            label: ip,
-            data: validLatencies,
-            borderColor: colors[colorIndex % colors.length],
-            backgroundColor: colors[colorIndex % colors.length].replace('1)', '0.1)'),
-            tension: 0.1,
-            borderWidth: 2,
-            pointRadius: 4,
-            pointHoverRadius: 6
-        });
-        colorIndex++;
+        while (labels.length <= index) {
+            labels.push(labels.length + 1);
+        }
     }
     
-    latencyChart.data.labels = Array.from({length: maxLength}, (_, i) => i + 1);
-    latencyChart.data.datasets = datasets;
-    latencyChart.update();
+    // Skip the animation so frequent batches stay cheap
+    latencyChart.update('none');
 }
 
 // Clear data
@@ -228,9 +284,7 @@ function clearData() {
                     </tr>
                 `;
                 
-                latencyChart.data.labels = [];
-                latencyChart.data.datasets = [];
-                latencyChart.update();
+                resetChart();
                 
                 showAlert(data.message, 'success');
             });
@@ -242,15 +296,27 @@ function exportData(format) {
     window.location.href = `/export_data/${format}`;
 }
 
-// Load historical data
-function loadHistoricalData() {
-    fetch('/get_historical_data')
+// Load historical data (newest first, one page at a time)
+function loadHistoricalData(cursor) {
+    const params = new URLSearchParams({ summary: 1, limit: 50 });
+    if (cursor) {
+        params.set('cursor', cursor);
+    }
+    
+    fetch(`/get_historical_data?${params}`)
         .then(response => response.json())
-        .then(data => {
+        .then(page => {
             const tbody = document.getElementById('historyTable');
-            tbody.innerHTML = '';
+            if (!cursor) {
+                tbody.innerHTML = '';
+            }
+            
+            const moreRow = document.getElementById('historyMoreRow');
+            if (moreRow) {
+                moreRow.remove();
+            }
             
-            if (data.length === 0) {
+            if (!cursor && page.runs.length === 0) {
                 tbody.innerHTML = `
                     <tr>
                         <td colspan="5" class="text-center text-muted">
@@ -261,7 +327,7 @@ function loadHistoricalData() {
                 return;
             }
             
-            data.forEach((entry, index) => {
+            page.runs.forEach(entry => {
                 const row = tbody.insertRow();
                 const ips = Object.keys(entry.data).join(', ');
                 
@@ -277,21 +343,33 @@ function loadHistoricalData() {
                     <td>${overallAvg.toFixed(2)} ms</td>
                     <td>${overallLoss.toFixed(1)}%</td>
                     <td>
-                        <button class="btn btn-sm btn-info" onclick="viewHistoricalDetails(${index})">
+                        <button class="btn btn-sm btn-info" onclick="viewHistoricalDetails(${entry.id})">
                             <i class="bi bi-eye"></i> View
                         </button>
                     </td>
                 `;
             });
+            
+            if (page.next_cursor) {
+                const row = tbody.insertRow();
+                row.id = 'historyMoreRow';
+                row.innerHTML = `
+                    <td colspan="5" class="text-center">
+                        <button class="btn btn-sm btn-outline-secondary" onclick="loadHistoricalData(${page.next_cursor})">
+                            Load older entries
+                        </button>
+                    </td>
+                `;
+            }
         });
 }
 
 // View historical details
-function viewHistoricalDetails(index) {
-    fetch('/get_historical_data')
+function viewHistoricalDetails(id) {
+    fetch(`/get_historical_data/${id}?summary=1`)
         .then(response => response.json())
         .then(data => {
-            const entry = data[index];
+            const entry = data.run;
             let details = `<h5>Details for ${entry.timestamp}</h5>`;
             details += '<table class="table table-sm"><thead><tr><th>IP</th><th>Avg</th><th>Min</th><th>Max</th><th>Loss</th></tr></thead><tbody>';
             
@@ -312,6 +390,59 @@ function viewHistoricalDetails(index) {
         });
 }
 
+// Load a long-range latency trend (server picks raw samples or a rollup tier)
+function loadTrend() {
+    const target = document.getElementById('trendTarget').value.trim();
+    if (!target) {
+        showAlert('Please enter an IP address', 'warning');
+        return;
+    }
+    
+    const canvas = document.getElementById('trendChart');
+    const to = Date.now() / 1000;
+    const params = new URLSearchParams({
+        target: target,
+        from: to - parseInt(document.getElementById('trendRange').value),
+        to: to,
+        width: Math.max(canvas.clientWidth, 100)
+    });
+    
+    fetch(`/get_series?${params}`)
+        .then(response => response.json())
+        .then(series => {
+            if (series.status !== 'success') {
+                showAlert(series.message, 'warning');
+                return;
+            }
+            
+            const labels = series.points.map(p => new Date(p.t * 1000).toLocaleString());
+            const datasets = [
+                { label: 'avg', data: series.points.map(p => p.avg), borderColor: 'rgba(54, 162, 235, 1)' },
+                { label: 'p95', data: series.points.map(p => p.p95), borderColor: 'rgba(255, 159, 64, 1)' },
+                { label: 'max', data: series.points.map(p => p.max), borderColor: 'rgba(255, 99, 132, 0.5)' }
+            ].map(d => Object.assign(d, { borderWidth: 1, pointRadius: 0, spanGaps: false }));
+            
+            if (!trendChart) {
+                trendChart = new Chart(canvas.getContext('2d'), {
+                    type: 'line',
+                    data: { labels: [], datasets: [] },
+                    options: {
+                        animation: false,
+                        plugins: { title: { display: true, text: 'Latency Trend' } },
+                        scales: {
+                            y: { beginAtZero: true, title: { display: true, text: 'Latency (ms)' } },
+                            x: { ticks: { maxTicksLimit: 8 } }
+                        }
+                    }
+                });
+            }
+            trendChart.options.plugins.title.text = `Latency Trend for ${target} (${series.tier})`;
+            trendChart.data.labels = labels;
+            trendChart.data.datasets = datasets;
+            trendChart.update();
+        });
+}
+
 // Clear history
 function clearHistory() {
     if (confirm('Are you sure you want to clear all historical data?')) {
@@ -330,23 +461,124 @@ function exportHistory(format) {
 }
 
 // Generate map
-function generateMap() {
-    fetch('/generate_map')
+//
+// Client-side map: markers are kept between updates and only the ones
+// whose data changed are touched
+let latencyMap = null;
+let markerLayer = null;
+let heatLayer = null;
+let mapMarkers = {};
+let mapKey = null;
+let mapRefreshTimer = null;
+
+const markerColors = { green: '#28a745', orange: '#fd7e14', red: '#dc3545' };
+
+function escapeHtml(text) {
+    const div = document.createElement('div');
+    div.textContent = text == null ? '' : String(text);
+    return div.innerHTML;
+}
+
+function initLatencyMap() {
+    const container = document.getElementById('mapContainer');
+    container.innerHTML = '';
+    latencyMap = L.map(container).setView([20, 0], 2);
+    L.tileLayer('https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png', {
+        attribution: '&copy; OpenStreetMap contributors'
+    }).addTo(latencyMap);
+    markerLayer = L.layerGroup().addTo(latencyMap);
+    heatLayer = L.heatLayer([], { radius: 25, blur: 35, maxZoom: 13 }).addTo(latencyMap);
+}
+
+function markerPopup(m) {
+    return `
+        <b>${escapeHtml(m.name)}</b><br>
+        ${m.hostname ? escapeHtml(m.hostname) + '<br>' : ''}
+        IP: ${escapeHtml(m.ip)}<br>
+        Avg Latency: ${m.avg.toFixed(2)} ms<br>
+        Min: ${m.min.toFixed(2)} ms<br>
+        Max: ${m.max.toFixed(2)} ms<br>
+        Packet Loss: ${m.packet_loss.toFixed(1)}%
+    `;
+}
+
+function applyMapData(data) {
+    if (data.full) {
+        markerLayer.clearLayers();
+        mapMarkers = {};
+    }
+    for (const ip of data.removed) {
+        if (mapMarkers[ip]) {
+            markerLayer.removeLayer(mapMarkers[ip]);
+            delete mapMarkers[ip];
+        }
+    }
+    for (const m of data.markers) {
+        const style = { color: markerColors[m.color], fillColor: markerColors[m.color], fillOpacity: 0.8, radius: 8 };
+        let marker = mapMarkers[m.ip];
+        if (marker) {
+            marker.setLatLng([m.lat, m.lon]).setStyle(style);
+        } else {
+            marker = mapMarkers[m.ip] = L.circleMarker([m.lat, m.lon], style).addTo(markerLayer);
+        }
+        marker.bindPopup(markerPopup(m), { maxWidth: 250 });
+        marker.bindTooltip(`${m.ip} - ${m.avg.toFixed(2)} ms`);
+    }
+    heatLayer.setLatLngs(data.heat);
+}
+
+// Fetch what changed since the last update and apply it
+function refreshMap(notify) {
+    const url = mapKey ? `/map_data?since=${encodeURIComponent(mapKey)}` : '/map_data';
+    return fetch(url)
         .then(response => response.json())
         .then(data => {
-            if (data.status === 'success') {
-                document.getElementById('mapContainer').innerHTML = 
-                    `<iframe src="${data.map_url}" class="w-100 h-100" frameborder="0"></iframe>`;
-                showAlert(data.message, 'success');
-            } else {
-                showAlert(data.message, 'warning');
+            if (data.status !== 'success') {
+                if (notify) {
+                    showAlert(data.message, 'warning');
+                }
+                return;
+            }
+            if (!latencyMap) {
+                initLatencyMap();
+            }
+            if (!data.unchanged) {
+                applyMapData(data);
+            }
+            mapKey = data.key;
+            latencyMap.invalidateSize();
+            if (notify) {
+                showAlert('Map updated', 'success');
             }
         })
         .catch(error => {
-            showAlert('Error generating map: ' + error, 'danger');
+            if (notify) {
+                showAlert('Error generating map: ' + error, 'danger');
+            }
         });
 }
 
+// Refresh an open map soon, at most once per interval
+function scheduleMapRefresh() {
+    if (!latencyMap || mapRefreshTimer) {
+        return;
+    }
+    mapRefreshTimer = setTimeout(() => {
+        mapRefreshTimer = null;
+        refreshMap(false);
+    }, 2000);
+}
+
+function generateMap() {
+    refreshMap(true);
+}
+
+document.addEventListener('shown.bs.tab', function(event) {
+    if (latencyMap && event.target.getAttribute('href') === '#map') {
+        latencyMap.invalidateSize();
+    }
+});
+
 // Load and save settings
 function loadSettings() {
     fetch('/get_settings')
@@ -0,0 +1,128 @@
+import asyncio
+import ipaddress
+import socket
+import threading
+
+import timing
+
+
+async def tcp_connect_rtt(host, port, timeout=2):
+    """Time one non-blocking TCP connect to (host, port); RTT in ms or None
+
+    The kernel does not timestamp the SYN-ACK for us, so this is always a
+    perf_counter_ns measurement (timestamp source "monotonic").
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        ipaddress.ip_address(host)
+        family, addr = (socket.AF_INET6 if ':' in host else socket.AF_INET), host
+    except ValueError:
+        try:
+            infos = await loop.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        except OSError:
+            return None
+        family, addr = infos[0][0], infos[0][4][0]
+
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setblocking(False)
+    try:
+        start = timing.now_ns()
+        await asyncio.wait_for(loop.sock_connect(sock, (addr, port)), timeout)
+        return timing.elapsed_ms(start)
+    except (OSError, asyncio.TimeoutError):
+        return None
+    finally:
+        sock.close()
+
+
+async def tcp_ping_async(host, ports=(80, 443), timeout=2):
+    """Race a connect to every port and return the first successful RTT"""
+    tasks = [asyncio.ensure_future(tcp_connect_rtt(host, port, timeout)) for port in ports]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            rtt = await next_done
+            if rtt is not None:
+                return rtt
+        return None
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+class TcpProber:
+    """TCP-connect prober that schedules every probe on one event loop.
+
+    The loop runs in a daemon thread, so synchronous callers (Flask routes,
+    ``ProbeEngine`` workers) can share it. ``max_in_flight`` bounds the
+    number of sockets open at once to stay under the process fd limit.
+    """
+
+    def __init__(self, ports=(80, 443), timeout=2, max_in_flight=1000):
+        self.ports = tuple(ports)
+        self.timeout = timeout
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="tcp-prober", daemon=True)
+        self._thread.start()
+        self._limit = self._call(self._make_semaphore(max_in_flight))
+
+    @staticmethod
+    async def _make_semaphore(value):
+        return asyncio.Semaphore(value)
+
+    def _call(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def close(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=1)
+        self.loop.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    async def probe(self, host, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        async with self._limit:
+            return await tcp_ping_async(host, self.ports, timeout)
+
+    async def probe_many(self, hosts, timeout=None):
+        hosts = list(dict.fromkeys(hosts))
+        rtts = await asyncio.gather(*(self.probe(host, timeout) for host in hosts))
+        return dict(zip(hosts, rtts))
+
+    async def scan(self, host, ports, timeout=None, on_result=None):
+        """Try every port at once and return the sorted list of open ones.
+
+        ``on_result(port, is_open)`` is called (on the loop thread) as each
+        check finishes, so callers can stream results.
+        """
+        timeout = self.timeout if timeout is None else timeout
+
+        async def check(port):
+            async with self._limit:
+                rtt = await tcp_connect_rtt(host, port, timeout)
+            if on_result:
+                on_result(port, rtt is not None)
+            return port, rtt
+
+        results = await asyncio.gather(*(check(port) for port in dict.fromkeys(ports)))
+        return sorted(port for port, rtt in results if rtt is not None)
+
+    def start_scan(self, host, ports, timeout=None, on_result=None):
+        """Schedule ``scan`` without waiting; returns a concurrent Future"""
+        return asyncio.run_coroutine_threadsafe(self.scan(host, ports, timeout, on_result), self.loop)
+
+    def ping_sample(self, host, timeout=None):
+        """Probe host once and return an RttSample"""
+        return timing.RttSample(self.ping(host, timeout), timing.SOURCE_MONOTONIC)
+
+    def ping(self, host, timeout=None):
+        """Probe host once and return the RTT in ms, or None if no port answered"""
+        return self._call(self.probe(host, timeout))
+
+    def ping_many(self, hosts, timeout=None):
+        """Probe every host concurrently; returns ``{host: rtt_ms_or_None}``"""
+        return self._call(self.probe_many(hosts, timeout))
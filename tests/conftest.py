@@ -0,0 +1,21 @@
+import importlib
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(scope="session")
+def app_module(tmp_path_factory):
+    """The app imported with its settings and history in a scratch directory"""
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("app"))
+    try:
+        yield importlib.import_module("app")
+    finally:
+        os.chdir(cwd)
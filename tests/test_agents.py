@@ -0,0 +1,147 @@
+"""Several agents on localhost reporting to the collector over real HTTP.
+
+The collector is the Flask app behind a werkzeug server on an ephemeral
+port; agents probe with a stub, so only the upload path is exercised.
+"""
+import socket
+import threading
+import time
+
+import pytest
+from werkzeug.serving import make_server
+
+import timing
+from agent import Agent, Spool, Uploader, encode_frame
+
+TARGETS = ["192.0.2.10", "192.0.2.11"]
+
+
+class Collector:
+    """The app served on one port, which can be taken down and brought back"""
+
+    def __init__(self, app):
+        self.app = app
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            self.port = s.getsockname()[1]
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.server = None
+
+    def start(self):
+        self.server = make_server("127.0.0.1", self.port, self.app, threaded=True)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+@pytest.fixture
+def collector(app_module):
+    app_module.settings.update({"collector_token": ""})
+    collector = Collector(app_module.app)
+    collector.start()
+    yield collector
+    collector.stop()
+
+
+def stub_probe(delay_ms):
+    def probe(target, timeout):
+        return timing.RttSample(delay_ms, timing.SOURCE_MONOTONIC)
+    return probe
+
+
+def start_agent(collector, agent_id, tmp_path, protocol):
+    """An agent probing TARGETS quickly; ``agent.rows`` counts the rows it produced"""
+    uploader = Uploader(collector.url, agent_id, Spool(str(tmp_path / agent_id)), frame_interval=0.1,
+                        timeout=2, max_backoff=0.5)
+    agent = Agent(TARGETS, uploader, interval=0.05, probe=stub_probe(5.0), protocol=protocol)
+    agent.monitor.flush_interval = 0.1
+    agent.rows = 0
+    add = uploader.add
+
+    def counting_add(rows):
+        agent.rows += len(rows)
+        add(rows)
+    uploader.add = counting_add
+    agent.start()
+    return agent
+
+
+def wait_for(condition, timeout=15):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out")
+        time.sleep(0.05)
+
+
+def drain(agent):
+    """Stop probing and wait until every frame has been delivered"""
+    agent.monitor.stop()
+    uploader = agent.uploader
+    wait_for(lambda: not uploader._rows and not uploader._pending and len(uploader.spool) == 0)
+    uploader.stop()
+
+
+def stored(app, agent_id):
+    return sum(len(list(app.history.iter_samples(f"{target}@{agent_id}"))) for target in TARGETS)
+
+
+def test_two_agents_are_tagged_by_vantage_point(app_module, collector, tmp_path):
+    agents = [start_agent(collector, "vp-a", tmp_path, "ICMP"), start_agent(collector, "vp-b", tmp_path, "TCP")]
+    time.sleep(1)
+    for agent in agents:
+        drain(agent)
+
+    body = app_module.app.test_client().get("/collector/vantage_points").json
+    for agent, protocol in zip(agents, ("ICMP", "TCP")):
+        agent_id = agent.uploader.agent_id
+        assert agent.rows > 0 and agent.uploader.sent > 0
+        assert stored(app_module, agent_id) == agent.rows
+        assert body["agents"][agent_id]["frames"] == agent.uploader.sent
+        assert set(body["data"][agent_id]) == set(TARGETS)
+        assert all(stats["protocol"] == protocol for stats in body["data"][agent_id].values())
+        assert all(stats["avg"] == pytest.approx(5.0) for stats in body["data"][agent_id].values())
+
+
+def test_repeated_frame_is_merged_once(app_module, collector):
+    client = app_module.app.test_client()
+    frame = encode_frame("vp-dup", "session-1", [(TARGETS[0], time.time(), 7.0, "monotonic")], "ICMP")
+    first = client.post("/collector/frames", data=frame).json
+    again = client.post("/collector/frames", data=frame).json
+    assert (first["accepted"], first["duplicate"]) == (1, False)
+    assert (again["accepted"], again["duplicate"]) == (0, True)
+    assert stored(app_module, "vp-dup") == 1
+    assert client.get("/collector/vantage_points?agent=vp-dup").json["agents"]["vp-dup"]["frames"] == 1
+
+
+def test_busy_collector_makes_agents_back_off_and_retry(app_module, collector, tmp_path):
+    slots = app_module.settings.get("collector_concurrency", 4)
+    for _ in range(slots):
+        app_module.collector_slots.acquire()
+    try:
+        agent = start_agent(collector, "vp-busy", tmp_path, "ICMP")
+        # Every post gets 503 + Retry-After, so frames wait in the spool
+        wait_for(lambda: agent.uploader.spooled >= 2)
+        assert agent.uploader.sent == 0
+    finally:
+        for _ in range(slots):
+            app_module.collector_slots.release()
+    drain(agent)
+    assert agent.uploader.sent > 0
+    assert stored(app_module, "vp-busy") == agent.rows
+
+
+def test_spooled_frames_are_replayed_after_an_outage(app_module, collector, tmp_path):
+    collector.stop()
+    agents = [start_agent(collector, "vp-out-a", tmp_path, "ICMP"), start_agent(collector, "vp-out-b", tmp_path, "ICMP")]
+    wait_for(lambda: all(len(agent.uploader.spool) >= 3 for agent in agents))
+    assert all(agent.uploader.sent == 0 for agent in agents)
+
+    collector.start()
+    for agent in agents:
+        drain(agent)
+        assert stored(app_module, agent.uploader.agent_id) == agent.rows
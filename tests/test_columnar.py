@@ -0,0 +1,55 @@
+"""Arrow/Parquet round trips through columnar.import_into."""
+import io
+
+import pytest
+
+pytest.importorskip("pyarrow")
+
+import columnar
+from history_store import HistoryStore
+
+
+def exported(history, table, format="parquet"):
+    if table == "runs":
+        batches, schema = columnar.run_batches(history.iter_runs()), columnar.runs_schema()
+    else:
+        batches, schema = columnar.sample_batches(history.iter_samples(None, None, None, with_run_id=True)), columnar.samples_schema()
+    buffer = io.BytesIO()
+    for chunk in columnar.iter_encoded(batches, schema, format):
+        buffer.write(chunk)
+    buffer.seek(0)
+    return buffer
+
+
+@pytest.fixture
+def source(tmp_path):
+    history = HistoryStore(str(tmp_path / "source"))
+    for i in range(3):
+        history.add_run({
+            "1.1.1.1": {"avg": 10.0, "latencies": [10.0, None], "timestamp_sources": ["kernel", "monotonic"], "protocol": "ICMP"},
+            "8.8.8.8": {"avg": 20.0, "latencies": [20.0], "timestamp_sources": ["kernel"], "protocol": "ICMP"}
+        }, timestamp=1_700_000_000.25 + i)
+    history.add_samples([("9.9.9.9", 1_700_000_100.5 + i, float(i), "kernel") for i in range(1000)])
+    yield history
+    history.close()
+
+
+def test_runs_keep_their_exact_time(source, tmp_path):
+    target = HistoryStore(str(tmp_path / "target"))
+    columnar.import_into(target, exported(source, "runs"))
+    assert [run["ts"] for run in target.iter_runs()] == [run["ts"] for run in source.iter_runs()]
+
+
+@pytest.mark.parametrize("format", ["parquet", "arrow"])
+def test_importing_twice_adds_nothing(source, tmp_path, format):
+    target = HistoryStore(str(tmp_path / "target"))
+    runs, samples = exported(source, "runs", format), exported(source, "samples", format)
+    assert columnar.import_into(target, runs) == {"table": "runs", "runs": 3, "samples": 0, "skipped": 0}
+    assert columnar.import_into(target, samples) == {"table": "samples", "runs": 0, "samples": 1000, "skipped": 0}
+
+    runs.seek(0)
+    samples.seek(0)
+    assert columnar.import_into(target, runs) == {"table": "runs", "runs": 0, "samples": 0, "skipped": 6}
+    assert columnar.import_into(target, samples) == {"table": "samples", "runs": 0, "samples": 0, "skipped": 1000}
+    assert len(target.runs()) == 3
+    assert len(list(target.iter_samples("9.9.9.9", None, None))) == 1000
@@ -0,0 +1,113 @@
+"""GeocodeCache with a local stub geocoder in place of Nominatim."""
+import threading
+import time
+
+import pytest
+
+from geocode_cache import GeocodeCache
+
+PLACES = {
+    "dns.google": ("Mountain View", 37.4, -122.1),
+    "one.one.one.one": ("San Francisco", 37.8, -122.4)
+}
+
+
+class StubGeocoder:
+    """Answers from PLACES and counts calls; ``gate`` holds every call until set"""
+
+    def __init__(self, fail=False):
+        self.calls = []
+        self.fail = fail
+        self.gate = threading.Event()
+        self.gate.set()
+        self._lock = threading.Lock()
+
+    def __call__(self, query):
+        with self._lock:
+            self.calls.append(query)
+        self.gate.wait(5)
+        if self.fail:
+            raise TimeoutError("stub geocoder timed out")
+        return PLACES.get(query)
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "geocode_cache.sqlite3")
+
+
+def open_cache(path, geocode, **kwargs):
+    kwargs.setdefault("min_interval", 0)
+    return GeocodeCache(path, geocode, **kwargs)
+
+
+def test_hits_expire_after_ttl(path):
+    stub = StubGeocoder()
+    cache = open_cache(path, stub, ttl=0.3)
+    assert cache.locate("8.8.8.8", "dns.google") == PLACES["dns.google"]
+    assert cache.locate("8.8.8.8", "dns.google") == PLACES["dns.google"]
+    assert stub.calls == ["dns.google"]
+    time.sleep(0.4)
+    assert cache.locate("8.8.8.8", "dns.google") == PLACES["dns.google"]
+    assert stub.calls == ["dns.google"] * 2
+    cache.close()
+
+
+def test_misses_are_cached_for_negative_ttl(path):
+    stub = StubGeocoder()
+    cache = open_cache(path, stub, negative_ttl=0.3)
+    assert cache.locate("192.0.2.1", "nowhere.invalid") is None
+    assert cache.locate("192.0.2.1", "nowhere.invalid") is None
+    assert stub.calls == ["nowhere.invalid"]
+    time.sleep(0.4)
+    assert cache.locate("192.0.2.1", "nowhere.invalid") is None
+    assert len(stub.calls) == 2
+    cache.close()
+
+
+def test_errors_are_not_cached(path):
+    stub = StubGeocoder(fail=True)
+    cache = open_cache(path, stub)
+    assert cache.locate("8.8.8.8", "dns.google") is None
+    stub.fail = False
+    assert cache.locate("8.8.8.8", "dns.google") == PLACES["dns.google"]
+    assert len(stub.calls) == 2
+    cache.close()
+
+
+def test_concurrent_lookups_share_one_call(path):
+    stub = StubGeocoder()
+    stub.gate.clear()
+    cache = open_cache(path, stub, max_workers=8)
+    # Several IPs behind each hostname, asked for by two callers at once
+    targets = {f"10.0.0.{i}": "dns.google" for i in range(4)}
+    targets.update({f"10.0.1.{i}": "one.one.one.one" for i in range(4)})
+    results = []
+    callers = [threading.Thread(target=lambda: results.append(cache.locate_many(targets))) for _ in range(2)]
+    for caller in callers:
+        caller.start()
+    time.sleep(0.2)  # let every lookup reach the geocoder or wait on one in flight
+    stub.gate.set()
+    for caller in callers:
+        caller.join()
+
+    assert sorted(stub.calls) == ["dns.google", "one.one.one.one"]
+    for result in results:
+        assert result == {ip: PLACES[hostname] for ip, hostname in targets.items()}
+    cache.close()
+
+
+def test_answers_survive_reopening(path):
+    stub = StubGeocoder()
+    cache = open_cache(path, stub)
+    cache.locate_many({"8.8.8.8": "dns.google", "192.0.2.1": "nowhere.invalid"})
+    cache.close()
+
+    fresh = StubGeocoder()
+    reopened = open_cache(path, fresh)
+    # Found again by IP, by hostname alone, and the cached miss too
+    assert reopened.locate("8.8.8.8") == PLACES["dns.google"]
+    assert reopened.locate("8.8.4.4", "dns.google") == PLACES["dns.google"]
+    assert reopened.locate("192.0.2.1", "nowhere.invalid") is None
+    assert fresh.calls == []
+    reopened.close()
@@ -0,0 +1,119 @@
+"""IcmpProber: reply matching and error handling, with crafted packets and on loopback."""
+import socket
+import struct
+
+import pytest
+
+import timing
+from icmp_prober import (
+    ICMP_DEST_UNREACHABLE, ICMP_ECHO_REPLY, ICMP_TIME_EXCEEDED, IcmpProber, _Pending,
+    build_echo_request, icmp_checksum
+)
+
+ROUTER = "192.0.2.1"
+TARGET = "198.51.100.7"
+
+
+@pytest.fixture
+def prober():
+    try:
+        prober = IcmpProber(timeout=0.5)
+    except OSError as e:
+        pytest.skip(f"no ICMP socket here: {str(e)}")
+    yield prober
+    prober.close()
+
+
+def ip_header(src, dst, ttl=64):
+    return struct.pack("!BBHHHBBH4s4s", 0x45, 0, 0, 0, 0, ttl, socket.IPPROTO_ICMP, 0,
+                       socket.inet_aton(src), socket.inet_aton(dst))
+
+
+def icmp_error(icmp_type, identifier, seq):
+    """An ICMP error quoting the IP header and first 8 bytes of our echo request"""
+    quoted = ip_header("10.0.0.1", TARGET) + build_echo_request(identifier, seq)[:8]
+    header = struct.pack("!BBHI", icmp_type, 1, 0, 0)
+    checksum = icmp_checksum(header + quoted)
+    return struct.pack("!BBHI", icmp_type, 1, checksum, 0) + quoted
+
+
+def echo_reply(identifier, seq):
+    header = struct.pack("!BBHHH", ICMP_ECHO_REPLY, 0, 0, identifier, seq)
+    return struct.pack("!BBHHH", ICMP_ECHO_REPLY, 0, icmp_checksum(header), identifier, seq)
+
+
+def deliver(prober, packet, src):
+    """Feed a packet to the prober as its reader thread would"""
+    if prober.raw:
+        packet = ip_header(src, "10.0.0.1", ttl=250) + packet
+    prober._handle_packet(packet, (src, 0), timing.now_ns())
+
+
+def pending_probe(prober, seq, traceroute=False):
+    pending = _Pending(TARGET, traceroute=traceroute)
+    pending.sent = timing.SendStamp()
+    prober._pending[seq] = pending
+    return pending
+
+
+@pytest.mark.parametrize("icmp_type", [ICMP_DEST_UNREACHABLE, ICMP_TIME_EXCEEDED])
+def test_error_for_ordinary_ping_is_loss(prober, icmp_type):
+    pending = pending_probe(prober, 60001)
+    deliver(prober, icmp_error(icmp_type, prober.identifier, 60001), ROUTER)
+    assert pending.event.is_set()  # no need to wait out the timeout
+    assert prober._collect(60001) == timing.RttSample(None, timing.SOURCE_MONOTONIC)
+    assert pending.responder is None
+
+
+def test_time_exceeded_answers_traceroute_probe(prober):
+    pending = pending_probe(prober, 60002, traceroute=True)
+    deliver(prober, icmp_error(ICMP_TIME_EXCEEDED, prober.identifier, 60002), ROUTER)
+    sample = prober._collect(60002)
+    assert sample.rtt_ms is not None and sample.rtt_ms >= 0
+    assert pending.responder == ROUTER
+
+
+def test_echo_reply_must_come_from_the_destination(prober):
+    pending = pending_probe(prober, 60003)
+    deliver(prober, echo_reply(prober.identifier, 60003), ROUTER)
+    assert not pending.event.is_set()
+    deliver(prober, echo_reply(prober.identifier, 60003), TARGET)
+    assert prober._collect(60003).rtt_ms is not None
+
+
+# Loopback: every 127.0.0.0/8 address answers ICMP
+
+def loopback_targets(count):
+    return [f"127.{i // 62500}.{i // 250 % 250}.{i % 250 + 1}" for i in range(count)]
+
+
+def test_concurrent_pings_get_their_own_replies(prober):
+    other = IcmpProber(timeout=0.5)
+    try:
+        targets = loopback_targets(200)
+        # Two probers on one host see each other's replies on a raw socket;
+        # identifier and sequence keep them apart
+        mine, theirs = prober.ping_many(targets, timeout=2), other.ping_many(targets, timeout=2)
+    finally:
+        other.close()
+    assert all(sample.rtt_ms is not None for sample in mine.values())
+    assert all(sample.rtt_ms is not None for sample in theirs.values())
+    assert not prober._pending
+
+
+def test_timeout_is_loss(prober, monkeypatch):
+    # Drop every reply, so the echo goes out and nothing ever answers it
+    monkeypatch.setattr(prober, "_handle_packet", lambda *args: None)
+    start = timing.now_ns()
+    sample = prober.ping_sample("127.0.0.1", timeout=0.2)
+    assert timing.elapsed_ms(start) >= 200
+    assert sample == timing.RttSample(None, timing.SOURCE_MONOTONIC)
+    assert not prober._pending
+
+
+def test_large_batch_ping_many(prober):
+    targets = loopback_targets(5000)
+    results = prober.ping_many(targets, timeout=3)
+    assert set(results) == set(targets)
+    lost = [dst for dst, sample in results.items() if sample.rtt_ms is None]
+    assert not lost, f"{len(lost)} of {len(targets)} loopback echoes lost (rcvbuf {prober.rcvbuf})"
@@ -0,0 +1,44 @@
+"""Measurement jobs started over REST, probing through a stub engine."""
+import time
+
+import pytest
+
+import timing
+from probe_engine import ProbeEngine
+
+
+@pytest.fixture
+def stub_engine(app_module, monkeypatch):
+    def probe(ip, timeout):
+        return timing.RttSample(float(ip.rsplit(".", 1)[1]), timing.SOURCE_MONOTONIC)
+    monkeypatch.setattr(app_module, "make_engine", lambda num_targets: ProbeEngine(probe, interval=0, timeout=1))
+
+
+def wait_finished(client, job_id, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f"/jobs/{job_id}").json["job"]
+        if job["status"] not in ("queued", "running"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} still running")
+
+
+def test_jobs_merge_into_current_data(app_module, stub_engine):
+    app = app_module
+    client = app.app.test_client()
+    app.latency_data.replace(app.build_results({"203.0.113.9": app.SampleSeries.from_latencies([9.0])}))
+
+    first = client.post("/jobs", json={"ip_addresses": ["192.0.2.1", "192.0.2.2"], "num_pings": 2}).json["job_id"]
+    second = client.post("/jobs", json={"ip_addresses": ["192.0.2.3"], "num_pings": 2}).json["job_id"]
+    assert wait_finished(client, first)["status"] == "completed"
+    assert wait_finished(client, second)["status"] == "completed"
+
+    # Neither job wiped the other's targets or the monitored one
+    current = client.get("/get_current_data").json
+    assert set(current) == {"203.0.113.9", "192.0.2.1", "192.0.2.2", "192.0.2.3"}
+    assert current["192.0.2.2"]["avg"] == pytest.approx(2.0)
+
+    # Each job still has just its own results
+    assert set(client.get(f"/jobs/{first}/results").json["data"]) == {"192.0.2.1", "192.0.2.2"}
+    assert set(client.get(f"/jobs/{second}/results").json["data"]) == {"192.0.2.3"}
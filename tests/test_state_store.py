@@ -0,0 +1,127 @@
+"""StateStore under concurrent writers and readers, directly and through the routes.
+
+Every write publishes one *generation*: all targets (or both settings
+written together) carry the same number. A reader that ever sees two
+generations in one snapshot or one response has seen a torn write.
+"""
+import json
+import threading
+import time
+
+from samples import SampleSeries
+from state_store import StateStore
+
+TARGETS = [f"10.0.0.{i}" for i in range(1, 51)]
+DURATION = 1.5
+
+
+def generation(gen):
+    """latency_data for one write: every target's numbers are ``gen``"""
+    return {ip: {"samples": SampleSeries.from_latencies([float(gen)] * 3), "avg": float(gen)} for ip in TARGETS}
+
+
+def run_threads(writers, readers, duration=DURATION):
+    """Run writer and reader loops until ``duration`` passes; re-raise the first failure"""
+    stop = threading.Event()
+    errors = []
+
+    def loop(fn):
+        try:
+            count = 0
+            while not stop.is_set():
+                fn(count)
+                count += 1
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+
+    threads = [threading.Thread(target=loop, args=(fn,)) for fn in writers + readers]
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+
+
+def test_update_pop_clear():
+    store = StateStore({"a": 1})
+    first = store.snapshot()
+    store.update({"b": 2, "c": 3})
+    assert store.snapshot() == {"a": 1, "b": 2, "c": 3}
+    assert first == {"a": 1}  # earlier snapshots never change
+    assert store.pop("b") == 2
+    assert store.pop("missing", "default") == "default"
+    store.clear()
+    assert store.snapshot() == {}
+    assert store.version == 3  # the miss didn't publish
+
+
+def test_concurrent_snapshots_are_never_torn():
+    store = StateStore(generation(0))
+
+    def write(count):
+        if count % 10 == 9:
+            store.pop(TARGETS[count % len(TARGETS)])
+        else:
+            store.update(generation(count + 1))
+
+    def read(count):
+        version = store.version
+        assert len({entry["avg"] for entry in store.snapshot().values()}) <= 1
+        assert store.version >= version
+
+    def read_whole(count):
+        # Iterating a snapshot while writers run must not raise or change it
+        snapshot = store.snapshot()
+        before = dict(snapshot)
+        for ip, entry in snapshot.items():
+            assert entry["samples"].latencies() == [entry["avg"]] * 3
+        assert snapshot == before
+
+    run_threads([write, write], [read, read, read_whole])
+
+
+def test_routes_under_concurrent_writes(app_module):
+    app = app_module
+    app.latency_data.replace(generation(0))
+
+    def write_results(count):
+        if count % 50 == 49:
+            app.latency_data.clear()
+        else:
+            app.latency_data.replace(generation(count + 1))
+
+    def write_settings(count):
+        client = app.app.test_client()
+        response = client.post("/save_settings", json={"default_pings": count + 1, "monitor_interval": count + 1})
+        assert response.json["status"] == "success"
+
+    def read_current(count):
+        client = app.app.test_client()
+        data = client.get("/get_current_data").json
+        gens = {entry["avg"] for entry in data.values()}
+        assert len(gens) <= 1
+        for entry in data.values():
+            assert set(entry["latencies"]) == gens
+
+    def read_export(count):
+        client = app.app.test_client()
+        response = client.get("/export_data/json")
+        data = json.loads(response.get_data(as_text=True))
+        assert len({entry["avg"] for entry in data.values()}) <= 1
+
+    def read_settings(count):
+        client = app.app.test_client()
+        data = client.get("/get_settings").json
+        assert data["default_pings"] == data["monitor_interval"]
+        # Saves merge into the current settings; nothing else goes missing
+        assert set(app.DEFAULT_SETTINGS) <= set(data)
+
+    run_threads([write_results, write_settings], [read_current, read_export, read_settings])
+
+    with open("settings.json") as f:
+        saved = json.load(f)
+    assert saved["default_pings"] == saved["monitor_interval"]
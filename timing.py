@@ -0,0 +1,93 @@
+import socket
+import struct
+import sys
+import time
+from collections import namedtuple
+
+# Where an RTT sample's receive timestamp came from
+SOURCE_KERNEL = "kernel"        # SO_TIMESTAMPNS / SO_TIMESTAMPING software RX stamp
+SOURCE_MONOTONIC = "monotonic"  # perf_counter_ns taken in userspace
+
+# Linux socket option numbers (the socket module does not export them)
+SO_TIMESTAMPNS = 35
+SO_TIMESTAMPING = 37
+SOF_TIMESTAMPING_RX_SOFTWARE = 1 << 3
+SOF_TIMESTAMPING_SOFTWARE = 1 << 4
+
+# Room for one timestamping control message (3 timespecs) plus headers
+ANCILLARY_BUFSIZE = socket.CMSG_SPACE(struct.calcsize("qq") * 3) if hasattr(socket, "CMSG_SPACE") else 0
+
+# A kernel RTT that disagrees with the monotonic one by more than this is
+# treated as a wall-clock jump and discarded
+MAX_CLOCK_SKEW_NS = 5_000_000
+
+RttSample = namedtuple("RttSample", ["rtt_ms", "source"])
+RttSample.__doc__ = "One RTT measurement in ms (None on loss) and its timestamp source"
+
+
+def now_ns():
+    """Monotonic high-resolution timestamp in nanoseconds"""
+    return time.perf_counter_ns()
+
+
+def elapsed_ms(start_ns, end_ns=None):
+    """Milliseconds between two now_ns() readings (end defaults to now)"""
+    if end_ns is None:
+        end_ns = time.perf_counter_ns()
+    return (end_ns - start_ns) / 1_000_000
+
+
+class SendStamp:
+    """Both clocks read back to back right before a packet goes out.
+
+    Kernel RX timestamps are CLOCK_REALTIME, so they can only be compared
+    with a wall-clock send time; the monotonic reading is kept as a fallback
+    and as a sanity check against clock steps.
+    """
+    __slots__ = ('mono_ns', 'wall_ns')
+
+    def __init__(self):
+        self.wall_ns = time.time_ns()
+        self.mono_ns = time.perf_counter_ns()
+
+
+def enable_kernel_timestamps(sock):
+    """Ask the kernel to stamp received packets; returns True if supported"""
+    if not sys.platform.startswith("linux") or not ANCILLARY_BUFSIZE:
+        return False
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, SO_TIMESTAMPNS, 1)
+        return True
+    except OSError:
+        pass
+    try:
+        flags = SOF_TIMESTAMPING_RX_SOFTWARE | SOF_TIMESTAMPING_SOFTWARE
+        sock.setsockopt(socket.SOL_SOCKET, SO_TIMESTAMPING, flags)
+        return True
+    except OSError:
+        return False
+
+
+def kernel_rx_timestamp_ns(ancdata):
+    """Extract the software RX timestamp (wall-clock ns) from recvmsg ancdata"""
+    for level, kind, data in ancdata:
+        if level != socket.SOL_SOCKET:
+            continue
+        if kind in (SO_TIMESTAMPNS, SO_TIMESTAMPING) and len(data) >= 16:
+            # SCM_TIMESTAMPING carries three timespecs; the first is the software stamp
+            sec, nsec = struct.unpack("qq", data[:16])
+            if sec or nsec:
+                return sec * 1_000_000_000 + nsec
+    return None
+
+
+def rtt_from_stamps(sent, received_mono_ns, kernel_rx_ns=None):
+    """Build an RttSample, preferring the kernel RX timestamp when it is sane"""
+    mono_rtt_ns = received_mono_ns - sent.mono_ns
+    if kernel_rx_ns is not None:
+        kernel_rtt_ns = kernel_rx_ns - sent.wall_ns
+        # The kernel stamp is taken before our reader wakes up, so it can
+        # only be shorter than the userspace RTT (up to scheduling noise)
+        if 0 < kernel_rtt_ns <= mono_rtt_ns + MAX_CLOCK_SKEW_NS:
+            return RttSample(kernel_rtt_ns / 1_000_000, SOURCE_KERNEL)
+    return RttSample(mono_rtt_ns / 1_000_000, SOURCE_MONOTONIC)